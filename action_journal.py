@@ -0,0 +1,207 @@
+"""
+Binary journal of the actions the SF2 bridge decides, for post-match analysis.
+
+The text log says which controls fired, but not in a form that can be lined up
+against the trades and key events of a whole match. With --action-journal the
+bridge appends one fixed-size record per decided action to a memory-mapped
+file instead:
+
+    wall time ns i64 | received ns i64 (perf_counter, 0 = catch-up) | quantity f64 |
+    exchange u8 | side u8 | kind u8 | outcome u8 | control 20s | pressed keys 16s
+
+- the file is preallocated to --action-journal-max-mb and mapped; a record is
+  packed straight into the mapping, then the header's record count moves past
+  it, so a reader never sees a half-written record
+- control names and the keys of each plan are encoded once and cached, so a
+  write allocates nothing but the wall clock int
+- outcome says whether the action was queued, dropped on a full queue or
+  rejected by the input rate limits (input_limits.py)
+- a full journal is renamed to PATH.1 (PATH.1 to PATH.2, ...) and a new one is
+  started, keeping --action-journal-backups old files
+
+load_journal() maps a journal file as a NumPy structured array (no copy), e.g.
+    actions = load_journal('match.sfj')
+    specials = actions[actions['kind'] == KINDS.index('special')]
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from action_ring import KINDS
+from command_plans import PRESS
+from triggers import EXCHANGES, SIGNALS
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SF2J'
+VERSION = 1
+
+OUTCOMES = ('queued', 'dropped', 'limited')
+QUEUED, DROPPED, LIMITED = range(len(OUTCOMES))
+
+# magic, version, record size, capacity (records), count (records written)
+_HEADER = struct.Struct('<4sIIQQ')
+_HEADER_SIZE = 64
+_COUNT_OFFSET = 20
+_COUNT = struct.Struct('<Q')
+
+_RECORD = struct.Struct('<qqdBBBB20s16s')
+
+# NumPy view of _RECORD, for load_journal()
+RECORD_FIELDS = [
+    ('time_ns', '<i8'), ('received_ns', '<i8'), ('quantity', '<f8'),
+    ('exchange', 'u1'), ('side', 'u1'), ('kind', 'u1'), ('outcome', 'u1'),
+    ('control', 'S20'), ('keys', 'S16'),
+]
+
+_EXCHANGE_CODES = {exchange: i for i, exchange in enumerate(EXCHANGES)}
+# Index 2: trades whose side was not known to the caller
+_SIDE_CODES = {side: i for i, side in enumerate(SIGNALS)}
+_KIND_CODES = {kind: i for i, kind in enumerate(KINDS)}
+
+
+def _read_header(path, header):
+    magic, version, record_size, capacity, count = _HEADER.unpack_from(header)
+    if magic != MAGIC or version != VERSION or record_size != _RECORD.size:
+        raise ValueError(f"{path} is not a version {VERSION} action journal")
+    return capacity, count
+
+
+class ActionJournal:
+    """Appends action records to a memory-mapped journal, rotating it when full; safe from any thread"""
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, backups=5):
+        self.path = path
+        self.capacity = max(1, (max_bytes - _HEADER_SIZE) // _RECORD.size)
+        self.backups = backups
+        self.records = 0
+        self.rotations = 0
+        self._lock = threading.Lock()
+        # Cached encodings: id(plan) -> (plan, pressed keys), control name -> bytes
+        self._keys = {}
+        self._controls = {}
+        self._file = None
+        self._map = None
+        self._open()
+
+    def _open(self):
+        """Map the journal, appending to an existing one; a full journal is rotated first"""
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= _HEADER_SIZE:
+            with open(self.path, 'rb') as f:
+                capacity, count = _read_header(self.path, f.read(_HEADER.size))
+            if count >= capacity:
+                self._rotate_files()
+            else:
+                self._map_file(capacity, count)
+                return
+        with open(self.path, 'wb') as f:
+            f.truncate(_HEADER_SIZE + self.capacity * _RECORD.size)
+            f.write(_HEADER.pack(MAGIC, VERSION, _RECORD.size, self.capacity, 0))
+        self._map_file(self.capacity, 0)
+
+    def _map_file(self, capacity, count):
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), _HEADER_SIZE + capacity * _RECORD.size)
+        self._file_capacity = capacity
+        self._count = count
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+    def _rotate_files(self):
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def rotate(self):
+        with self._lock:
+            self._rotate()
+
+    def _rotate(self):
+        self._close_map()
+        self._rotate_files()
+        self._open()
+        self.rotations += 1
+        logger.info(f"Rotated action journal {self.path} ({self.backups} backup(s) kept)")
+
+    def _plan_keys(self, plan):
+        cached = self._keys.get(id(plan))
+        if cached is None:
+            if len(self._keys) > 4096:
+                # Plans of replaced config snapshots
+                self._keys.clear()
+            pressed = ''.join(event.key for event in plan.events if event.action == PRESS)
+            cached = self._keys[id(plan)] = (plan, pressed.encode('utf-8', 'replace')[:16])
+        return cached[1]
+
+    def _control(self, name):
+        encoded = self._controls.get(name)
+        if encoded is None:
+            encoded = self._controls[name] = str(name).encode('utf-8', 'replace')[:20]
+        return encoded
+
+    def write(self, exchange, side, quantity, kind, name, plan, outcome, received_ns=None):
+        """Append one action record (feed, batcher and catch-up threads)"""
+        keys = self._plan_keys(plan)
+        control = self._control(name)
+        with self._lock:
+            if self._map is None:
+                return
+            if self._count >= self._file_capacity:
+                self._rotate()
+            count = self._count
+            _RECORD.pack_into(self._map, _HEADER_SIZE + count * _RECORD.size, time.time_ns(), received_ns or 0,
+                              quantity, _EXCHANGE_CODES[exchange], _SIDE_CODES.get(side, 2), _KIND_CODES[kind],
+                              outcome, control, keys)
+            self._count = count + 1
+            _COUNT.pack_into(self._map, _COUNT_OFFSET, count + 1)
+            self.records += 1
+
+    def summary(self):
+        return f"{self.records} action(s) journaled to {self.path}, {self.rotations} rotation(s)"
+
+    def close(self):
+        with self._lock:
+            self._close_map()
+
+
+def journal_files(path):
+    """Rotated journals of a path, oldest first, then the current one"""
+    files = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        files.append(f"{path}.{i}")
+        i += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def load_journal(path):
+    """The records of one journal file as a read-only NumPy structured array mapped from the file.
+
+    Fields as in RECORD_FIELDS; codes index EXCHANGES, SIGNALS (2 = unknown),
+    KINDS and OUTCOMES. Needs NumPy (pip install numpy).
+    """
+    import numpy
+
+    with open(path, 'rb') as f:
+        _, count = _read_header(path, f.read(_HEADER.size))
+    dtype = numpy.dtype(RECORD_FIELDS)
+    if not count:
+        return numpy.zeros(0, dtype=dtype)
+    return numpy.memmap(path, dtype=dtype, mode='r', offset=_HEADER_SIZE, shape=(count,))
@@ -0,0 +1,317 @@
+"""
+Keyboard injection in a separate process for the SF2 bridge.
+
+JSON decoding, trigger lookup and logging for two feeds share one GIL with
+the executor threads that time key events, and every feed callback that runs
+while an executor is due to wake shows up as key timing jitter. With
+--injector process the bridge plays keys in a child process (run_injector)
+instead, which runs its own executors, key state tracker and keyboard backend.
+
+Actions cross over through ActionRing, a fixed-size multiprocessing.shared_memory
+ring with one writer (the feed process) and one reader (the injector):
+
+- every record is a fixed-size struct: player, kind, repeat, timestamps, name
+  and the plan's key events inline, so nothing is pickled and there is no plan
+  table to keep in sync across config reloads
+- the header holds the write and read counters; a slot is filled before the
+  write counter moves past it and read before the read counter does
+- the counters and the waiting, stop and idle flags are only read and
+  written under a lock shared by both processes, taken once per record on
+  each side. Python has no memory fences: without the lock's acquire/release
+  an ARM64 reader could see the write counter move before the slot's stores,
+  and on x86 too the waiting flag and the write counter could each miss the
+  other's store (store-load reordering), leaving the reader asleep with an
+  action in the ring
+- when the ring is full the new action is dropped and counted, like the
+  drop-newest queue policy
+- the reader blocks on a pipe when the ring is empty; the writer only sends a
+  wake-up byte when the reader says it is waiting
+
+perf_counter_ns timestamps are system-wide (CLOCK_MONOTONIC, QueryPerformanceCounter),
+so received/expiry times stay valid in the injector.
+
+Experimental: the split needs a spare CPU core, and has only been measured
+on one core so far, where the two processes take turns through the OS
+scheduler instead of the GIL and key timing gets no better (compare with
+bench_bridge.py inject on a multi-core host before relying on it).
+"""
+
+import json
+import logging
+import struct
+import time
+
+from actions import Action
+from command_plans import PRESS, RELEASE, CommandPlan, PlanEvent
+
+logger = logging.getLogger(__name__)
+
+INJECTORS = ('thread', 'process')
+
+KINDS = ('attack', 'special', 'movement', 'jump', 'crouch')
+_KIND_CODES = {kind: i for i, kind in enumerate(KINDS)}
+
+# Longest plan a record can carry (a 32-press rapid repeat); longer plans are dropped with a warning
+MAX_EVENTS = 64
+
+# write counter, read counter, reader waiting, stop requested, injector idle
+_HEADER = struct.Struct('<QQQQQ')
+_HEADER_SIZE = 64
+_WRITE, _READ, _WAITING, _STOP, _IDLE = (i * 8 for i in range(5))
+
+# player, kind, repeat, event count, duration_ms, enqueued/received/expires ns (-1 = None), name, command
+_RECORD = struct.Struct('<BBHHxxIqqq32s32s')
+_EVENT = struct.Struct('<IBB')
+_SLOT_SIZE = -(-(_RECORD.size + MAX_EVENTS * _EVENT.size) // 64) * 64
+_COUNTER = struct.Struct('<Q')
+
+
+def _text(value):
+    return value.encode('utf-8', 'replace')[:32]
+
+
+class ActionRing:
+    """Single-writer, single-reader ring of action records in shared memory.
+
+    lock is the multiprocessing lock both processes take around the header
+    fields; the creator makes one when it is not given, and the attaching
+    process must be handed the creator's.
+    """
+
+    def __init__(self, capacity=1024, name=None, lock=None):
+        import multiprocessing
+        from multiprocessing import shared_memory
+        self.capacity = capacity
+        self.owner = name is None
+        if lock is None:
+            if not self.owner:
+                raise ValueError("Attaching to an action ring needs its creator's lock")
+            lock = multiprocessing.get_context('spawn').Lock()
+        # Also serializes the feed threads, batcher and catch-up worker, which all enqueue
+        self.lock = lock
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=_HEADER_SIZE + capacity * _SLOT_SIZE)
+            self.shm.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+        else:
+            # The injector is spawned by the ring's creator and shares its resource tracker, so attaching
+            # here does not make the tracker unlink the block when this process exits
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.buf = self.shm.buf
+        self.name = self.shm.name
+        self.dropped = 0
+        self.too_long = 0
+        # Encoded key events per plan: id(plan) -> (plan, event count, bytes)
+        self._encoded = {}
+        # Decoded plans by their encoded events, so the injector's schedule cache stays bounded
+        self._decoded = {}
+
+    def _load(self, offset):
+        return _COUNTER.unpack_from(self.buf, offset)[0]
+
+    def _store(self, offset, value):
+        _COUNTER.pack_into(self.buf, offset, value)
+
+    def __len__(self):
+        with self.lock:
+            return self._load(_WRITE) - self._load(_READ)
+
+    def _encode(self, plan):
+        cached = self._encoded.get(id(plan))
+        if cached is not None:
+            return cached[1], cached[2]
+        events = b''.join(_EVENT.pack(event.offset_ms, event.action == PRESS, ord(event.key))
+                          for event in plan.events)
+        count = len(plan.events)
+        if len(self._encoded) > 4096:
+            # Plans of replaced config snapshots
+            self._encoded.clear()
+        self._encoded[id(plan)] = (plan, count, events)
+        return count, events
+
+    def put(self, player, action):
+        """Write an action for player (0 or 1); False if the ring is full or the plan too long"""
+        count, events = self._encode(action.plan)
+        if count > MAX_EVENTS:
+            self.too_long += 1
+            logger.warning(f"Plan {action.plan.command!r} has {count} key events, more than {MAX_EVENTS}")
+            return False
+        with self.lock:
+            write = self._load(_WRITE)
+            if write - self._load(_READ) >= self.capacity:
+                self.dropped += 1
+                return False
+            offset = _HEADER_SIZE + (write % self.capacity) * _SLOT_SIZE
+            _RECORD.pack_into(
+                self.buf, offset, player, _KIND_CODES[action.kind], action.repeat, count,
+                action.plan.duration_ms, int(action.enqueued_at * 1e9),
+                -1 if action.received_ns is None else action.received_ns,
+                -1 if action.expires_ns is None else action.expires_ns,
+                _text(str(action.name)), _text(action.plan.command))
+            start = offset + _RECORD.size
+            self.buf[start:start + len(events)] = events
+            self._store(_WRITE, write + 1)
+            return True
+
+    def take_waiting(self):
+        """Clear the reader's waiting flag; True if it was set and the reader needs a wake-up (writer)"""
+        with self.lock:
+            if not self._load(_WAITING):
+                return False
+            self._store(_WAITING, 0)
+            return True
+
+    def set_waiting(self, idle):
+        """Publish the reader's idle flag and say it is about to block; False, with the waiting flag left clear,
+        if the ring is not empty (reader)"""
+        with self.lock:
+            self._store(_IDLE, int(idle))
+            if self._load(_WRITE) != self._load(_READ):
+                return False
+            self._store(_WAITING, 1)
+            return True
+
+    def flag(self, offset):
+        with self.lock:
+            return self._load(offset)
+
+    def set_flag(self, offset, value):
+        with self.lock:
+            self._store(offset, value)
+
+    def idle(self):
+        """True if the ring is empty and the reader said it was idle (writer)"""
+        with self.lock:
+            return self._load(_WRITE) == self._load(_READ) and bool(self._load(_IDLE))
+
+    def get(self):
+        """Next (player, Action), or None if the ring is empty (reader)"""
+        with self.lock:
+            read = self._load(_READ)
+            if read == self._load(_WRITE):
+                return None
+            offset = _HEADER_SIZE + (read % self.capacity) * _SLOT_SIZE
+            (player, kind, repeat, count, duration_ms, enqueued_ns, received_ns, expires_ns,
+             name, command) = _RECORD.unpack_from(self.buf, offset)
+            start = offset + _RECORD.size
+            events = bytes(self.buf[start:start + count * _EVENT.size])
+            # Not idle before the read counter moves, so idle() never sees an empty ring and the idle flag
+            self._store(_IDLE, 0)
+            self._store(_READ, read + 1)
+        plan = self._decoded.get(events)
+        if plan is None:
+            command = command.rstrip(b'\0').decode('utf-8', 'replace')
+            plan = CommandPlan(command, None, (), tuple(
+                PlanEvent(offset_ms, PRESS if pressed else RELEASE, chr(key))
+                for offset_ms, pressed, key in _EVENT.iter_unpack(events)), duration_ms)
+            if len(self._decoded) > 4096:
+                self._decoded.clear()
+            self._decoded[events] = plan
+        return player, Action(KINDS[kind], name.rstrip(b'\0').decode('utf-8', 'replace'), plan,
+                              enqueued_ns / 1e9, repeat,
+                              None if received_ns < 0 else received_ns,
+                              None if expires_ns < 0 else expires_ns)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class InjectorProcess:
+    """The feed process's handle on the injector child: ring, wake-up pipe and process"""
+
+    def __init__(self, exchanges, settings, capacity=1024):
+        import multiprocessing
+        ctx = multiprocessing.get_context('spawn')
+        self.exchanges = tuple(exchanges)
+        self.ring = ActionRing(capacity, lock=ctx.Lock())
+        self._wake, child_wake = ctx.Pipe()
+        self.process = ctx.Process(target=run_injector, name='sf2-injector', daemon=True,
+                                   args=(self.ring.name, capacity, self.ring.lock, child_wake, self.exchanges,
+                                         settings))
+        # Key timing stats of the injector's executors, sent back when it stops
+        self.final_stats = None
+
+    def start(self):
+        self.process.start()
+        logger.info(f"Started key injection process (pid {self.process.pid})")
+
+    def put(self, exchange, action):
+        """Hand an action to the injector without blocking; False if it was dropped"""
+        ring = self.ring
+        if not ring.put(self.exchanges.index(exchange), action):
+            return False
+        if ring.take_waiting():
+            try:
+                self._wake.send_bytes(b'\0')
+            except OSError:
+                pass
+        return True
+
+    @property
+    def idle(self):
+        return self.ring.idle()
+
+    def stop(self, timeout=5):
+        if self.ring.buf is None:
+            return
+        self.ring.set_flag(_STOP, 1)
+        try:
+            self._wake.send_bytes(b'\0')
+            if self._wake.poll(timeout):
+                self.final_stats = json.loads(self._wake.recv_bytes())
+        except (OSError, EOFError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close()
+
+    def summary(self):
+        return f"{self.ring.dropped} dropped (ring full), {len(self.ring)} pending"
+
+
+def run_injector(ring_name, capacity, lock, wake, exchanges, settings):
+    """Injector process: play the actions from the ring on this process's own executors and keyboard"""
+    from bridge import CryptoMAMEBridge
+    from keyboards import LazyBackend
+
+    bridge = CryptoMAMEBridge(config_cache=None, **settings)
+    if isinstance(bridge.keyboard, LazyBackend):
+        bridge.keyboard.preload()
+    ring = ActionRing(capacity, ring_name, lock)
+    bridge.start_executors()
+    last_housekeeping = time.monotonic()
+    try:
+        while True:
+            item = ring.get()
+            if item is not None:
+                player, action = item
+                bridge.enqueue_action(exchanges[player], action)
+                continue
+            if ring.flag(_STOP):
+                break
+            now = time.monotonic()
+            if now - last_housekeeping >= 1:
+                bridge.housekeeping()
+                last_housekeeping = now
+            idle = all(executor.idle for executor in bridge.executors.values())
+            # Checked under the ring's lock, like the writer's take_waiting(), so neither misses the other
+            if not ring.set_waiting(idle):
+                continue
+            if wake.poll(0.05 if not idle else 0.5):
+                wake.recv_bytes()
+            ring.set_flag(_WAITING, 0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if bridge.stats_interval:
+            bridge.log_executor_stats()
+        bridge.shutdown()
+        try:
+            wake.send_bytes(json.dumps({exchange: bridge.schedulers[exchange].jitter.stats()
+                                        for exchange in exchanges}).encode('utf-8'))
+        except OSError:
+            pass
+        ring.close()
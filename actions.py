@@ -0,0 +1,373 @@
+"""
+Action queue and per-player input executor for the SF2 bridge.
+
+Websocket handlers only decode, classify and enqueue. Each player (P1 = Binance,
+P2 = Coinbase) has its own executor thread that drains a bounded queue and
+drives the keyboard, so a 2 s charge hold never blocks the socket reader.
+"""
+
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+# kind: 'attack', 'special', 'movement', 'jump' or 'crouch'
+# name: control name, e.g. 'Weak', 'binanceSpecial3', 'MoveForward'
+# plan: the compiled CommandPlan to play (see command_plans.py)
+# enqueued_at: time.perf_counter() when the trade was classified
+# repeat: how many identical presses were merged into this action
+# received_ns: time.perf_counter_ns() when the exchange frame arrived (None if unknown)
+# expires_ns: time.perf_counter_ns() after which the trade is too old to play (None = never)
+Action = namedtuple('Action', ['kind', 'name', 'plan', 'enqueued_at', 'repeat', 'received_ns', 'expires_ns'],
+                    defaults=(1, None, None))
+
+# Overflow / coalescing policies for the keystroke pipeline:
+# - drop-newest: when full, the incoming action is dropped
+# - drop-oldest: when full, the oldest queued action is dropped
+# - latest-wins: a new action replaces the queued action of the same kind (attack, movement, ...)
+# - merge: a press identical to a queued one is merged into a single rapid-repeat action
+# - priority: when full, the oldest non-special is dropped; specials are never dropped
+OVERFLOW_POLICIES = ('drop-newest', 'drop-oldest', 'latest-wins', 'merge', 'priority')
+
+# Only plain presses are merged; specials have cooldowns and jumps/crouches have delays
+MERGEABLE_KINDS = ('attack', 'movement')
+
+# Gap between merged presses so each one registers (1 frame at 60fps, as in rapid repeat)
+REPEAT_GAP = 0.017
+
+# Priority classes, highest first, and the class of each action kind
+PRIORITY_CLASSES = ('special', 'attack', 'movement', 'jump_crouch')
+PRIORITY_CLASS = {'special': 'special', 'attack': 'attack', 'movement': 'movement',
+                  'jump': 'jump_crouch', 'crouch': 'jump_crouch'}
+PRIORITY = {kind: PRIORITY_CLASSES.index(cls) for kind, cls in PRIORITY_CLASS.items()}
+
+# How an executor orders and interrupts actions:
+# - fifo: queue order
+# - priority: the highest priority class queued is played next
+# - cancel: priority, and a higher class queued during a long wait (charge hold, crouch)
+#   cancels the rest of the running plan, releasing the keys it holds
+# - interleave: priority, and specials/attacks queued during a long wait are played
+#   inside it while the running plan keeps its keys held; key conflicts fall back to cancel
+SCHEDULERS = ('fifo', 'priority', 'cancel', 'interleave')
+
+# Only waits at least this long inside a plan can be preempted (not a 100ms attack press)
+PREEMPT_MIN_WAIT = 0.25
+
+
+class ActionQueue:
+    """Bounded queue of Actions shared between a websocket thread and an executor.
+
+    What happens during a burst is decided by the overflow policy; dropped and
+    merged actions are counted in total and per kind.
+    """
+
+    def __init__(self, maxsize=32, policy='drop-newest', max_repeat=8, prioritized=False):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}', expected one of {OVERFLOW_POLICIES}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.max_repeat = max_repeat
+        # get() returns the oldest action of the highest priority class instead of the oldest one
+        self.prioritized = prioritized
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.in_flight = 0
+        self.enqueued = 0
+        self.dropped = 0
+        self.merged = 0
+        self.dropped_by_kind = {}
+        self.merged_by_kind = {}
+        self.max_depth = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def _count_drop(self, kind):
+        self.dropped += 1
+        self.dropped_by_kind[kind] = self.dropped_by_kind.get(kind, 0) + 1
+
+    def _count_merge(self, kind):
+        self.merged += 1
+        self.merged_by_kind[kind] = self.merged_by_kind.get(kind, 0) + 1
+
+    def _coalesce(self, action):
+        """Fold action into a queued one for the latest-wins and merge policies"""
+        items = self._items
+        for i in range(len(items) - 1, -1, -1):
+            queued = items[i]
+            if self.policy == 'latest-wins':
+                if queued.kind == action.kind:
+                    items[i] = action
+                    self._count_drop(queued.kind)
+                    return True
+            elif (queued.kind == action.kind and queued.kind in MERGEABLE_KINDS
+                    and queued.plan == action.plan
+                    and queued.repeat < self.max_repeat):
+                items[i] = queued._replace(repeat=queued.repeat + action.repeat)
+                self._count_merge(action.kind)
+                return True
+        return False
+
+    def _make_room(self, action):
+        """Free a slot for action when full; return False if action itself must be dropped"""
+        items = self._items
+        if self.policy == 'drop-newest':
+            return False
+        if self.policy == 'priority':
+            for i, queued in enumerate(items):
+                if queued.kind != 'special':
+                    del items[i]
+                    self._count_drop(queued.kind)
+                    return True
+            # Queue holds only specials: they are never dropped, so only another special gets in
+            return action.kind == 'special'
+        self._count_drop(items.popleft().kind)
+        return True
+
+    def put(self, action):
+        """Queue an action without blocking; return False if it was dropped"""
+        with self._cond:
+            if self._closed:
+                return False
+            if self.policy in ('latest-wins', 'merge') and self._coalesce(action):
+                self._cond.notify()
+                return True
+            if len(self._items) >= self.maxsize and not self._make_room(action):
+                self._count_drop(action.kind)
+                return False
+            self._items.append(action)
+            self.enqueued += 1
+            if len(self._items) > self.max_depth:
+                self.max_depth = len(self._items)
+            self._cond.notify()
+            return True
+
+    def _best(self):
+        """Index of the oldest queued action of the highest priority class"""
+        best, best_rank = 0, len(PRIORITY_CLASSES)
+        for i, action in enumerate(self._items):
+            rank = PRIORITY.get(action.kind, best_rank)
+            if rank < best_rank:
+                best, best_rank = i, rank
+                if not rank:
+                    break
+        return best
+
+    def _pop(self, i):
+        self.in_flight += 1
+        if not i:
+            return self._items.popleft()
+        action = self._items[i]
+        del self._items[i]
+        return action
+
+    def get(self, timeout=None):
+        """Wait for the next action; return None on timeout or once closed and drained"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._pop(self._best() if self.prioritized else 0)
+
+    def get_priority(self, max_rank, timeout):
+        """Wait up to timeout for an action of priority rank <= max_rank and return it, else None"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._closed:
+                if self._items:
+                    i = self._best()
+                    if PRIORITY.get(self._items[i].kind, len(PRIORITY_CLASSES)) <= max_rank:
+                        return self._pop(i)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return None
+
+    def requeue(self, action):
+        """Put back an action taken with get_priority() to be played next"""
+        with self._cond:
+            self._items.appendleft(action)
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def task_done(self):
+        """Mark an action returned by get() as fully played"""
+        with self._cond:
+            self.in_flight -= 1
+
+    @property
+    def idle(self):
+        """True when nothing is queued or being played"""
+        return not self._items and not self.in_flight
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class InputExecutor(threading.Thread):
+    """Drains one player's ActionQueue and plays each action's plan on this thread.
+
+    Tracks how long actions waited in the queue, which is how far behind the
+    live tape that player's fighter is. If on_played is set it is called with
+    (action, first_key_ns, dequeued_ns) after every played action.
+
+    play(plan, preempt) plays a plan; with the cancel and interleave schedulers
+    preempt(wake_ns, held_keys) is called instead of sleeping inside the plan
+    (see FrameScheduler.play) and gives way to higher priority actions.
+    """
+
+    def __init__(self, player, queue, play, scheduler='fifo'):
+        super().__init__(name=f"{player}-input", daemon=True)
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f"Unknown scheduler '{scheduler}', expected one of {SCHEDULERS}")
+        self.player = player
+        self.queue = queue
+        self.play = play
+        self.scheduler = scheduler
+        self.on_played = None
+        self._stop_event = threading.Event()
+        self.executed = 0
+        self.failed = 0
+        self.expired = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_last = 0.0
+        # Per priority class: actions played, seconds they waited in the queue, running actions
+        # cancelled by a higher class, and actions played inside another action's hold
+        self.played_by_class = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self.wait_by_class = dict.fromkeys(PRIORITY_CLASSES, 0.0)
+        self.preempted = dict.fromkeys(PRIORITY_CLASSES, 0)
+        self.interleaved = dict.fromkeys(PRIORITY_CLASSES, 0)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            action = self.queue.get(timeout=0.5)
+            if action is not None:
+                self.execute(action, self.scheduler in ('cancel', 'interleave'))
+
+    def execute(self, action, preemptible=False):
+        """Play an action taken from the queue (on this thread) and mark it done"""
+        dequeued_ns = time.perf_counter_ns()
+        waited = time.perf_counter() - action.enqueued_at
+        self.wait_last = waited
+        self.wait_total += waited
+        if waited > self.wait_max:
+            self.wait_max = waited
+        try:
+            if action.expires_ns is not None and dequeued_ns > action.expires_ns:
+                # Waited in the queue past the max trade age
+                self.expired += 1
+                return
+            cls = PRIORITY_CLASS.get(action.kind)
+            if cls:
+                self.played_by_class[cls] += 1
+                self.wait_by_class[cls] += waited
+            preempt = partial(self._preempt, action) if preemptible else None
+            first_key_ns = None
+            for i in range(action.repeat):
+                if i:
+                    time.sleep(REPEAT_GAP)
+                played_ns = self.play(action.plan, preempt)
+                if first_key_ns is None:
+                    first_key_ns = played_ns
+            self.executed += 1
+            if self.on_played is not None:
+                self.on_played(action, first_key_ns, dequeued_ns)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"{self.player} error executing {action.kind} {action.name}: {e}")
+        finally:
+            self.queue.task_done()
+
+    def _preempt(self, running, wake_ns, held_keys):
+        """Wait until wake_ns inside the running action's plan, giving way to higher priority actions.
+
+        Returns True if the rest of the running plan must be cancelled (the action
+        that preempts it is put back to be played next).
+        """
+        rank = PRIORITY.get(running.kind, len(PRIORITY_CLASSES))
+        max_rank = rank - 1
+        if self.scheduler == 'interleave':
+            max_rank = max(max_rank, PRIORITY['attack'])
+        if max_rank < 0:
+            return False
+        while True:
+            remaining = (wake_ns - time.perf_counter_ns()) / 1e9
+            if remaining < PREEMPT_MIN_WAIT:
+                return False
+            action = self.queue.get_priority(max_rank, remaining)
+            if action is None:
+                return False
+            higher = PRIORITY[action.kind] < rank
+            if self.scheduler == 'interleave' and not any(event.key in held_keys for event in action.plan.events):
+                self.interleaved[PRIORITY_CLASS[action.kind]] += 1
+                self.execute(action)
+                continue
+            self.queue.requeue(action)
+            if higher:
+                self.preempted[PRIORITY_CLASS.get(running.kind)] += 1
+                return True
+            # Same or lower class needing a key this plan holds: it waits its turn
+            return False
+
+    @property
+    def idle(self):
+        return self.queue.idle
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self.queue.close()
+        if self.is_alive():
+            self.join(timeout)
+
+    def stats(self):
+        """Snapshot of queue depth and time-in-queue (ms)"""
+        done = self.executed + self.failed + self.expired
+        return {
+            'depth': len(self.queue),
+            'max_depth': self.queue.max_depth,
+            'enqueued': self.queue.enqueued,
+            'dropped': self.queue.dropped,
+            'merged': self.queue.merged,
+            'dropped_by_kind': dict(self.queue.dropped_by_kind),
+            'merged_by_kind': dict(self.queue.merged_by_kind),
+            'executed': self.executed,
+            'failed': self.failed,
+            'expired': self.expired,
+            'wait_last_ms': self.wait_last * 1000,
+            'wait_avg_ms': (self.wait_total / done * 1000) if done else 0.0,
+            'wait_max_ms': self.wait_max * 1000,
+            'played_by_class': dict(self.played_by_class),
+            'wait_avg_ms_by_class': {cls: self.wait_by_class[cls] / n * 1000 if n else 0.0
+                                     for cls, n in self.played_by_class.items()},
+            'preempted': dict(self.preempted),
+            'interleaved': dict(self.interleaved),
+        }
+
+    def summary(self):
+        s = self.stats()
+        expired = f", expired {s['expired']}" if s['expired'] else ""
+        return (f"{self.player}: depth {s['depth']} (max {s['max_depth']}), "
+                f"executed {s['executed']}, dropped {s['dropped']}, merged {s['merged']} [{self.queue.policy}]{expired}, "
+                f"lag last {s['wait_last_ms']:.0f}ms avg {s['wait_avg_ms']:.0f}ms max {s['wait_max_ms']:.0f}ms")
+
+    def priority_summary(self):
+        s = self.stats()
+        parts = [f"{cls} {n} (wait avg {s['wait_avg_ms_by_class'][cls]:.0f}ms)"
+                 for cls, n in s['played_by_class'].items() if n]
+        line = f"{self.player} [{self.scheduler}]: {', '.join(parts) or 'nothing played'}"
+        preempted = ', '.join(f"{cls} {n}" for cls, n in s['preempted'].items() if n)
+        interleaved = ', '.join(f"{cls} {n}" for cls, n in s['interleaved'].items() if n)
+        if preempted:
+            line += f"; cancelled by higher priority: {preempted}"
+        if interleaved:
+            line += f"; played inside a hold: {interleaved}"
+        return line
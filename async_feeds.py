@@ -0,0 +1,108 @@
+"""
+Single asyncio event loop ingestion for the SF2 bridge.
+
+The threaded mode runs each exchange feed in its own websocket-client thread,
+so the two feeds contend for the GIL and wake independently. AsyncBridgeRunner
+instead runs on one event loop:
+
+- the Binance and Coinbase websocket connections (websockets package)
+- the once-a-second housekeeping: latency metrics, stats log, config refresh
+  (the blocking dashboard request runs in a worker thread)
+- the /metrics endpoint when --metrics-port is set
+
+Key plans still play on the bridge's per-player InputExecutor threads, so a
+long special move never blocks the loop.
+"""
+
+import asyncio
+import logging
+import signal
+
+from metrics import serve_metrics
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 5
+
+
+class AsyncBridgeRunner:
+    """Runs a CryptoMAMEBridge's feeds and housekeeping on one asyncio event loop"""
+
+    def __init__(self, bridge):
+        self.bridge = bridge
+        self._stop = None
+
+    def run(self):
+        try:
+            asyncio.run(self.main())
+        except KeyboardInterrupt:
+            pass
+
+    async def main(self):
+        from websockets.asyncio.client import connect
+
+        bridge = self.bridge
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        signals = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._stop.set)
+                signals.append(sig)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Windows, or not the main thread: KeyboardInterrupt / bridge.stop() still work
+                pass
+
+        bridge.start_executors()
+        tasks = [
+            asyncio.create_task(self.feed(connect, 'binance', bridge.binance_stream_url(),
+                                          bridge.on_binance_message)),
+            asyncio.create_task(self.feed(connect, 'coinbase', bridge.coinbase_ws_url,
+                                          bridge.on_coinbase_message, bridge.coinbase_subscription())),
+            asyncio.create_task(self.housekeeping()),
+        ]
+        server = None
+        try:
+            if bridge.metrics and bridge.metrics_port:
+                server = await serve_metrics(bridge.metrics.render, bridge.metrics_port)
+            await self._stop.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+            bridge.shutdown()
+
+    async def feed(self, connect, exchange, url, on_message, subscription=None):
+        """Receive frames from one exchange forever, reconnecting after errors"""
+        while True:
+            try:
+                async with connect(url) as ws:
+                    logger.info(f"Connected to {exchange} feed")
+                    self.bridge.on_feed_open(exchange)
+                    try:
+                        if subscription:
+                            await ws.send(subscription)
+                        async for message in ws:
+                            on_message(ws, message)
+                    except asyncio.CancelledError:
+                        # Normal close handshake instead of the 1011 sent when the block exits with an error
+                        await ws.close()
+                        raise
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{exchange} websocket error: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def housekeeping(self):
+        bridge = self.bridge
+        while not bridge.stopped.is_set():
+            await asyncio.sleep(1)
+            if bridge.housekeeping():
+                await asyncio.to_thread(bridge.fetch_config)
+        self._stop.set()
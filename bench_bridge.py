@@ -0,0 +1,1728 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Crypto -> MAME bridge.
+
+Run from the project root, e.g.:
+    python bench_bridge.py triggers
+    python bench_bridge.py e2e --rates 100 1000 10000 --output bench_results.json
+    python bench_bridge.py io --rates 100 1000   (needs the websockets package)
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from triggers import TriggerIndex, TriggerMatch, JumpCrouchSpec, EMPTY_MATCH
+from command_plans import PlanCache, compile_command, parse_command
+
+
+def default_config():
+    """Dashboard configuration with the schema defaults from shared/schema.ts"""
+    config = {'id': 1, 'symbol': 'btcusdt', 'coinbaseSymbol': 'BTC-USD', 'isActive': True}
+    attack_keys = {
+        'binanceBuy': 'xcv', 'binanceSell': 'yui',
+        'coinbaseBuy': 'asd', 'coinbaseSell': 'bnm',
+    }
+    for prefix, keys in attack_keys.items():
+        for level, key, lo, hi in zip(('Weak', 'Med', 'Strong'), keys,
+                                      ('0.00001000', '0.00010000', '0.00100000'),
+                                      ('0.00009999', '0.00099999', '0.00999999')):
+            config[f"{prefix}{level}Min"] = lo
+            config[f"{prefix}{level}Max"] = hi
+            config[f"{prefix}{level}Key"] = key
+
+    special_ranges = [('0.01000000', '0.09999999'), ('0.10000000', '0.49999999'),
+                      ('0.50000000', '0.99999999')] + [
+        (f"{i}.00000000", f"{i}.99999999") for i in range(1, 7)]
+    special_signals = ['buy', 'buy', 'sell', 'buy', 'buy', 'sell', 'buy', 'buy', 'sell']
+    special_commands = {
+        'binance': ['d,f,x', 'd,b,y', 'b,d,f+x'] + [''] * 6,
+        'coinbase': ['d,f,a', 'd,b,b', 'b,d,f+a'] + [''] * 6,
+    }
+    for exchange, commands in special_commands.items():
+        for i, ((lo, hi), signal, command) in enumerate(zip(special_ranges, special_signals, commands), 1):
+            config[f"{exchange}Special{i}Min"] = lo
+            config[f"{exchange}Special{i}Max"] = hi
+            config[f"{exchange}Special{i}Signal"] = signal
+            config[f"{exchange}Special{i}Command"] = command
+
+    controls = {
+        'binance': {'MoveForward': ('buy', 'f'), 'MoveBackward': ('sell', 'g'),
+                    'Jump': ('buy', 'w'), 'Crouch': ('sell', 'e')},
+        'coinbase': {'MoveForward': ('buy', 'l'), 'MoveBackward': ('sell', 'k'),
+                     'Jump': ('buy', 'o'), 'Crouch': ('sell', 'p')},
+    }
+    for exchange, entries in controls.items():
+        for name, (signal, key) in entries.items():
+            config[f"{exchange}{name}Min"] = '0.00001000'
+            config[f"{exchange}{name}Max"] = '0.00009999'
+            config[f"{exchange}{name}Signal"] = signal
+            config[f"{exchange}{name}Key"] = key
+            if name in ('Jump', 'Crouch'):
+                config[f"{exchange}{name}Delay"] = '5.00'
+    config['binanceJumpLeftKey'] = 'f'
+    config['binanceJumpRightKey'] = 'h'
+    config['coinbaseJumpLeftKey'] = 'p'
+    config['coinbaseJumpRightKey'] = 'k'
+    return config
+
+
+def legacy_scan(config, quantity, exchange, signal_type):
+    """The per-trade dict scanning the bridge used before TriggerIndex, as a TriggerMatch"""
+    if not config or not config.get('isActive'):
+        return None
+    prefix = exchange
+    config_prefix = f"{exchange}{signal_type.capitalize()}"
+
+    attack = None
+    for level in ['Weak', 'Med', 'Strong']:
+        min_val = float(config.get(f"{config_prefix}{level}Min", 0))
+        max_val = float(config.get(f"{config_prefix}{level}Max", 0))
+        key = config.get(f"{config_prefix}{level}Key")
+        if min_val <= quantity <= max_val:
+            attack = (level, key)
+            break
+
+    special = None
+    for i in range(1, 10):
+        if config.get(f"{prefix}Special{i}Signal", "buy") != signal_type:
+            continue
+        min_val = float(config.get(f"{prefix}Special{i}Min", 0))
+        max_val = float(config.get(f"{prefix}Special{i}Max", 0))
+        command = config.get(f"{prefix}Special{i}Command", "")
+        if min_val <= quantity <= max_val and command:
+            special = (f"{prefix}Special{i}", command)
+            break
+
+    movements = []
+    for movement in ['MoveForward', 'MoveBackward']:
+        if config.get(f"{prefix}{movement}Signal", "buy") != signal_type:
+            continue
+        min_val = float(config.get(f"{prefix}{movement}Min", 0))
+        max_val = float(config.get(f"{prefix}{movement}Max", 0))
+        key = config.get(f"{prefix}{movement}Key", "")
+        if min_val <= quantity <= max_val and key:
+            movements.append((movement, key))
+
+    jump_crouch = []
+    for action in ['Jump', 'Crouch']:
+        if config.get(f"{prefix}{action}Signal", "buy") != signal_type:
+            continue
+        min_val = float(config.get(f"{prefix}{action}Min", 0))
+        max_val = float(config.get(f"{prefix}{action}Max", 0))
+        key = config.get(f"{prefix}{action}Key", "")
+        delay = float(config.get(f"{prefix}{action}Delay", 5.0))
+        if min_val <= quantity <= max_val and key:
+            left_key = config.get(f"{prefix}JumpLeftKey", "") if action == 'Jump' else ""
+            right_key = config.get(f"{prefix}JumpRightKey", "") if action == 'Jump' else ""
+            jump_options = ['neutral']
+            if left_key and left_key.strip():
+                jump_options.append('left')
+            if right_key and right_key.strip():
+                jump_options.append('right')
+            jump_crouch.append(JumpCrouchSpec(action, f"{prefix}{action}", key, delay,
+                                              left_key, right_key, tuple(jump_options)))
+
+    if attack is None and special is None and not movements and not jump_crouch:
+        return EMPTY_MATCH
+    return TriggerMatch(attack, special, tuple(movements), tuple(jump_crouch))
+
+
+def synthetic_quantities(count, seed=1):
+    """Log-uniform BTC trade sizes between 1e-6 and 10, plus exact range boundaries"""
+    rng = random.Random(seed)
+    quantities = [10 ** rng.uniform(-6, 1) for _ in range(count)]
+    boundaries = [0.00001, 0.00009999, 0.0001, 0.001, 0.00999999, 0.01, 0.5, 0.99999999, 6.99999999]
+    quantities[:len(boundaries)] = boundaries
+    return quantities
+
+
+def _best_of(repeat, fn):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_triggers(args):
+    config = default_config()
+    index = TriggerIndex(config)
+    quantities = synthetic_quantities(args.trades)
+    rng = random.Random(2)
+    trades = [(q, rng.choice(('binance', 'coinbase')), rng.choice(('buy', 'sell'))) for q in quantities]
+
+    mismatches = sum(1 for q, exchange, signal in trades
+                     if legacy_scan(config, q, exchange, signal) != index.lookup(exchange, signal, q))
+    if mismatches:
+        print(f"WARNING: {mismatches} trades classified differently by the index")
+
+    def run_legacy():
+        for q, exchange, signal in trades:
+            legacy_scan(config, q, exchange, signal)
+
+    def run_index():
+        lookup = index.lookup
+        for q, exchange, signal in trades:
+            lookup(exchange, signal, q)
+
+    results = {}
+    for name, fn in (('legacy scan', run_legacy), ('trigger index', run_index)):
+        results[name] = _best_of(args.repeat, fn) / len(trades) * 1e9
+        print(f"{name:>14}: {results[name]:8.1f} ns/trade")
+
+    start = time.perf_counter()
+    for _ in range(100):
+        TriggerIndex(config)
+    print(f"{'compile':>14}: {(time.perf_counter() - start) / 100 * 1e6:8.1f} us/config")
+    print(f"{'speedup':>14}: {results['legacy scan'] / results['trigger index']:8.1f}x")
+
+
+def bench_plans(args):
+    # Parse warnings for the invalid sample command would swamp the output
+    logging.disable(logging.WARNING)
+    commands = ['d,f,x', 'd,b,y', 'b,d,f+x', 'xxxxx', 'x+y+c', '++f,h,x', '++f,g,h,x', 'd,df,f']
+    triggers = [commands[i % len(commands)] for i in range(args.triggers)]
+    cache = PlanCache()
+    for command in commands:
+        cache.command(command)
+
+    def run_parse():
+        for command in triggers:
+            parse_command(command)
+
+    def run_compile():
+        for command in triggers:
+            compile_command(command)
+
+    def run_cached():
+        lookup = cache.command
+        for command in triggers:
+            lookup(command)
+
+    for name, fn in (('parse per trigger', run_parse), ('compile per trigger', run_compile),
+                     ('plan cache', run_cached)):
+        print(f"{name:>19}: {_best_of(args.repeat, fn) / len(triggers) * 1e9:8.1f} ns/trigger")
+    for command in commands:
+        print(compile_command(command).describe())
+
+
+def _binance_frame(rng, trade_id, quantity, now_ms):
+    from exchange_sim import binance_frame
+    price = rng.uniform(60000, 70000)
+    return binance_frame('btcusdt', trade_id, quantity, 'sell' if rng.random() < 0.5 else 'buy', price, now_ms)
+
+
+def _coinbase_frame(rng, trade_id, quantity, now_ms):
+    from exchange_sim import coinbase_frame
+    side = rng.choice(('buy', 'sell'))
+    return coinbase_frame('BTC-USD', trade_id, quantity, side, rng.uniform(60000, 70000), now_ms)
+
+
+def synthetic_feed(rate, duration, seed=1):
+    """Poisson trade arrivals at `rate` msgs/s with log-normal sizes, split across both exchanges.
+
+    Returns [(offset_s, exchange, frame)] with frames in the live Binance aggTrade
+    and Coinbase match formats.
+    """
+    rng = random.Random(seed)
+    frames = []
+    t = 0.0
+    trade_ids = {'binance': 1, 'coinbase': 1}
+    start_ms = int(time.time() * 1000)
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            return frames
+        exchange = 'binance' if rng.random() < 0.5 else 'coinbase'
+        quantity = min(rng.lognormvariate(-7.0, 2.0), 50.0)
+        build = _binance_frame if exchange == 'binance' else _coinbase_frame
+        frames.append((t, exchange, build(rng, trade_ids[exchange], quantity, start_ms + int(t * 1000))))
+        trade_ids[exchange] += 1
+
+
+def journal_feed(path, duration=None):
+    """Frames from a recorded feed journal as [(offset_s, exchange, frame)]"""
+    from feed_journal import read_journal
+    frames = []
+    first_ns = None
+    for exchange, received_ns, message in read_journal(path):
+        if first_ns is None:
+            first_ns = received_ns
+        offset = (received_ns - first_ns) / 1e9
+        if duration is not None and offset > duration:
+            break
+        frames.append((offset, exchange, message))
+    return frames
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _rss_mb():
+    """Current resident set size (Linux), else the peak"""
+    try:
+        import os
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return _peak_rss_mb()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _feed_epoch(frames, decoder):
+    """Exchange time (epoch seconds) at offset 0 of a feed, from its first timestamped trade"""
+    from decoders import trade_time_ns
+    for offset, exchange, frame in frames:
+        trade = getattr(decoder, exchange)(frame)
+        if trade is not None and trade.time:
+            return trade_time_ns(trade.time) / 1e9 - offset
+    return None
+
+
+def run_e2e(frames, args, label):
+    """Drive one bridge with frames paced at their offsets; return a result dict"""
+    from bridge import CryptoMAMEBridge
+
+    bridge = CryptoMAMEBridge(keyboard='recording', queue_size=args.queue_size,
+                              overflow_policy=args.policy, stats_interval=0,
+                              fps=args.fps, spin_us=args.spin_us,
+                              max_trade_age={'binance': args.max_trade_age, 'coinbase': args.max_trade_age},
+                              batch=args.batch)
+    bridge.apply_config(default_config())
+    bridge.rng.seed(0)
+    # Run the bridge clock on the feed's own timestamps so trade ages follow the pacing
+    feed_epoch = _feed_epoch(frames, bridge.decoder)
+    if feed_epoch is not None:
+        bridge.clock = lambda: feed_epoch + time.perf_counter() - wall_start
+    latencies = []
+
+    def on_played(action, first_key_ns, dequeued_ns):
+        if action.received_ns is not None and first_key_ns is not None:
+            latencies.append(first_key_ns - action.received_ns)
+
+    for executor in bridge.executors.values():
+        executor.on_played = on_played
+    bridge.start_executors()
+
+    handlers = {'binance': bridge.on_binance_message, 'coinbase': bridge.on_coinbase_message}
+    handler_ns = 0
+    wall_start = time.perf_counter()
+    for offset, exchange, frame in frames:
+        delay = wall_start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        t0 = time.perf_counter_ns()
+        handlers[exchange](None, frame)
+        handler_ns += time.perf_counter_ns() - t0
+    feed_seconds = time.perf_counter() - wall_start
+    drained = bridge.wait_idle(args.drain_timeout)
+    bridge.shutdown()
+
+    queues = [executor.queue for executor in bridge.executors.values()]
+    enqueued = sum(q.enqueued for q in queues)
+    dropped = sum(q.dropped for q in queues)
+    merged = sum(q.merged for q in queues)
+    decided = enqueued + dropped + merged
+    latencies.sort()
+    ms = lambda ns: None if ns is None else ns / 1e6
+    return {
+        'label': label,
+        'messages': len(frames),
+        'offered_rate': len(frames) / frames[-1][0] if frames and frames[-1][0] else None,
+        'achieved_rate': len(frames) / feed_seconds if feed_seconds else None,
+        'handler_capacity_msgs_per_s': len(frames) / (handler_ns / 1e9) if handler_ns else None,
+        'handler_avg_us': handler_ns / len(frames) / 1000 if frames else None,
+        'actions': decided,
+        'played': len(latencies),
+        'dropped_fraction': dropped / decided if decided else 0.0,
+        'coalesced_fraction': merged / decided if decided else 0.0,
+        'drained': drained,
+        'stale_fraction': sum(bridge.stale_trades.values()) / len(frames) if frames else 0.0,
+        'latency_ms': {
+            'p50': ms(_percentile(latencies, 50)),
+            'p99': ms(_percentile(latencies, 99)),
+            'p999': ms(_percentile(latencies, 99.9)),
+            'max': ms(latencies[-1] if latencies else None),
+        },
+        'key_events': bridge.keyboard.count,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def _legacy_decode_binance(message):
+    data = json.loads(message)
+    return float(data.get('q', 0)), data.get('m', False)
+
+
+def _legacy_decode_coinbase(message):
+    data = json.loads(message)
+    if data.get('type') != 'match':
+        return None
+    return float(data.get('size', 0)), data.get('side', '')
+
+
+def coinbase_control_frames(rng, count):
+    """Non-trade frames Coinbase sends on the matches socket"""
+    frames = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            frames.append(json.dumps({'type': 'heartbeat', 'sequence': i, 'last_trade_id': i,
+                                      'product_id': 'BTC-USD', 'time': '2026-01-01T00:00:00.000000Z'}))
+        elif kind == 1:
+            frames.append(json.dumps({'type': 'subscriptions', 'channels': [
+                {'name': 'matches', 'product_ids': ['BTC-USD']}]}))
+        else:
+            frames.append(_coinbase_frame(rng, i, 0.01, 0).replace('"type": "match"', '"type": "last_match"'))
+    return frames
+
+
+def bench_decode(args):
+    from decoders import create_decoder, DECODERS
+
+    rng = random.Random(args.seed)
+    feed = synthetic_feed(args.frames, 1.0, seed=args.seed)
+    binance = [frame for _, exchange, frame in feed if exchange == 'binance']
+    coinbase = [frame for _, exchange, frame in feed if exchange == 'coinbase']
+    control = coinbase_control_frames(rng, int(len(coinbase) * args.non_match / (1 - args.non_match)))
+    coinbase_mix = coinbase + control
+    rng.shuffle(coinbase_mix)
+    print(f"{len(binance)} Binance frames, {len(coinbase_mix)} Coinbase frames "
+          f"({len(control)} non-match)")
+
+    def timed(decode, frames):
+        def run():
+            for frame in frames:
+                decode(frame)
+        return _best_of(args.repeat, run) / len(frames) * 1e9
+
+    rows = [('legacy json', timed(_legacy_decode_binance, binance),
+             timed(_legacy_decode_coinbase, coinbase_mix))]
+    for name in DECODERS[1:]:
+        try:
+            decoder = create_decoder(name)
+        except ImportError:
+            print(f"{name:>12}: not installed")
+            continue
+        for frame in binance[:100]:
+            assert decoder.binance(frame).quantity == _legacy_decode_binance(frame)[0]
+        rows.append((name, timed(decoder.binance, binance), timed(decoder.coinbase, coinbase_mix)))
+
+    print(f"{'decoder':>12}  {'binance ns/frame':>17}  {'coinbase ns/frame':>18}")
+    for name, binance_ns, coinbase_ns in rows:
+        print(f"{name:>12}  {binance_ns:17.0f}  {coinbase_ns:18.0f}")
+
+
+def bench_metrics(args):
+    """Per-trade cost of the latency instrumentation.
+
+    Times the exact statements the handlers add when metrics are on, then the
+    whole handlers with metrics off and on (interleaved, best of --repeat).
+    """
+    from bridge import CryptoMAMEBridge
+    from actions import Action
+    from metrics import BridgeMetrics
+
+    logging.disable(logging.WARNING)
+    feed = synthetic_feed(args.frames, 1.0, seed=args.seed)
+    count = len(feed)
+
+    metrics = BridgeMetrics(('binance',), max_pending=count)
+    perf_counter_ns, clock = time.perf_counter_ns, time.time
+    action = Action('attack', 'Med', None, time.perf_counter(), 1, perf_counter_ns())
+
+    def run_empty():
+        for _ in range(count):
+            pass
+
+    def run_trade():
+        for _ in range(count):
+            decoded_ns = perf_counter_ns()
+            metrics.trade('binance', 1700000000000, decoded_ns, decoded_ns, perf_counter_ns(), clock())
+
+    def run_played():
+        for _ in range(count):
+            metrics.played('binance', action, perf_counter_ns(), perf_counter_ns())
+
+    def timed(run):
+        best = best_collect = float('inf')
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            run()
+            t1 = time.perf_counter()
+            metrics.collect()
+            best = min(best, t1 - t0)
+            best_collect = min(best_collect, time.perf_counter() - t1)
+        return best / count * 1e9, best_collect / count * 1e9
+
+    empty_ns = _best_of(args.repeat, run_empty) / count * 1e9
+    trade_ns, trade_collect_ns = timed(run_trade)
+    played_ns, played_collect_ns = timed(run_played)
+
+    # Inactive config: the trigger lookup returns at once, so the timing is the handler itself
+    config = default_config()
+    config['isActive'] = False
+    runs = {}
+    for enabled in (False, True):
+        bridge = CryptoMAMEBridge(keyboard='null', decoder=args.decoder, metrics=enabled)
+        bridge.apply_config(config)
+        handlers = {'binance': bridge.on_binance_message, 'coinbase': bridge.on_coinbase_message}
+        runs[enabled] = [(handlers[exchange], frame) for _, exchange, frame in feed]
+    best = {False: float('inf'), True: float('inf')}
+    for _ in range(args.repeat):
+        for enabled, calls in runs.items():
+            t0 = time.perf_counter()
+            for handler, frame in calls:
+                handler(None, frame)
+            best[enabled] = min(best[enabled], time.perf_counter() - t0)
+            bridge.metrics.collect()
+    off_ns, on_ns = (best[enabled] / count * 1e9 for enabled in (False, True))
+
+    print(f"{count} frames, decoder {bridge.decoder.name}")
+    print(f"hot path, feed thread:        {trade_ns - empty_ns:6.0f} ns/trade")
+    print(f"hot path, executor:           {played_ns - empty_ns:6.0f} ns/action")
+    print(f"metrics.collect (stats loop): {trade_collect_ns:6.0f} ns/trade, {played_collect_ns:.0f} ns/action")
+    print(f"handler, metrics off:         {off_ns:6.0f} ns/trade")
+    print(f"handler, metrics on:          {on_ns:6.0f} ns/trade")
+    for exchange in bridge.metrics.histograms:
+        print(f"{exchange}: {bridge.metrics.summary(exchange)}")
+
+
+def _feed_server(port, rate, seed, ready, bursts=(), cycle=0):
+    """Child process: the local exchange simulator (exchange_sim.py) streaming trades stamped with the send time"""
+    from exchange_sim import ExchangeSimulator
+
+    logging.disable(logging.WARNING)
+    ExchangeSimulator(rate, bursts=bursts, cycle=cycle, seed=seed, stats_interval=0).run('127.0.0.1', port, ready)
+
+
+def _run_io_mode(mode, port, warmup, duration, spin_us, results):
+    """Child process: run one bridge I/O mode against the local feed server and report CPU and wakeups"""
+    import resource
+    import threading
+    from bridge import CryptoMAMEBridge
+    from async_feeds import AsyncBridgeRunner
+
+    logging.disable(logging.WARNING)
+    bridge = CryptoMAMEBridge(keyboard='null', stats_interval=0, spin_us=spin_us, metrics=True,
+                              binance_ws_url=f"ws://127.0.0.1:{port}/ws", coinbase_ws_url=f"ws://127.0.0.1:{port}/")
+    bridge.apply_config(default_config())
+    samples = []
+
+    def snapshot():
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        bridge.metrics.collect()
+        samples.append((time.perf_counter(), usage.ru_utime + usage.ru_stime,
+                        usage.ru_nvcsw, usage.ru_nivcsw, sum(bridge.metrics.trades.values()),
+                        threading.active_count()))
+
+    def finish():
+        snapshot()
+        bridge.stop()
+
+    threading.Timer(warmup, snapshot).start()
+    threading.Timer(warmup + duration, finish).start()
+    if mode == 'asyncio':
+        AsyncBridgeRunner(bridge).run()
+    else:
+        bridge.run_threads()
+
+    (t0, cpu0, vol0, invol0, trades0, _), (t1, cpu1, vol1, invol1, trades1, threads) = samples
+    elapsed = t1 - t0
+    exchange = bridge.metrics.histograms['binance']['exchange']
+    results.put({
+        'mode': mode,
+        'trades_per_s': (trades1 - trades0) / elapsed,
+        'cpu_pct': (cpu1 - cpu0) / elapsed * 100,
+        'wakeups_per_s': (vol1 - vol0) / elapsed,
+        'preemptions_per_s': (invol1 - invol0) / elapsed,
+        # Excluding the benchmark's own timer thread
+        'threads': threads - 1,
+        'receive_p50_ms': (exchange.percentile(50) or 0) / 1e6,
+        'receive_p99_ms': (exchange.percentile(99) or 0) / 1e6,
+    })
+
+
+def bench_io(args):
+    """Threaded vs asyncio feed ingestion against a local websocket server, one process per run"""
+    import multiprocessing
+
+    ctx = multiprocessing.get_context('spawn')
+    rows = []
+    for rate in args.rates:
+        ready = ctx.Event()
+        server = ctx.Process(target=_feed_server, args=(args.port, rate, args.seed, ready), daemon=True)
+        server.start()
+        try:
+            if not ready.wait(30):
+                raise RuntimeError("feed server did not start")
+            for mode in args.modes:
+                results = ctx.Queue()
+                child = ctx.Process(target=_run_io_mode,
+                                    args=(mode, args.port, args.warmup, args.duration, args.spin_us, results))
+                child.start()
+                result = results.get(timeout=args.warmup + args.duration + 60)
+                child.join()
+                result['rate'] = rate
+                rows.append(result)
+                print(f"{rate:>6}/s {mode:>8}: {result['trades_per_s']:7.0f} trades/s, "
+                      f"CPU {result['cpu_pct']:5.1f}%, {result['wakeups_per_s']:7.0f} wakeups/s, "
+                      f"{result['preemptions_per_s']:5.0f} preemptions/s, {result['threads']} threads, "
+                      f"receive p50 {result['receive_p50_ms']:.1f}ms p99 {result['receive_p99_ms']:.1f}ms")
+        finally:
+            server.terminate()
+            server.join()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'commit': _git_commit(), 'python': platform.python_version(), 'results': rows}, f, indent=2)
+
+
+def _config_server(config):
+    """Local stand-in for the dashboard: GET /api/configurations with an ETag, 304 on If-None-Match"""
+    import hashlib
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = json.dumps(config).encode('utf-8')
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are separate writes; without this keep-alive responses stall on delayed ACKs
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_reload(args):
+    """Cost of one config poll: unconditional fetch + compile vs conditional poll over a pooled session"""
+    import requests
+    from bridge import CryptoMAMEBridge
+    from config_snapshot import compile_snapshot
+
+    logging.disable(logging.WARNING)
+    config = default_config()
+    server = _config_server(config)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def legacy_poll():
+        # The original fetch_config: new connection, full body, recompile every time
+        response = requests.get(f"{url}/api/configurations", timeout=5)
+        compile_snapshot(response.json())
+
+    bridge = CryptoMAMEBridge(url, keyboard='null')
+    bridge.fetch_config()
+
+    def changed_poll():
+        # Config changed: full body and recompile, over the pooled connection
+        bridge.snapshot = bridge.snapshot._replace(config=None, etag=None)
+        bridge.fetch_config()
+
+    rows = [('fetch + compile (legacy)', legacy_poll),
+            ('changed config (session)', changed_poll),
+            ('unchanged config (304)', bridge.fetch_config)]
+    print(f"{'poll':>26}  {'ms/poll':>8}")
+    for name, poll in rows:
+        def run():
+            for _ in range(args.polls):
+                poll()
+        print(f"{name:>26}  {_best_of(args.repeat, run) / args.polls * 1000:8.3f}")
+    print(f"compile only: {_best_of(args.repeat, lambda: compile_snapshot(config)) * 1000:.3f} ms")
+    server.shutdown()
+
+
+def _trades_server(frames):
+    """Local stand-in for the exchanges' REST trade endpoints, serving the trades in `frames`.
+
+    GET /api/v3/aggTrades?fromId=&limit= (Binance, oldest first) and
+    GET /products/<product>/trades?after=&limit= (Coinbase, newest first).
+    """
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlsplit, parse_qs
+
+    binance, coinbase = {}, {}
+    for offset, exchange, frame in frames:
+        data = json.loads(frame)
+        if exchange == 'binance':
+            binance[data['a']] = {k: data[k] for k in ('a', 'p', 'q', 'f', 'l', 'T', 'm', 'M')}
+        else:
+            coinbase[data['trade_id']] = {k: data[k] for k in ('time', 'trade_id', 'price', 'size', 'side')}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = {k: int(v[0]) for k, v in parse_qs(url.query).items() if v[0].isdigit()}
+            limit = query.get('limit', 1000)
+            if url.path == '/api/v3/aggTrades':
+                start = query.get('fromId', 1)
+                page = [binance[i] for i in range(start, start + limit) if i in binance]
+            elif url.path.endswith('/trades'):
+                before = query.get('after', max(coinbase, default=0) + 1)
+                page = [coinbase[i] for i in range(before - 1, max(before - 1 - limit, 0), -1) if i in coinbase]
+            else:
+                self.send_error(404)
+                return
+            body = json.dumps(page).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _lossy_feed(frames, gap_every, gap_size, duplicate_every, seed):
+    """frames with runs of gap_size trades dropped and some trades delivered twice, as after reconnects"""
+    rng = random.Random(seed)
+    lossy = []
+    skip = 0
+    for i, item in enumerate(frames):
+        if skip:
+            skip -= 1
+            continue
+        if gap_every and i and rng.random() < 1 / gap_every:
+            skip = gap_size - 1
+            continue
+        lossy.append(item)
+        if duplicate_every and rng.random() < 1 / duplicate_every:
+            lossy.append(item)
+    return lossy
+
+
+def bench_resync(args):
+    """Trade id tracking on a feed with gaps and duplicates: skip to live vs REST catch-up"""
+    from bridge import CryptoMAMEBridge
+    from feed_sequence import SequenceTracker, TradeCatchup
+
+    logging.disable(logging.WARNING)
+    frames = synthetic_feed(args.rate, args.duration, seed=args.seed)
+    lossy = _lossy_feed(frames, args.gap_every, args.gap_size, args.duplicate_every, args.seed)
+    server = _trades_server(frames)
+    rest_url = f"http://127.0.0.1:{server.server_address[1]}"
+    sent = {'binance': 0, 'coinbase': 0}
+    for offset, exchange, frame in frames:
+        sent[exchange] += 1
+
+    ids = list(range(1, len(frames) + 1))
+    tracker = SequenceTracker()
+    check_ns = _best_of(args.repeat, lambda: [tracker.check(i) for i in ids]) / len(ids) * 1e9
+    print(f"{len(frames)} trades sent, {len(lossy)} delivered; SequenceTracker.check {check_ns:.0f} ns/trade")
+
+    for policy in ('skip', 'catch-up'):
+        bridge = CryptoMAMEBridge(keyboard='null', stats_interval=0, spin_us=0, queue_size=1 << 20,
+                                  resync=policy, catchup=TradeCatchup(rest_url, rest_url))
+        bridge.apply_config(default_config())
+        bridge.start_executors()
+        handlers = {'binance': bridge.on_binance_message, 'coinbase': bridge.on_coinbase_message}
+        for offset, exchange, frame in lossy:
+            handlers[exchange](None, frame)
+        # Catch-up runs on worker threads; wait for them to finish
+        deadline = time.monotonic() + 30
+        while policy == 'catch-up' and time.monotonic() < deadline and any(
+                bridge.caught_up[e] < bridge.sequences[e].missed for e in sent):
+            time.sleep(0.01)
+        bridge.wait_idle(30)
+        bridge.shutdown()
+        for exchange, sequence in bridge.sequences.items():
+            played = bridge.executors[exchange].queue.enqueued
+            print(f"{policy:>8} {exchange:>8}: {sequence.gaps} gaps, {sequence.missed} missed, "
+                  f"{sequence.duplicates} duplicates dropped, {bridge.caught_up[exchange]} caught up, "
+                  f"{played} actions queued")
+    server.shutdown()
+
+
+def bench_batch(args):
+    """Decision cost: handle_trade per trade vs buffering + one NumPy-classified decision per frame window"""
+    from bridge import CryptoMAMEBridge
+    from decoders import create_decoder
+    from frame_batcher import BATCH_RULES
+
+    logging.disable(logging.WARNING)
+    period = 1.0 / args.fps
+    for rate in args.rates:
+        frames = synthetic_feed(rate, args.duration, seed=args.seed)
+        print(f"{rate}/s, {len(frames)} trades, {period * 1000:.1f} ms windows")
+        for rule in (None,) + BATCH_RULES:
+            decoder = create_decoder()
+            # Trades grouped by frame window: [[(quantity, exchange, side), ...], ...]
+            windows = {}
+            for offset, exchange, frame in frames:
+                trade = getattr(decoder, exchange)(frame)
+                windows.setdefault(int(offset / period), []).append((trade.quantity, exchange, trade.side))
+
+            def run():
+                bridge = CryptoMAMEBridge(keyboard='null', fps=args.fps, batch=rule, queue_size=1 << 24)
+                bridge.apply_config(default_config())
+                # Cooldowns and jump/crouch delays follow the feed time, not the benchmark's speed
+                now = [0.0]
+                bridge.clock = lambda: now[0]
+                on_trade = bridge.on_trade
+                feed_ns = flush_ns = 0
+                for frame_number, window in windows.items():
+                    now[0] = frame_number * period
+                    t0 = time.perf_counter_ns()
+                    for quantity, exchange, side in window:
+                        on_trade(quantity, exchange, side)
+                    t1 = time.perf_counter_ns()
+                    if rule:
+                        bridge.batcher.flush()
+                    flush_ns += time.perf_counter_ns() - t1
+                    feed_ns += t1 - t0
+                actions = sum(executor.queue.enqueued for executor in bridge.executors.values())
+                decisions = sum(bridge.batcher.decisions.values()) if rule else None
+                return feed_ns, flush_ns, decisions, actions
+
+            feed_ns, flush_ns, decisions, actions = min(run() for _ in range(args.repeat))
+            line = f"{rule or 'per trade':>10}: feed thread {feed_ns / len(frames):6.0f} ns/trade"
+            if rule:
+                line += f", batcher {flush_ns / len(frames):6.0f} ns/trade, {decisions} decisions"
+            print(f"{line}, {actions} actions queued")
+
+
+def _virtual_key_stream(frames, seconds):
+    """Key events of the plans the bridge queues for `frames`, each player's executor busy back to back.
+
+    Returns [(t_ns, exchange, events)] for the first `seconds` of play, both players merged in time order.
+    """
+    from bridge import CryptoMAMEBridge
+
+    bridge = CryptoMAMEBridge(keyboard='null', queue_size=1 << 24)
+    bridge.apply_config(default_config())
+    bridge.rng.seed(0)
+    now = [0.0]
+    bridge.clock = lambda: now[0]
+    handlers = {'binance': bridge.on_binance_message, 'coinbase': bridge.on_coinbase_message}
+    for offset, exchange, frame in frames:
+        now[0] = offset
+        handlers[exchange](None, frame)
+    stream = []
+    for exchange, executor in bridge.executors.items():
+        scheduler = bridge.schedulers[exchange]
+        t = 0
+        while t < seconds * 1e9:
+            action = executor.queue.get(0)
+            if action is None:
+                break
+            groups, end_ns = scheduler.schedule(action.plan)
+            stream += [(t + offset_ns, exchange, events) for offset_ns, events in groups]
+            t += end_ns
+    stream.sort(key=lambda item: item[0])
+    return stream
+
+
+def bench_keys(args):
+    """OS key events: every plan event sent as-is vs through the held-key tracker"""
+    from key_state import KeyStateTracker
+    from keyboards import RecordingBackend
+
+    logging.disable(logging.WARNING)
+    stream = _virtual_key_stream(synthetic_feed(args.rate, args.duration, seed=args.seed), args.play_seconds)
+    events = sum(len(group) for _, _, group in stream)
+    print(f"{events} plan key events over {args.play_seconds:g}s of play by both players")
+
+    raw = RecordingBackend()
+    t0 = time.perf_counter_ns()
+    for _, _, group in stream:
+        raw.send(group)
+    raw_ns = time.perf_counter_ns() - t0
+    down = set()
+    repressed = 0
+    for _, action, key in raw.events():
+        if action == 'press':
+            repressed += key in down
+            down.add(key)
+        else:
+            down.discard(key)
+    print(f"{'raw':>8}: {raw.count:6d} OS events ({repressed} presses of keys already down), "
+          f"{raw_ns / events:5.0f} ns/event, stuck at the end: {', '.join(sorted(down)) or 'none'}")
+
+    tracked = RecordingBackend()
+    tracker = KeyStateTracker(tracked, ('binance', 'coinbase'))
+    t0 = time.perf_counter_ns()
+    for _, exchange, group in stream:
+        tracker.send(exchange, group)
+    tracked_ns = time.perf_counter_ns() - t0
+    held = tracker.held()
+    tracker.release_all()
+    print(f"{'tracked':>8}: {tracked.count - len(held):6d} OS events "
+          f"({sum(tracker.deduplicated.values())} redundant dropped), {tracked_ns / events:5.0f} ns/event, "
+          f"held at the end: {', '.join(sorted(held)) or 'none'} (released on shutdown)")
+
+
+def bench_priority(args):
+    """Attacks arriving during a long hold (2 s charge, 1.75 s crouch): how long they wait under each scheduler"""
+    from actions import SCHEDULERS
+    from bridge import CryptoMAMEBridge
+
+    logging.disable(logging.WARNING)
+    crouch = lambda plans: plans.key_press('e', 1750, release=False)
+    firsts = [('special', 'charge', lambda plans: plans.command(args.charge)),
+              ('crouch', 'binanceCrouch', crouch)]
+    # (seconds after the first action, kind, name, plan builder)
+    arrivals = [(0.3, 'attack', 'Strong', lambda plans: plans.key_press('v', 100)),
+                (0.5, 'movement', 'MoveForward', lambda plans: plans.key_press('f', 500)),
+                (0.8, 'attack', 'Strong', lambda plans: plans.key_press('v', 100)),
+                (1.2, 'attack', 'Med', lambda plans: plans.key_press('c', 100))]
+    for first_kind, first_name, first_plan in firsts:
+        print(f"{first_name} first, then attacks and a movement:")
+        for scheduler in SCHEDULERS:
+            bridge = CryptoMAMEBridge(keyboard='recording', spin_us=args.spin_us, scheduler=scheduler)
+            bridge.apply_config(default_config())
+            played = []
+            executor = bridge.executors['binance']
+            executor.on_played = lambda action, first_key_ns, dequeued_ns: played.append(
+                (action.kind, action.name, (first_key_ns - action.received_ns) / 1e6 if first_key_ns else None))
+            bridge.start_executors()
+            start = time.perf_counter_ns()
+            bridge.enqueue('binance', first_kind, first_name, first_plan(bridge.plans), start)
+            for delay, kind, name, build in arrivals:
+                time.sleep(max(0.0, start / 1e9 + delay - time.perf_counter()))
+                bridge.enqueue('binance', kind, name, build(bridge.plans), time.perf_counter_ns())
+            bridge.wait_idle(10)
+            elapsed = (time.perf_counter_ns() - start) / 1e9
+            bridge.shutdown()
+            attack_waits = [wait for kind, _, wait in played if kind == 'attack' and wait is not None]
+            cancelled = sum(executor.preempted.values())
+            print(f"{scheduler:>12}: attacks wait avg {sum(attack_waits) / len(attack_waits):5.0f}ms "
+                  f"max {max(attack_waits):5.0f}ms, {cancelled} cancelled, "
+                  f"{sum(executor.interleaved.values())} interleaved, all done after {elapsed:.2f}s, "
+                  f"finished: {' > '.join(name for _, name, _ in played)}")
+
+
+def _run_inject(frames, injector, args):
+    """Feed frames through one bridge at their offsets; return key timing jitter stats per exchange"""
+    from bridge import CryptoMAMEBridge
+
+    bridge = CryptoMAMEBridge(keyboard='recording', stats_interval=0, fps=args.fps, spin_us=args.spin_us,
+                              injector=injector)
+    bridge.apply_config(default_config())
+    bridge.rng.seed(0)
+    bridge.start_executors()
+    # The injector process takes a moment to spawn; start the feed once it is listening
+    bridge.wait_idle(30)
+    handlers = {'binance': bridge.on_binance_message, 'coinbase': bridge.on_coinbase_message}
+    wall_start = time.perf_counter()
+    for offset, exchange, frame in frames:
+        delay = wall_start + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        handlers[exchange](None, frame)
+    bridge.wait_idle(args.drain_timeout)
+    bridge.shutdown()
+    if bridge.injector is not None:
+        return bridge.injector.final_stats, bridge.injector.ring.dropped
+    return {exchange: scheduler.jitter.stats() for exchange, scheduler in bridge.schedulers.items()}, 0
+
+
+def bench_inject(args):
+    """Key timing jitter with the feeds decoded in the same process vs a separate injection process"""
+    logging.disable(logging.WARNING)
+    rows = []
+    for rate in args.rates:
+        frames = synthetic_feed(rate, args.duration, seed=args.seed)
+        for injector in args.injectors:
+            stats, ring_dropped = _run_inject(frames, injector, args)
+            rows.append({'rate': rate, 'injector': injector, 'ring_dropped': ring_dropped, 'jitter_us': stats})
+            players = ', '.join(f"{exchange} {s['events']} events p50 {s['p50_us']:.0f}us "
+                                f"p99 {s['p99_us']:.0f}us max {s['max_us']:.0f}us"
+                                for exchange, s in stats.items())
+            print(f"{rate:>6}/s {injector:>8}: {players}, ring drops {ring_dropped}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'commit': _git_commit(), 'python': platform.python_version(),
+                       'settings': {k: v for k, v in vars(args).items() if k != 'func'}, 'results': rows},
+                      f, indent=2)
+
+
+class _CountingSink:
+    """Log stream writing to /dev/null and counting the lines written"""
+
+    def __init__(self):
+        import os
+        self.file = open(os.devnull, 'w')
+        self.lines = 0
+
+    def write(self, text):
+        self.lines += text.count('\n')
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+
+def bench_logging(args):
+    """Feed handler cost with trigger logging written inline, through a listener thread, and limited"""
+    from bridge import CryptoMAMEBridge
+    from log_pipeline import LOG_FORMAT, LogPipeline, parse_limits
+
+    frames = synthetic_feed(args.rate, args.duration, seed=args.seed)
+    # The plain basicConfig handler runs first: installing a LogPipeline changes the record settings
+    modes = [('basicConfig (no pipeline)', None, None), ('sync', False, None), ('queue', True, None),
+             (f"queue + limit {' '.join(args.limit)}", True, parse_limits(args.limit))]
+    for label, use_queue, limits in modes:
+        sink = _CountingSink()
+        if use_queue is None:
+            handler = logging.StreamHandler(sink)
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            logging.getLogger().handlers[:] = [handler]
+            logs = None
+        else:
+            logs = LogPipeline(use_queue, limits, args.interval, stream=sink).install()
+        bridge = CryptoMAMEBridge(keyboard='null', stats_interval=0, logs=logs)
+        bridge.apply_config(default_config())
+        bridge.rng.seed(0)
+        handlers = {'binance': bridge.on_binance_message, 'coinbase': bridge.on_coinbase_message}
+        start = time.perf_counter_ns()
+        for _, exchange, frame in frames:
+            handlers[exchange](None, frame)
+        elapsed = time.perf_counter_ns() - start
+        if logs:
+            logs.close()
+        print(f"{label:>28}: {elapsed / len(frames) / 1000:6.2f}us per frame in the feed thread, "
+              f"{sink.lines} log lines written")
+    logging.getLogger().handlers.clear()
+
+
+def bench_soak(args):
+    """Long run against the local exchange simulator: memory growth and latency drift per window"""
+    import multiprocessing
+    import threading
+    from bridge import CryptoMAMEBridge
+    from exchange_sim import parse_burst
+    from feed_sequence import TradeCatchup
+
+    logging.disable(logging.WARNING)
+    ctx = multiprocessing.get_context('spawn')
+    ready = ctx.Event()
+    bursts = [parse_burst(spec) for spec in args.burst]
+    server = ctx.Process(target=_feed_server, args=(args.port, args.rate, args.seed, ready, bursts, args.cycle),
+                         daemon=True)
+    server.start()
+    try:
+        if not ready.wait(30):
+            raise RuntimeError("exchange simulator did not start")
+        base = f"127.0.0.1:{args.port}"
+        bridge = CryptoMAMEBridge(keyboard='null', stats_interval=0, spin_us=args.spin_us, metrics=True,
+                                  max_trade_age={'binance': args.max_trade_age, 'coinbase': args.max_trade_age},
+                                  resync=args.resync, catchup=TradeCatchup(f"http://{base}", f"http://{base}"),
+                                  binance_ws_url=f"ws://{base}/ws", coinbase_ws_url=f"ws://{base}/")
+        bridge.apply_config(default_config())
+        window = []
+        for executor in bridge.executors.values():
+            def on_played(action, first_key_ns, dequeued_ns, record=executor.on_played):
+                record(action, first_key_ns, dequeued_ns)
+                if action.received_ns is not None and first_key_ns is not None:
+                    window.append(first_key_ns - action.received_ns)
+            executor.on_played = on_played
+        rows = []
+
+        def sample(start, last_trades):
+            while not bridge.stopped.wait(args.interval):
+                bridge.metrics.collect()
+                trades = sum(bridge.metrics.trades.values())
+                latencies = sorted(window)
+                window.clear()
+                row = {
+                    'elapsed_s': time.perf_counter() - start,
+                    'trades_per_s': (trades - last_trades) / args.interval,
+                    'played': len(latencies),
+                    'p50_ms': (_percentile(latencies, 50) or 0) / 1e6,
+                    'p99_ms': (_percentile(latencies, 99) or 0) / 1e6,
+                    'rss_mb': _rss_mb(),
+                    'gaps': sum(s.gaps for s in bridge.sequences.values()),
+                }
+                last_trades = trades
+                rows.append(row)
+                print(f"{row['elapsed_s']:7.0f}s: {row['trades_per_s']:7.0f} trades/s, {row['played']:5} played, "
+                      f"latency p50 {row['p50_ms']:6.1f}ms p99 {row['p99_ms']:6.1f}ms, "
+                      f"RSS {row['rss_mb']:.1f}MB, {row['gaps']} gap(s)")
+                if row['elapsed_s'] >= args.duration:
+                    bridge.stop()
+
+        threading.Thread(target=sample, args=(time.perf_counter(), 0), daemon=True).start()
+        if args.io == 'asyncio':
+            from async_feeds import AsyncBridgeRunner
+            AsyncBridgeRunner(bridge).run()
+        else:
+            bridge.run_threads()
+    finally:
+        server.terminate()
+        server.join()
+    # The first window includes connecting and warm-up
+    steady = rows[1:] or rows
+    if len(steady) >= 2:
+        hours = (steady[-1]['elapsed_s'] - steady[0]['elapsed_s']) / 3600
+        print(f"RSS {steady[0]['rss_mb']:.1f} -> {steady[-1]['rss_mb']:.1f}MB "
+              f"({(steady[-1]['rss_mb'] - steady[0]['rss_mb']) / hours:+.1f}MB/h), "
+              f"p99 {steady[0]['p99_ms']:.1f} -> {steady[-1]['p99_ms']:.1f}ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'commit': _git_commit(), 'python': platform.python_version(),
+                       'settings': {k: v for k, v in vars(args).items() if k != 'func'}, 'windows': rows},
+                      f, indent=2)
+
+
+def bench_adaptive(args):
+    """Actions per minute through volume regime shifts: fixed ranges vs adaptive percentile ranges"""
+    from bridge import CryptoMAMEBridge
+    from range_calibration import QuantitySketch
+
+    logging.disable(logging.WARNING)
+    # (minutes, mean log trade size): normal, a 7x heavier regime, then a 7x lighter one
+    phases = [(args.phase_minutes, mu) for mu in args.regimes]
+    results = {}
+    for mode in ('fixed', 'adaptive'):
+        bridge = CryptoMAMEBridge(keyboard='null', stats_interval=0,
+                                  adaptive_window=args.window if mode == 'adaptive' else 0,
+                                  adaptive_interval=args.interval)
+        bridge.apply_config(default_config())
+        bridge.rng.seed(0)
+        now = [0.0]
+        bridge.clock = lambda: now[0]
+        actions = []
+        enqueue = bridge.enqueue
+        bridge.enqueue = lambda exchange, kind, *rest: (actions.append((now[0], kind)), enqueue(exchange, kind, *rest))
+        handlers = {'binance': bridge.on_binance_message, 'coinbase': bridge.on_coinbase_message}
+        builders = {'binance': _binance_frame, 'coinbase': _coinbase_frame}
+        trade_ids = {'binance': 1, 'coinbase': 1}
+        rng = random.Random(args.seed)
+        t = 0.0
+        next_tick = 1.0
+        phase_start = 0.0
+        for minutes, mu in phases:
+            phase_end = phase_start + minutes * 60
+            while True:
+                t += rng.expovariate(args.rate)
+                if t >= phase_end:
+                    t = phase_end
+                    break
+                while next_tick <= t:
+                    now[0] = next_tick
+                    if bridge.calibrator:
+                        bridge.calibrator.tick(next_tick)
+                    next_tick += 1.0
+                now[0] = t
+                exchange = 'binance' if rng.random() < 0.5 else 'coinbase'
+                quantity = min(rng.lognormvariate(mu, 2.0), 50.0)
+                handlers[exchange](None, builders[exchange](rng, trade_ids[exchange], quantity, int(t * 1000)))
+                trade_ids[exchange] += 1
+            phase_start = phase_end
+        per_minute = [0] * int(phase_start // 60)
+        for at, _ in actions:
+            per_minute[min(int(at // 60), len(per_minute) - 1)] += 1
+        results[mode] = per_minute
+        updates = bridge.calibrator.updates if bridge.calibrator else 0
+        print(f"{mode:>9}: actions/min by phase " + ", ".join(
+            f"mu {mu:g}: {sum(per_minute[int(i * args.phase_minutes):int((i + 1) * args.phase_minutes)]) / args.phase_minutes:6.0f}"
+            for i, (_, mu) in enumerate(phases)) + f" ({updates} range updates)")
+    for mode, per_minute in results.items():
+        steady = per_minute[int(args.window // 60) + 1:]
+        mean = sum(steady) / len(steady)
+        spread = (sum((n - mean) ** 2 for n in steady) / len(steady)) ** 0.5
+        print(f"{mode:>9}: after the first window {mean:.0f} actions/min, "
+              f"min {min(steady)} max {max(steady)}, coefficient of variation {spread / mean if mean else 0:.2f}")
+
+    sketch = QuantitySketch()
+    quantities = [rng.lognormvariate(-7.0, 2.0) for _ in range(100000)]
+    per_add = _best_of(3, lambda: [sketch.add(q) for q in quantities]) / len(quantities)
+    print(f"QuantitySketch.add: {per_add * 1e9:.0f}ns per trade")
+
+
+def bench_limits(args):
+    """Button presses per second offered to vs admitted into the action queues, with and without input limits"""
+    from bridge import PLAYERS, CryptoMAMEBridge
+    from command_plans import PlanCache
+    from input_limits import InputLimiter, parse_rate_limits
+
+    logging.disable(logging.WARNING)
+    limits = parse_rate_limits(args.limit or ['attack=10:5', 'movement=5:2', 'jump_crouch=2:1',
+                                              'special=2:2', 'total=15:8'])
+    for mode in ('unlimited', 'limited'):
+        bridge = CryptoMAMEBridge(keyboard='null', stats_interval=0,
+                                  input_rates=limits if mode == 'limited' else None)
+        bridge.apply_config(default_config())
+        bridge.rng.seed(0)
+        now = [0.0]
+        bridge.clock = lambda: now[0]
+        presses = InputLimiter({}, ()).cost
+        offered = {}
+        admitted = {}
+        enqueue = bridge.enqueue
+        enqueue_action = bridge.enqueue_action
+
+        def count(totals, exchange, plan):
+            totals[exchange] = totals.get(exchange, 0) + presses(plan)
+
+        bridge.enqueue = lambda exchange, kind, name, plan, *rest: (
+            plan is not None and count(offered, exchange, plan), enqueue(exchange, kind, name, plan, *rest))
+        bridge.enqueue_action = lambda exchange, action: (
+            count(admitted, exchange, action.plan), enqueue_action(exchange, action))
+        handlers = {'binance': bridge.on_binance_message, 'coinbase': bridge.on_coinbase_message}
+        builders = {'binance': _binance_frame, 'coinbase': _coinbase_frame}
+        trade_ids = {'binance': 1, 'coinbase': 1}
+        rng = random.Random(args.seed)
+        t = 0.0
+        while True:
+            t += rng.expovariate(args.rate)
+            if t >= args.duration:
+                break
+            now[0] = t
+            exchange = 'binance' if rng.random() < 0.5 else 'coinbase'
+            handlers[exchange](None, builders[exchange](rng, trade_ids[exchange], min(rng.lognormvariate(-5.0, 2.0), 50.0),
+                                                        int(t * 1000)))
+            trade_ids[exchange] += 1
+        for exchange, player in PLAYERS.items():
+            line = (f"{mode:>9} {player}: {offered.get(exchange, 0) / args.duration:6.1f} presses/s offered, "
+                    f"{admitted.get(exchange, 0) / args.duration:6.1f} admitted")
+            if bridge.limiter:
+                line += f", {bridge.limiter.summary(exchange)}"
+            print(line)
+
+    limiter = InputLimiter(limits, PLAYERS)
+    plan = PlanCache().key_press('a')
+    clock = iter(range(10 ** 9))
+    per_call = _best_of(3, lambda: [limiter.allow('binance', 'attack', plan, next(clock) * 1e-3)
+                                    for _ in range(100000)]) / 100000
+    print(f"InputLimiter.allow: {per_call * 1e9:.0f}ns per action")
+
+
+def bench_journal(args):
+    """Action journal: write cost and allocations, per-trade overhead in the bridge, rotation, load time"""
+    import os
+    import tempfile
+
+    import numpy  # noqa: F401  imported up front so load_journal() is timed alone
+    from action_journal import QUEUED, ActionJournal, journal_files, load_journal
+    from bridge import CryptoMAMEBridge
+    from command_plans import PlanCache
+
+    logging.disable(logging.WARNING)
+    plan = PlanCache().command('d,f,x')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'actions.sfj')
+        journal = ActionJournal(path, max_bytes=args.records * 64 + 64, backups=2)
+        write = journal.write
+        for _ in range(1000):
+            write('binance', 'buy', 0.5, 'special', 'binanceSpecial1', plan, QUEUED, 1)
+        blocks = sys.getallocatedblocks()
+        per_write = _best_of(3, lambda: [write('binance', 'buy', 0.5, 'special', 'binanceSpecial1', plan, QUEUED, 1)
+                                         for _ in range(100000)]) / 100000
+        grown = sys.getallocatedblocks() - blocks
+        print(f"ActionJournal.write: {per_write * 1e9:.0f}ns per record, "
+              f"{grown} allocated block(s) left after {journal.records - 1000} writes")
+        journal.close()
+        for name in journal_files(path):
+            os.remove(name)
+
+        for mode in ('off', 'on'):
+            bridge = CryptoMAMEBridge(keyboard='null', stats_interval=0, queue_size=1 << 20,
+                                      action_journal=path if mode == 'on' else None)
+            bridge.apply_config(default_config())
+            bridge.rng.seed(0)
+            bridge.clock = lambda: 0.0
+            rng = random.Random(args.seed)
+            frames = [_binance_frame(rng, i, min(rng.lognormvariate(-5.0, 2.0), 50.0), 0) for i in range(1, 50001)]
+            on_message = bridge.on_binance_message
+            start = time.perf_counter()
+            for frame in frames:
+                on_message(None, frame)
+            elapsed = time.perf_counter() - start
+            line = f"journal {mode:>3}: {elapsed / len(frames) * 1e6:.2f}us per trade"
+            if bridge.journal:
+                line += f", {bridge.journal.records} action(s) journaled"
+                bridge.journal.close()
+                os.remove(path)
+            print(line)
+
+        journal = ActionJournal(path, max_bytes=args.records * 64 + 64, backups=2)
+        for i in range(args.records * 2 + 10):
+            journal.write('coinbase', 'sell', i * 1e-3, 'attack', 'coinbaseSellWeak', plan, QUEUED, i)
+        journal.close()
+        files = journal_files(path)
+        print(f"rotation: {journal.rotations} rotation(s), files {[os.path.basename(f) for f in files]}")
+        start = time.perf_counter()
+        actions = load_journal(files[0])
+        loaded = time.perf_counter() - start
+        print(f"load_journal: {len(actions)} records in {loaded * 1e3:.2f}ms "
+              f"({'mapped, no copy' if actions.base is not None and not actions.flags.owndata else 'copied'}), "
+              f"quantity sum {actions['quantity'].sum():.1f}, keys {actions['keys'][0]!r}")
+        del actions
+
+
+def _shadow_mismatches(bridge, live, trades):
+    """How a run's shadow model (active config plus a candidate identical to it) differs from the live decisions.
+
+    Controls without a cooldown or delay must fire exactly as often as live. Cooldown/delay controls get 8%
+    (+2): the model spreads each second's trades evenly over it, so bursts pass a cooldown slightly more often.
+    """
+    failures = []
+    report = bridge.shadows.report()
+    configs = {config.name: config for config in bridge.shadows.configs}
+    active, same = configs['active'], configs['same']
+    gated = {name for side in active.sides.values() for name in side.gated}
+    for name in sorted(set(active.fires) | set(live)):
+        modelled, decided = active.fires.get(name, 0), live.get(name, 0)
+        if modelled != decided if name not in gated else abs(modelled - decided) > 0.08 * decided + 2:
+            failures.append(f"{name}: shadow model fired {modelled}, live {decided}")
+    if report['active']['trades'] != trades:
+        failures.append(f"{report['active']['trades']} trades evaluated of {trades}")
+    if same.fires != active.fires or report['same']['queues'] != report['active']['queues']:
+        failures.append("a candidate identical to the active config fires or queues differently")
+    if report['same']['agreement'] != 1.0:
+        failures.append(f"identical candidate agrees on {report['same']['agreement']} of the trades")
+    for name, control in report['same']['controls'].items():
+        if control['overlap'] not in (1.0, None):
+            failures.append(f"identical candidate's {name} overlaps the active config on {control['overlap']}")
+    return failures
+
+
+def bench_shadow(args):
+    """CPU cost of shadow configs on the feed path, and the shadow model checked against the live decisions"""
+    import json
+    import os
+    import tempfile
+    from collections import Counter
+
+    from bridge import CryptoMAMEBridge
+    from log_pipeline import LOG_FORMAT
+    from shadow_eval import load_candidates
+    from triggers import range_prefixes
+
+    logging.disable(logging.WARNING)
+    config = default_config()
+
+    def scaled(factor):
+        return {f"{prefix}{end}": f"{float(config.get(f'{prefix}{end}', 0)) * factor:.8f}"
+                for prefix, _, _ in range_prefixes(config) for end in ('Min', 'Max')}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        specs = []
+        for name, fields in (('same', {}), ('half', scaled(0.5)), ('double', scaled(2.0))):
+            path = os.path.join(tmp, f"{name}.json")
+            with open(path, 'w') as f:
+                json.dump(fields, f)
+            specs.append(f"{name}={path}")
+        candidates = load_candidates(specs)
+
+    rng = random.Random(args.seed)
+    frames = []
+    trade_ids = {'binance': 1, 'coinbase': 1}
+    t = 0.0
+    while True:
+        t += rng.expovariate(args.rate)
+        if t >= args.duration:
+            break
+        exchange = 'binance' if rng.random() < 0.5 else 'coinbase'
+        build = _binance_frame if exchange == 'binance' else _coinbase_frame
+        frames.append((t, exchange, build(rng, trade_ids[exchange], min(rng.lognormvariate(-5.0, 2.0), 50.0),
+                                          int(t * 1000))))
+        trade_ids[exchange] += 1
+
+    def run(shadows, active=None):
+        # Executors are not started: the default queues fill up and drop, as the enqueue count is all that is kept
+        bridge = CryptoMAMEBridge(keyboard='null', stats_interval=0, shadow_configs=candidates[:shadows])
+        bridge.apply_config(active or default_config())
+        if bridge.shadows:
+            # Compiling the configs is a one-off cost of the first batch (~10ms), not a per-trade one
+            bridge.shadows._compile(bridge.snapshot)
+        bridge.rng.seed(0)
+        now = [0.0]
+        bridge.clock = lambda: now[0]
+        # Live decisions per control, named like the shadow model's controls
+        live = Counter()
+        enqueue = bridge.enqueue
+
+        def counted(exchange, kind, name, plan, received_ns=None, expires_ns=None, side=None, quantity=0.0):
+            if plan is not None:
+                if kind == 'attack':
+                    live[f"{exchange}{side.capitalize()}{name}"] += 1
+                elif kind == 'movement':
+                    live[f"{exchange}{name}"] += 1
+                else:
+                    # Specials and jump/crouch are named after their dashboard fields already
+                    live[name] += 1
+            enqueue(exchange, kind, name, plan, received_ns, expires_ns, side, quantity)
+
+        bridge.enqueue = counted
+        handlers = {'binance': bridge.on_binance_message, 'coinbase': bridge.on_coinbase_message}
+        next_tick = 1.0
+        evaluating = 0.0
+        start = time.process_time()
+        for t, exchange, frame in frames:
+            # housekeeping() once a second
+            while next_tick <= t:
+                now[0] = next_tick
+                if bridge.shadows:
+                    evaluate_start = time.process_time()
+                    bridge.shadows.evaluate(next_tick)
+                    evaluating += time.process_time() - evaluate_start
+                next_tick += 1.0
+            now[0] = t
+            handlers[exchange](None, frame)
+        if bridge.shadows:
+            evaluate_start = time.process_time()
+            bridge.shadows.evaluate(now[0], force=True)
+            evaluating += time.process_time() - evaluate_start
+        return time.process_time() - start, evaluating, bridge, live
+
+    def invalid_key_skipped():
+        # Dashboard keys are free text: a control whose key has no plan is skipped, as the live path skips it
+        invalid = default_config()
+        invalid['binanceBuyWeakKey'] = 'F1'
+        _, _, bridge, live = run(1, invalid)
+        report = bridge.shadows.report()
+        return 'binanceBuyWeak' not in report['active']['controls'] and not live['binanceBuyWeak']
+
+    if args.check:
+        _, _, bridge, live = run(1)
+        failures = _shadow_mismatches(bridge, live, len(frames))
+        if not invalid_key_skipped():
+            failures.append("binanceBuyWeak with key F1 (no plan) fired")
+        for failure in failures:
+            print(f"MISMATCH {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"shadow model matches the live decisions: {len(frames)} trades, {sum(live.values())} actions, "
+              f"{len(live)} controls")
+        return
+
+    # The whole feed handler (decode, sequence checks, decisions, enqueue) with trade logging off, then with
+    # every trigger logged through a plain stream handler as by default
+    for label, logged in (('feed path, logging off', False), ('feed path, trade logging', True)):
+        if logged:
+            handler = logging.StreamHandler(_CountingSink())
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            logging.getLogger().handlers[:] = [handler]
+            logging.disable(logging.NOTSET)
+        # Shadow counts take turns so that drift in the machine's speed does not favour one of them
+        runs = {shadows: [] for shadows in (0, 1, 3)}
+        for _ in range(args.repeat):
+            for shadows, results in runs.items():
+                results.append(run(shadows))
+        baseline = None
+        for shadows, results in runs.items():
+            cpu, evaluating, bridge, live = min(results, key=lambda result: result[0])
+            line = f"{label}, {shadows} shadow(s): {cpu / len(frames) * 1e6:.2f}us CPU per trade"
+            if baseline is None:
+                baseline = cpu
+            else:
+                line += (f" (+{(cpu / baseline - 1) * 100:.1f}%, of which batch evaluation "
+                         f"{evaluating / len(frames) * 1e6:.2f}us)")
+            print(line + f", {sum(live.values())} live actions")
+    logging.getLogger().handlers.clear()
+    logging.disable(logging.WARNING)
+    report = bridge.shadows.report()
+    modelled = sum(queue['actions_per_minute'] for queue in report['active']['queues'].values())
+    print(f"shadow model of the active config: {modelled * bridge.shadows.minutes:.0f} actions")
+    for line in bridge.shadows.summary_lines():
+        print(line)
+    print(f"binanceBuyWeakKey F1 (no plan): binanceBuyWeak {'skipped' if invalid_key_skipped() else 'fired'}")
+
+
+def bench_startup(args):
+    """Cold start costs: importing the bridge, loading the config snapshot vs fetching the dashboard.
+
+    The dashboard runs go first and leave the snapshot behind for the snapshot runs.
+    """
+    import os
+    import tempfile
+
+    script = (
+        "import time, sys\n"
+        "t0 = time.perf_counter()\n"
+        "import bridge\n"
+        "t1 = time.perf_counter()\n"
+        "b = bridge.CryptoMAMEBridge(sys.argv[1], keyboard='null', decoder='json', config_cache=sys.argv[2])\n"
+        "t2 = time.perf_counter()\n"
+        "ok = b.fetch_config() if sys.argv[3] == 'dashboard' else b.load_config()\n"
+        "t3 = time.perf_counter()\n"
+        "print((t1 - t0) * 1000, (t3 - t2) * 1000, ok)\n"
+    )
+    server = _config_server(default_config())
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = os.path.join(tmp, 'bridge_config.snapshot')
+        runs = {}
+        for source in ('dashboard', 'snapshot'):
+            samples = []
+            for _ in range(args.repeat):
+                out = subprocess.run([sys.executable, '-c', script, url, cache, source], capture_output=True,
+                                     text=True, check=True).stdout.split()
+                samples.append((float(out[0]), float(out[1])))
+            runs[source] = samples
+    server.shutdown()
+
+    for source, samples in runs.items():
+        import_ms = min(s[0] for s in samples)
+        config_ms = min(s[1] for s in samples)
+        print(f"config from {source:>9}: import bridge {import_ms:6.1f} ms, config ready {config_ms:7.1f} ms")
+
+
+def bench_e2e(args):
+    logging.disable(logging.WARNING)
+    results = []
+    for rate in args.rates:
+        if args.journal:
+            frames = journal_feed(args.journal, args.duration)
+            label = f"journal {args.journal}"
+        else:
+            frames = synthetic_feed(rate, args.duration, seed=args.seed)
+            label = f"synthetic {rate}/s"
+        result = run_e2e(frames, args, label)
+        results.append(result)
+        lat = result['latency_ms']
+        fmt = lambda v: '-' if v is None else f"{v:.1f}"
+        print(f"{label:>22}: {result['achieved_rate']:8.0f} msgs/s "
+              f"(handler capacity {result['handler_capacity_msgs_per_s']:,.0f}/s), "
+              f"latency p50 {fmt(lat['p50'])}ms p99 {fmt(lat['p99'])}ms p999 {fmt(lat['p999'])}ms, "
+              f"dropped {result['dropped_fraction']:.1%}, coalesced {result['coalesced_fraction']:.1%}, "
+              f"stale {result['stale_fraction']:.1%}, "
+              f"peak RSS {fmt(result['peak_rss_mb'])}MB")
+        if args.journal:
+            break
+
+    if args.output:
+        report = {
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'settings': {k: v for k, v in vars(args).items() if k != 'func'},
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SF2 bridge benchmarks")
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    triggers = sub.add_parser('triggers', help="trigger lookup: compiled index vs config scanning")
+    triggers.add_argument('--trades', type=int, default=100000)
+    triggers.add_argument('--repeat', type=int, default=5)
+    triggers.set_defaults(func=bench_triggers)
+
+    plans = sub.add_parser('plans', help="special move commands: parse per trigger vs compiled plan cache")
+    plans.add_argument('--triggers', type=int, default=100000)
+    plans.add_argument('--repeat', type=int, default=5)
+    plans.set_defaults(func=bench_plans)
+
+    decode = sub.add_parser('decode', help="per-frame decode cost: legacy json vs pluggable decoders")
+    decode.add_argument('--frames', type=int, default=50000, help="approximate frames per exchange pair")
+    decode.add_argument('--non-match', type=float, default=0.2,
+                        help="fraction of Coinbase frames that are heartbeats/subscriptions/last_match")
+    decode.add_argument('--seed', type=int, default=1)
+    decode.add_argument('--repeat', type=int, default=5)
+    decode.set_defaults(func=bench_decode)
+
+    metrics = sub.add_parser('metrics', help="per-trade cost of the latency instrumentation")
+    metrics.add_argument('--frames', type=int, default=50000, help="approximate frames per run")
+    metrics.add_argument('--decoder', default='auto')
+    metrics.add_argument('--seed', type=int, default=1)
+    metrics.add_argument('--repeat', type=int, default=5)
+    metrics.set_defaults(func=bench_metrics)
+
+    io = sub.add_parser('io', help="CPU and wakeups: threaded vs asyncio feed ingestion")
+    io.add_argument('--rates', type=int, nargs='+', default=[100, 1000], help="total trades/s across both feeds")
+    io.add_argument('--modes', nargs='+', choices=('threads', 'asyncio'), default=['threads', 'asyncio'])
+    io.add_argument('--duration', type=float, default=10.0, help="measured seconds per run")
+    io.add_argument('--warmup', type=float, default=2.0, help="seconds to connect and settle before measuring")
+    io.add_argument('--spin-us', type=float, default=0,
+                    help="executor busy-wait (default 0 so key timing CPU does not mask feed CPU)")
+    io.add_argument('--port', type=int, default=18765)
+    io.add_argument('--seed', type=int, default=1)
+    io.add_argument('--output', help="write results as JSON")
+    io.set_defaults(func=bench_io)
+
+    reload = sub.add_parser('reload', help="config poll cost: unconditional fetch vs ETag poll")
+    reload.add_argument('--polls', type=int, default=200)
+    reload.add_argument('--repeat', type=int, default=3)
+    reload.set_defaults(func=bench_reload)
+
+    startup = sub.add_parser('startup', help="cold start: import time, config snapshot vs dashboard fetch")
+    startup.add_argument('--repeat', type=int, default=5)
+    startup.set_defaults(func=bench_startup)
+
+    resync = sub.add_parser('resync', help="trade id gaps and duplicates: skip to live vs REST catch-up")
+    resync.add_argument('--rate', type=int, default=1000, help="synthetic msgs/s across both feeds")
+    resync.add_argument('--duration', type=float, default=10.0, help="seconds of feed")
+    resync.add_argument('--gap-every', type=int, default=500, help="one gap per this many trades on average")
+    resync.add_argument('--gap-size', type=int, default=20, help="trades dropped per gap")
+    resync.add_argument('--duplicate-every', type=int, default=200,
+                        help="one duplicated trade per this many on average")
+    resync.add_argument('--seed', type=int, default=1)
+    resync.add_argument('--repeat', type=int, default=5)
+    resync.set_defaults(func=bench_resync)
+
+    batch = sub.add_parser('batch', help="decision cost: per trade vs NumPy frame-window batches")
+    batch.add_argument('--rates', type=int, nargs='+', default=[100, 1000, 10000], help="synthetic msgs/s")
+    batch.add_argument('--duration', type=float, default=5.0, help="seconds of feed per rate")
+    batch.add_argument('--fps', type=float, default=60.0, help="frame rate setting the window length")
+    batch.add_argument('--seed', type=int, default=1)
+    batch.add_argument('--repeat', type=int, default=5)
+    batch.set_defaults(func=bench_batch)
+
+    keys = sub.add_parser('keys', help="OS key events: raw plan events vs the held-key tracker")
+    keys.add_argument('--rate', type=int, default=20, help="synthetic msgs/s driving the plans")
+    keys.add_argument('--duration', type=float, default=120.0, help="seconds of feed")
+    keys.add_argument('--play-seconds', type=float, default=3600.0, help="max seconds of queued plans to play")
+    keys.add_argument('--seed', type=int, default=1)
+    keys.set_defaults(func=bench_keys)
+
+    priority = sub.add_parser('priority', help="attacks during a charge hold under each scheduler")
+    priority.add_argument('--charge', default='++g,f,x', help="charge command played first")
+    priority.add_argument('--spin-us', type=float, default=0)
+    priority.set_defaults(func=bench_priority)
+
+    inject = sub.add_parser('inject', help="key timing jitter: executor threads vs separate injection process")
+    inject.add_argument('--rates', type=int, nargs='+', default=[100, 1000, 5000],
+                        help="synthetic message rates (msgs/s) decoded while keys are played")
+    inject.add_argument('--duration', type=float, default=10.0, help="seconds of feed per rate")
+    inject.add_argument('--injectors', nargs='+', default=['thread', 'process'], choices=('thread', 'process'))
+    inject.add_argument('--seed', type=int, default=1)
+    inject.add_argument('--fps', type=float, default=60.0)
+    inject.add_argument('--spin-us', type=float, default=1500)
+    inject.add_argument('--drain-timeout', type=float, default=30.0)
+    inject.add_argument('--output', help="write results as JSON")
+    inject.set_defaults(func=bench_inject)
+
+    logs = sub.add_parser('logging', help="feed thread cost of trigger logging: inline vs queued vs limited")
+    logs.add_argument('--rate', type=int, default=1000, help="synthetic msgs/s (sets the trade mix, not pacing)")
+    logs.add_argument('--duration', type=float, default=20.0, help="seconds of feed, processed unpaced")
+    logs.add_argument('--limit', nargs='+', default=['trades=5', 'command_plans=1'], metavar='CATEGORY=N')
+    logs.add_argument('--interval', type=float, default=30.0, help="--log-summary-interval")
+    logs.add_argument('--seed', type=int, default=1)
+    logs.set_defaults(func=bench_logging)
+
+    soak = sub.add_parser('soak', help="memory growth and latency drift against the local exchange simulator")
+    soak.add_argument('--rate', type=float, default=500, help="simulated trades/s across both exchanges")
+    soak.add_argument('--burst', action='append', default=[], metavar='START:SECONDS:RATE[:SCALE[:SIDE]]',
+                      help="scripted burst in the simulator (see exchange_sim.py --burst)")
+    soak.add_argument('--cycle', type=float, default=300, help="seconds before the burst script repeats")
+    soak.add_argument('--duration', type=float, default=3600, help="seconds to run")
+    soak.add_argument('--interval', type=float, default=60, help="seconds per reported window")
+    soak.add_argument('--io', choices=('threads', 'asyncio'), default='threads')
+    soak.add_argument('--resync', choices=('skip', 'catch-up'), default='skip')
+    soak.add_argument('--max-trade-age', type=float, default=0)
+    soak.add_argument('--spin-us', type=float, default=1500)
+    soak.add_argument('--port', type=int, default=8771)
+    soak.add_argument('--seed', type=int, default=1)
+    soak.add_argument('--output', help="write the windows as JSON")
+    soak.set_defaults(func=bench_soak)
+
+    adaptive = sub.add_parser('adaptive', help="action rate through volume regime shifts: fixed vs adaptive ranges")
+    adaptive.add_argument('--rate', type=float, default=20, help="trades/s (virtual time)")
+    adaptive.add_argument('--regimes', type=float, nargs='+', default=[-7.0, -5.0, -9.0],
+                          help="mean log trade size of each phase")
+    adaptive.add_argument('--phase-minutes', type=float, default=20)
+    adaptive.add_argument('--window', type=float, default=300, help="--adaptive-window")
+    adaptive.add_argument('--interval', type=float, default=10, help="--adaptive-interval")
+    adaptive.add_argument('--seed', type=int, default=1)
+    adaptive.set_defaults(func=bench_adaptive)
+
+    limits = sub.add_parser('limits', help="presses/s offered vs admitted per player with input rate limits")
+    limits.add_argument('--rate', type=float, default=50, help="trades/s (virtual time)")
+    limits.add_argument('--duration', type=float, default=600, help="seconds (virtual time)")
+    limits.add_argument('--limit', action='append',
+                        help="--input-rate CLASS=RATE[:BURST] (default: attack=10:5 movement=5:2 "
+                             "jump_crouch=2:1 special=2:2 total=15:8)")
+    limits.add_argument('--seed', type=int, default=1)
+    limits.set_defaults(func=bench_limits)
+
+    journal = sub.add_parser('journal', help="action journal: write cost, allocations, rotation and load time")
+    journal.add_argument('--records', type=int, default=1000000, help="records per journal file")
+    journal.add_argument('--seed', type=int, default=1)
+    journal.set_defaults(func=bench_journal)
+
+    shadow = sub.add_parser('shadow', help="CPU cost of shadow config evaluation and its accuracy")
+    shadow.add_argument('--rate', type=float, default=50, help="trades/s (virtual time)")
+    shadow.add_argument('--duration', type=float, default=600, help="seconds (virtual time)")
+    shadow.add_argument('--repeat', type=int, default=5, help="runs per shadow count (best CPU time kept)")
+    shadow.add_argument('--seed', type=int, default=1)
+    shadow.add_argument('--check', action='store_true',
+                        help="only check the shadow model against the live decisions; exit 1 on a mismatch")
+    shadow.set_defaults(func=bench_shadow)
+
+    e2e = sub.add_parser('e2e', help="end-to-end message to keystroke latency and throughput")
+    e2e.add_argument('--rates', type=int, nargs='+', default=[100, 1000, 10000],
+                     help="synthetic message rates (msgs/s) to run")
+    e2e.add_argument('--duration', type=float, default=5.0, help="seconds of feed per rate")
+    e2e.add_argument('--journal', help="replay a recorded feed journal instead of synthetic trades")
+    e2e.add_argument('--seed', type=int, default=1)
+    e2e.add_argument('--queue-size', type=int, default=32)
+    e2e.add_argument('--policy', default='drop-newest')
+    e2e.add_argument('--fps', type=float, default=60.0)
+    e2e.add_argument('--spin-us', type=float, default=1500)
+    e2e.add_argument('--max-trade-age', type=float, default=0,
+                     help="shed trades older than this many seconds (0 = keep all)")
+    e2e.add_argument('--batch', choices=('strongest', 'volume'),
+                     help="decide once per frame per player with this rule instead of per trade")
+    e2e.add_argument('--drain-timeout', type=float, default=30.0,
+                     help="max seconds to wait for queued actions after the feed ends")
+    e2e.add_argument('--output', help="write results as JSON for comparison between commits")
+    e2e.set_defaults(func=bench_e2e)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
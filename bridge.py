@@ -2,20 +2,37 @@
 """
 Crypto Quantity to MAME Keyboard Bridge - SF2 Edition
 Supports 12 buttons (6 per player) with range-based triggers.
-Now includes 9 Special Moves per player with 3 command formats:
+Now includes 9 Special Moves per player with these command formats:
 - Rapid repeat: "xxxxx" (same key mashed)
 - Sequential: "x,y,c,u" (comma-separated keys)
 - Simultaneous: "x+y+c" (keys pressed together)
+- Charge: "++f,h,x" / "++f,g,h,x" (hold first key 2s, then roll into the attack)
+Every input is compiled into a key timing plan (see command_plans.py) when the config loads.
 """
 
 import json
 import time
-import requests
 import logging
 import threading
 import random
-from enum import Enum
-from pynput.keyboard import Controller
+from functools import partial
+from actions import Action, ActionQueue, InputExecutor, OVERFLOW_POLICIES, PRIORITY_CLASSES, SCHEDULERS
+from action_ring import INJECTORS, InjectorProcess
+from command_plans import ATTACK_PRESS_MS, MOVEMENT_PRESS_MS, JUMP_PRESS_MS, CROUCH_HOLD_MS
+from config_snapshot import EMPTY_SNAPSHOT, compile_snapshot, changed_fields, load_snapshot, save_snapshot
+from keyboards import BACKENDS, LazyBackend, create_backend
+from feed_journal import FeedRecorder, FeedReplayer
+from action_journal import DROPPED, LIMITED, QUEUED, ActionJournal
+from decoders import DECODERS, create_decoder, trade_time_ns
+from feed_sequence import RESYNC_POLICIES, DUPLICATE, BINANCE_REST_URL, COINBASE_REST_URL, SequenceTracker, TradeCatchup
+from frame_batcher import BATCH_RULES, FrameBatcher
+from key_timing import FrameScheduler
+from key_state import KeyStateTracker
+from log_pipeline import LogPipeline, parse_limits
+from range_calibration import RangeCalibrator, load_targets
+from input_limits import InputLimiter, parse_rate_limits
+from shadow_eval import ShadowEvaluator, load_candidates
+from metrics import BridgeMetrics, MetricsServer
 
 # Configure logging
 logging.basicConfig(
@@ -23,25 +40,186 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# Per-trade trigger lines, a separate category for --log-limit (see log_pipeline.py);
+# %-style arguments so the text is only built when the line is written
+trade_logger = logging.getLogger('trades')
 
-class CommandType(Enum):
-    RAPID_REPEAT = 1
-    SEQUENTIAL = 2
-    SIMULTANEOUS = 3
-    SINGLE = 4
-    CHARGE = 5
-    HALF_CIRCLE_CHARGE = 6
+# Reference point for the startup timings in the log (after the bridge's own imports)
+LAUNCHED_NS = time.perf_counter_ns()
 
-ALLOWED_KEYS = set('abcdefghijklmnopqrstuvwxyz0123456789')
+# Binance drives Player 1, Coinbase drives Player 2
+PLAYERS = {'binance': 'P1', 'coinbase': 'P2'}
+
+BINANCE_WS_URL = "wss://data-stream.binance.vision/ws"
+COINBASE_WS_URL = "wss://ws-feed.exchange.coinbase.com"
+
+# trade_expiry() result for a trade already older than the max trade age
+STALE = -1
 
 class CryptoMAMEBridge:
-    def __init__(self, dashboard_url="http://localhost:5000"):
+    def __init__(self, dashboard_url="http://localhost:5000", queue_size=32, overflow_policy='drop-newest',
+                 stats_interval=30, fps=60.0, spin_us=1500, keyboard='pynput', record_path=None,
+                 decoder='auto', metrics=False, metrics_port=None, config_refresh=0, config_cache=None,
+                 max_trade_age=None, resync='skip', catch_up_limit=1000, catchup=None, batch=None,
+                 hold_lease=5.0, scheduler='fifo', injector='thread', logs=None,
+                 binance_ws_url=BINANCE_WS_URL, coinbase_ws_url=COINBASE_WS_URL, adaptive_window=0,
+                 adaptive_interval=10, adaptive_targets=None, input_rates=None, action_journal=None,
+                 action_journal_max_mb=64, action_journal_backups=5, shadow_configs=None, shadow_report=None):
         self.dashboard_url = dashboard_url
-        self.keyboard = Controller()
-        self.config = None
+        # Compiled snapshot of the last good dashboard config, used for instant startup (see config_snapshot.py)
+        self.config_cache = config_cache
+        # Seconds between dashboard config refreshes while running (0 = fetch once at start)
+        self.config_refresh = config_refresh
+        # Feed endpoints; a local exchange_sim.py server for load and soak tests
+        self.binance_ws_url = binance_ws_url.rstrip('/')
+        self.coinbase_ws_url = coinbase_ws_url
+        # Trades older than this (seconds, by exchange trade time) are shed instead of queued; 0/None = keep all
+        max_trade_age = max_trade_age or {}
+        self.max_trade_age_ns = {exchange: int((max_trade_age.get(exchange) or 0) * 1e9) for exchange in PLAYERS}
+        self.stale_trades = dict.fromkeys(PLAYERS, 0)
+        # Trade id continuity per feed: duplicates dropped, gaps counted and resynced (see feed_sequence.py)
+        self.sequences = {exchange: SequenceTracker() for exchange in PLAYERS}
+        self.resync = resync
+        # Gaps larger than this many trades always skip to live, even with resync='catch-up'
+        self.catch_up_limit = catch_up_limit
+        # REST fetcher for resync='catch-up'; a TradeCatchup pointing at a local stub in tests
+        self.catchup = catchup if catchup is not None or resync != 'catch-up' else TradeCatchup()
+        self.caught_up = dict.fromkeys(PLAYERS, 0)
+        self.reconnects = dict.fromkeys(PLAYERS, 0)
+        self._connected = dict.fromkeys(PLAYERS, False)
+        # Set by stop(); the run loop (threads or asyncio) shuts down within a second
+        self.stopped = threading.Event()
+        self._last_stats = self._last_refresh = time.monotonic()
+        # Frame decoder: msgspec / orjson when installed, stdlib json otherwise (see decoders.py)
+        self.decoder = create_decoder(decoder)
+        # Wall clock for cooldowns and jump/crouch delays; replaced by a virtual clock during replay
+        self.clock = time.time
+        # Random jump direction choice; seeded by replay so runs are repeatable
+        self.rng = random.Random()
+        # Optional journal of every raw feed frame (see feed_journal.py)
+        self.recorder = FeedRecorder(record_path) if record_path else None
+        # Optional binary journal of every decided action and its trade (see action_journal.py)
+        self.journal = ActionJournal(action_journal, int(action_journal_max_mb * 1024 * 1024),
+                                     action_journal_backups) if action_journal else None
+        # Keyboard backend name (see keyboards.BACKENDS) or a ready KeyboardBackend instance;
+        # pynput and uinput are created lazily (preloaded in the background by run())
+        if keyboard in ('pynput', 'uinput'):
+            self.keyboard = LazyBackend(keyboard)
+        elif isinstance(keyboard, str):
+            self.keyboard = create_backend(keyboard)
+        else:
+            self.keyboard = keyboard
+        # Which keys are down and which player holds them: redundant presses/releases never reach the
+        # keyboard, and keys a plan leaves held (crouch) are released after hold_lease seconds without renewal
+        self.keys = KeyStateTracker(self.keyboard, PLAYERS)
+        self.hold_lease_ns = int((hold_lease or 0) * 1e9)
+        self._emitters = {exchange: partial(self.keys.send, exchange) for exchange in PLAYERS}
+        # One bounded action queue + executor thread per player so key timing never blocks the feeds,
+        # each playing plans against frame-aligned deadlines
+        self.schedulers = {exchange: FrameScheduler(fps, spin_us) for exchange in PLAYERS}
+        # scheduler (see actions.SCHEDULERS): queue order, or priority classes with optional preemption
+        self.executors = {
+            exchange: InputExecutor(player, ActionQueue(queue_size, overflow_policy, prioritized=scheduler != 'fifo'),
+                                    partial(self.play_plan, exchange), scheduler)
+            for exchange, player in PLAYERS.items()
+        }
+        # injector (see action_ring.py): play keys on executor threads in this process, or send the actions
+        # over a shared-memory ring to a key injection process with its own executors and keyboard
+        self.injector = None
+        if injector == 'process':
+            if not isinstance(keyboard, str):
+                raise ValueError("injector='process' needs a keyboard backend name, not an instance")
+            self.injector = InjectorProcess(PLAYERS, {
+                'queue_size': queue_size, 'overflow_policy': overflow_policy, 'stats_interval': stats_interval,
+                'fps': fps, 'spin_us': spin_us, 'keyboard': keyboard, 'hold_lease': hold_lease,
+                'scheduler': scheduler,
+            })
+        # Token buckets per player and action class, in button presses per second (see input_limits.py)
+        self.limiter = InputLimiter(input_rates, PLAYERS) if input_rates else None
+        # Candidate configs evaluated on the same trades without pressing keys (see shadow_eval.py)
+        self.shadows = (ShadowEvaluator(self, shadow_configs, PLAYERS, queue_size, shadow_report)
+                        if shadow_configs else None)
+        self.stats_interval = stats_interval
+        # Installed LogPipeline (queued writes, message limits); summaries are flushed by housekeeping()
+        self.logs = logs
+        # Decoded trades go to on_trade: handle_trade, or a FrameBatcher deciding once per frame (see frame_batcher.py)
+        self.batcher = None
+        self.on_trade = self.handle_trade
+        if batch:
+            self.batcher = FrameBatcher(self, fps, batch)
+            self.on_trade = self.batcher.add
+        # Trigger ranges kept at target percentiles of recent trade sizes (see range_calibration.py); off unless asked for
+        self.calibrator = None
+        if adaptive_window:
+            self.calibrator = RangeCalibrator(self, adaptive_window, adaptive_interval, adaptive_targets)
+        # Per-stage latency histograms (see metrics.py); off unless asked for
+        self.metrics = None
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        if metrics or metrics_port:
+            self.metrics = BridgeMetrics(PLAYERS)
+            for exchange, executor in self.executors.items():
+                executor.on_played = partial(self.metrics.played, exchange)
+            self.metrics.register('sf2_bridge_stale_trades_total', 'counter',
+                                  'Trades shed for being older than the max trade age',
+                                  lambda: dict(self.stale_trades))
+            self.metrics.register('sf2_bridge_expired_actions_total', 'counter',
+                                  'Queued actions skipped because their trade passed the max trade age',
+                                  lambda: {exchange: e.expired for exchange, e in self.executors.items()})
+            self.metrics.register('sf2_bridge_feed_reconnects_total', 'counter',
+                                  'Exchange websocket reconnections', lambda: dict(self.reconnects))
+            self.metrics.register('sf2_bridge_feed_gaps_total', 'counter',
+                                  'Jumps in the exchange trade id (missed trades)',
+                                  lambda: {exchange: s.gaps for exchange, s in self.sequences.items()})
+            self.metrics.register('sf2_bridge_missed_trades_total', 'counter',
+                                  'Trades missing from the feed, by trade id',
+                                  lambda: {exchange: s.missed for exchange, s in self.sequences.items()})
+            self.metrics.register('sf2_bridge_duplicate_trades_total', 'counter',
+                                  'Trades delivered more than once and dropped',
+                                  lambda: {exchange: s.duplicates for exchange, s in self.sequences.items()})
+            self.metrics.register('sf2_bridge_caught_up_trades_total', 'counter',
+                                  'Missed trades fetched over REST and played',
+                                  lambda: dict(self.caught_up))
+            self.metrics.register('sf2_bridge_key_events_total', 'counter',
+                                  'Key events sent to the keyboard', lambda: dict(self.keys.sent))
+            self.metrics.register('sf2_bridge_redundant_key_events_total', 'counter',
+                                  'Presses of keys already down and releases of keys still held, not sent',
+                                  lambda: dict(self.keys.deduplicated))
+            self.metrics.register('sf2_bridge_lease_releases_total', 'counter',
+                                  'Held keys released because their lease ran out',
+                                  lambda: dict(self.keys.lease_releases))
+            by_class = lambda counts: lambda: {(exchange, cls): getattr(e, counts)[cls]
+                                               for exchange, e in self.executors.items() for cls in PRIORITY_CLASSES}
+            self.metrics.register('sf2_bridge_class_actions_total', 'counter',
+                                  'Actions played per priority class', by_class('played_by_class'), 'class')
+            self.metrics.register('sf2_bridge_class_wait_seconds_total', 'counter',
+                                  'Seconds actions of each priority class waited in the queue',
+                                  by_class('wait_by_class'), 'class')
+            self.metrics.register('sf2_bridge_preemptions_total', 'counter',
+                                  'Running actions cancelled by a higher priority class, by cancelled class',
+                                  by_class('preempted'), 'class')
+            self.metrics.register('sf2_bridge_interleaved_total', 'counter',
+                                  'Actions played inside the hold of a running action', by_class('interleaved'),
+                                  'class')
+            if self.limiter:
+                self.metrics.register('sf2_bridge_rate_limited_actions_total', 'counter',
+                                      'Actions rejected by the per-player input rate limits, by class',
+                                      lambda: dict(self.limiter.rejected), 'class')
+            if self.batcher:
+                self.metrics.register('sf2_bridge_batch_decisions_total', 'counter',
+                                      'Frame windows that played a decision (--batch)',
+                                      lambda: dict(self.batcher.decisions))
+        # Config, trigger index and plans, swapped as one immutable snapshot (see config_snapshot.py)
+        self.snapshot = EMPTY_SNAPSHOT
+        # Config fetches and adaptive range updates both replace the snapshot from the one they read
+        self._snapshot_lock = threading.Lock()
+        # Pooled HTTP connection to the dashboard, created on first fetch
+        self.session = None
+        self._fetch_lock = threading.Lock()
+        self._dashboard_down = False
+        self.first_trade_ns = None
         self.binance_ws = None
         self.coinbase_ws = None
-        self.press_cooldown = 0.2
         self.special_cooldowns = {}
         self.special_cooldown_time = 0.5
         # Jump/Crouch state tracking - last trigger time for periodic key presses
@@ -58,548 +236,753 @@ class CryptoMAMEBridge:
             'coinbaseCrouch': False,
         }
 
-    def fetch_config(self):
-        try:
-            response = requests.get(f"{self.dashboard_url}/api/configurations", timeout=5)
-            if response.status_code == 200:
-                self.config = response.json()
-                return True
-        except Exception as e:
-            logger.error(f"Error fetching config: {e}")
-        return False
-
-    def check_range_and_press(self, quantity, config_prefix):
-        if not self.config or not self.config.get('isActive'):
-            return
+    @property
+    def config(self):
+        return self.snapshot.config
 
-        levels = ['Weak', 'Med', 'Strong']
-        for level in levels:
-            min_val = float(self.config.get(f"{config_prefix}{level}Min", 0))
-            max_val = float(self.config.get(f"{config_prefix}{level}Max", 0))
-            key = self.config.get(f"{config_prefix}{level}Key")
+    @property
+    def trigger_index(self):
+        return self.snapshot.trigger_index
 
-            if min_val <= quantity <= max_val:
-                logger.info(f"Triggering {level} ({config_prefix}) with key {key} (Qty: {quantity})")
-                self.press_key(key)
-                break
+    @property
+    def plans(self):
+        return self.snapshot.plans
 
-    def press_key(self, key_char, duration=0.1):
-        try:
-            key_char = key_char.lower().strip()
-            if key_char not in ALLOWED_KEYS:
-                logger.warning(f"Key '{key_char}' not in allowed keys, skipping")
-                return
-            self.keyboard.press(key_char)
-            time.sleep(duration)
-            self.keyboard.release(key_char)
-        except Exception as e:
-            logger.error(f"Error pressing key '{key_char}': {e}")
+    def fetch_config(self):
+        """Fetch the dashboard config, applying it only if it changed.
 
-    def press_key_hold(self, key_char, duration=0.1):
-        try:
-            key_char = key_char.lower().strip()
-            if key_char not in ALLOWED_KEYS:
-                logger.warning(f"Key '{key_char}' not in allowed keys, skipping")
-                return
-            self.keyboard.press(key_char)
-            time.sleep(duration)
-            # self.keyboard.release(key_char)  # don't release - hold it
-        except Exception as e:
-            logger.error(f"Error pressing key '{key_char}': {e}")
-
-    def parse_command(self, command):
-        """Parse a command string and return (CommandType, tokens)
-        
-        Command formats:
-        - Rapid repeat: "xxxxx" (same key mashed)
-        - Sequential: "x,y,c,u" (comma-separated keys)
-        - Simultaneous: "x+y+c" (keys pressed together)
-        - Charge: "++f,h,x" (hold first key 2s, then sequential with overlap)
-        - Single: "x" (single key press)
+        Sends the ETag of the current config as If-None-Match, so an unchanged
+        config is a bodyless 304 over the pooled connection. A changed config is
+        also saved to the config cache.
         """
-        if not command or not command.strip():
-            return None, []
-
-        command = command.lower().strip()
-
-        # Check for charge commands (starts with "++")
-        # CHARGE: 3 keys (++f,h,x) - hold charge, release to direction, attack
-        # HALF_CIRCLE_CHARGE: 4+ keys (++f,g,h,x) - hold charge, roll through directions, attack
-        if command.startswith('++'):
-            charge_command = command[2:]  # Remove the "++" prefix
-            tokens = [t.strip() for t in charge_command.split(',') if t.strip()]
-            valid_tokens = [t for t in tokens if len(t) == 1 and t in ALLOWED_KEYS]
-            if len(valid_tokens) < 3:
-                logger.warning(f"Charge command '{command}' needs at least 3 keys (charge + direction + attack)")
-                return None, []
-            if len(valid_tokens) != len(tokens):
-                logger.warning(f"Some tokens in charge command '{command}' are invalid")
-            # 3 keys = CHARGE, 4+ keys = HALF_CIRCLE_CHARGE
-            if len(valid_tokens) == 3:
-                return CommandType.CHARGE, valid_tokens
-            else:
-                return CommandType.HALF_CIRCLE_CHARGE, valid_tokens
-
-        if '+' in command:
-            tokens = [t.strip() for t in command.split('+') if t.strip()]
-            valid_tokens = [t for t in tokens if len(t) == 1 and t in ALLOWED_KEYS]
-            if len(valid_tokens) != len(tokens):
-                logger.warning(f"Some tokens in simultaneous command '{command}' are invalid")
-            return CommandType.SIMULTANEOUS, valid_tokens
-
-        if ',' in command:
-            tokens = [t.strip() for t in command.split(',') if t.strip()]
-            valid_tokens = [t for t in tokens if len(t) == 1 and t in ALLOWED_KEYS]
-            if len(valid_tokens) != len(tokens):
-                logger.warning(f"Some tokens in sequential command '{command}' are invalid")
-            return CommandType.SEQUENTIAL, valid_tokens
-
-        if len(command) > 1 and len(set(command)) == 1 and command[0] in ALLOWED_KEYS:
-            return CommandType.RAPID_REPEAT, [command[0]] * len(command)
-
-        if len(command) == 1 and command in ALLOWED_KEYS:
-            return CommandType.SINGLE, [command]
-
-        logger.warning(f"Unable to parse command: '{command}'")
-        return None, []
-
-    def execute_rapid_repeat(self, tokens):
-        """Execute rapid key mashing - same key pressed multiple times quickly
-        SF2 timing: 33ms press + 17ms gap = 50ms per input (3 frames at 60fps)
+        with self._fetch_lock:
+            try:
+                if self.session is None:
+                    import requests
+                    self.session = requests.Session()
+                etag = self.snapshot.etag
+                headers = {'If-None-Match': etag} if etag else None
+                response = self.session.get(f"{self.dashboard_url}/api/configurations", headers=headers, timeout=5)
+                if response.status_code == 304:
+                    self._dashboard_up()
+                    return True
+                if response.status_code == 200:
+                    self._dashboard_up()
+                    if self.apply_config(response.json(), response.headers.get('ETag')) and self.config_cache:
+                        save_snapshot(self.config_cache, self.snapshot)
+                    return True
+                self._dashboard_failed(f"HTTP {response.status_code}")
+            except Exception as e:
+                self._dashboard_failed(e)
+            return False
+
+    def _dashboard_up(self):
+        if self._dashboard_down:
+            logger.info("Dashboard reachable again")
+            self._dashboard_down = False
+
+    def _dashboard_failed(self, error):
+        """Log the first failure of an outage as an error, the repeats only at debug level"""
+        if self._dashboard_down:
+            logger.debug("Error fetching config: %s", error)
+        else:
+            logger.error("Error fetching config: %s", error)
+            self._dashboard_down = True
+
+    def apply_config(self, config, etag=None):
+        """Compile a dashboard configuration and swap it in as the new snapshot.
+
+        Compilation happens on the calling thread; feed handlers keep using the
+        previous snapshot until the single assignment below. Returns True if the
+        config changed.
         """
-        if not tokens:
-            return
-        key = tokens[0]
-        count = len(tokens)
-        logger.info(f"Executing rapid repeat: key '{key}' x{count}")
-        for _ in range(count):
-            self.keyboard.press(key)
-            time.sleep(0.033)
-            self.keyboard.release(key)
-            time.sleep(0.017)
-
-    def execute_sequential(self, tokens):
-        """Execute sequential key presses for special move inputs
-        SF2 timing: 16ms press + 10ms gap = ~26ms per input (~1.5 frames at 60fps)
-        A 3-input motion (e.g. d,df,f for hadouken) completes in ~78ms (5 frames)
-        Well within the 10-12 frame window required for special move registration
-        Last two keys held together and released together for better move registration
+        with self._snapshot_lock:
+            previous = self.snapshot
+            if previous.config == config:
+                if etag != previous.etag:
+                    self.snapshot = previous._replace(etag=etag)
+                return False
+            self.use_snapshot(compile_snapshot(config, etag))
+        if previous.config is not None:
+            changed = changed_fields(previous.config, config)
+            logger.info("Configuration updated: %d field(s) changed (%s%s)", len(changed), ', '.join(changed[:8]),
+                        ', ...' if len(changed) > 8 else '')
+            if any(field in ('symbol', 'coinbaseSymbol') for field in changed):
+                logger.warning("Symbol changes take effect when the exchange feeds reconnect (restart the bridge)")
+        return True
+
+    def use_snapshot(self, snapshot):
+        """Publish a compiled snapshot to the feed handlers"""
+        self.snapshot = snapshot
+        for scheduler in self.schedulers.values():
+            scheduler.clear()
+
+    def swap_trigger_index(self, snapshot, index):
+        """Publish a recompiled trigger index for a snapshot's config; False if the snapshot was replaced meanwhile"""
+        with self._snapshot_lock:
+            if self.snapshot is not snapshot:
+                return False
+            self.snapshot = snapshot._replace(trigger_index=index)
+            return True
+
+    def load_config(self):
+        """Get a config to start trading with.
+
+        A saved snapshot is used at once and the dashboard is fetched in the
+        background; without one the dashboard is retried until it answers.
         """
-        if not tokens:
-            return
-        logger.info(f"Executing sequential: {tokens}")
-
-        if len(tokens) == 1:
-            self.keyboard.press(tokens[0])
-            time.sleep(0.067)
-            self.keyboard.release(tokens[0])
-            return
-
-        for i, key in enumerate(tokens[:-2]):
-            self.keyboard.press(key)
-            time.sleep(0.033)
-
-            self.keyboard.release(key)
-
-            #time.sleep(0.017)
-
-
-        third_last = tokens[-3]
-        second_last = tokens[-2]
-        last = tokens[-1]
-
-        self.keyboard.press(third_last)
-        self.keyboard.press(second_last)
-        time.sleep(0.033)
-
-        self.keyboard.release(third_last)
-
-        time.sleep(0.017)
+        snapshot, saved_at = load_snapshot(self.config_cache)
+        if snapshot is not None:
+            self.use_snapshot(snapshot)
+            age = time.time() - saved_at if saved_at else 0
+            self.log_startup("Config loaded from snapshot %s (saved %.0f min ago)", self.config_cache, age / 60)
+            threading.Thread(target=self.fetch_config, name='config-fetch', daemon=True).start()
+            return True
+        while not self.stopped.is_set():
+            if self.fetch_config():
+                self.log_startup("Config loaded from dashboard")
+                return True
+            logger.warning("Dashboard not reachable at %s, retrying in 5s", self.dashboard_url)
+            self.stopped.wait(5)
+        return False
 
-        #time.sleep(0.017)
+    def mark_first_trade(self, exchange):
+        self.first_trade_ns = time.perf_counter_ns()
+        self.log_startup("First trade processed (%s)", exchange)
 
-        self.keyboard.press(last)
-        #time.sleep(0.067)    
-        time.sleep(0.033)   
+    def log_startup(self, message, *args):
+        logger.info(message + " (%.0fms after launch)", *args, (time.perf_counter_ns() - LAUNCHED_NS) / 1e6)
 
-        self.keyboard.release(second_last)
-        self.keyboard.release(last)
+    def play_plan(self, exchange, plan, preempt=None):
+        """Play a compiled CommandPlan on the keyboard; runs on the player's executor thread.
 
-    def execute_simultaneous(self, tokens):
-        """Execute simultaneous key press (chord)
-        SF2 timing: 30ms stagger between presses, 100ms hold, then release
-        This ensures all keys register as pressed together for chord inputs
-        """
-        time.sleep(1)   # add this to calm/block all other keyboard inputs for 1 sec; otherwise too many keys interrupt
-        
-        if not tokens:
-            return
-        logger.info(f"Executing simultaneous: {tokens}")
-        pressed_keys = []
-        try:
-            for key in tokens:
-                self.keyboard.press(key)
-                pressed_keys.append(key)
-                #time.sleep(0.03)
-            #time.sleep(0.1)
-            time.sleep(2)
-        finally:
-            for key in reversed(pressed_keys):
-                self.keyboard.release(key)
-                time.sleep(0.03)
-
-    def execute_charge(self, tokens):
-        """Execute a charge move (e.g., Guile's Sonic Boom: ++f,h,x)
-        
-        Charge move timing for SF2:
-        - Hold the charge key (first token) for 2 seconds
-        - Release charge key while pressing the direction key with rolling overlap
-        - Then press the attack key(s)
-        
-        Example: "++f,h,x" means:
-        1. Hold 'f' (back) for 2 seconds
-        2. Release 'f' while pressing 'h' (forward) with 50ms overlap
-        3. Press 'x' (punch) while 'h' is still held
-        4. Release all keys
-        """
-        if len(tokens) < 2:
-            logger.warning(f"Charge command needs at least 2 keys, got: {tokens}")
-            return
-        
-        charge_key = tokens[0]
-        direction_key = tokens[1]
-        attack_keys = tokens[2:] if len(tokens) > 2 else []
-        
-        logger.info(f"Executing charge move: charge={charge_key}, direction={direction_key}, attacks={attack_keys}")
-        
-        try:
-            # Step 1: Hold charge key for 2 seconds
-            self.keyboard.press(charge_key)
-            time.sleep(2.0)
-            
-            # Step 2: Rolling overlap - press direction while still holding charge
-            self.keyboard.press(direction_key)
-            time.sleep(0.05)  # 50ms overlap
-            
-            # Step 3: Release charge key
-            self.keyboard.release(charge_key)
-            time.sleep(0.033)  # Small gap before attack
-            
-            # Step 4: Press attack key(s) while holding direction
-            for attack_key in attack_keys:
-                self.keyboard.press(attack_key)
-                time.sleep(0.033)
-            
-            # Hold the final position briefly
-            time.sleep(0.1)
-            
-            # Step 5: Release all keys (attack keys first, then direction)
-            for attack_key in reversed(attack_keys):
-                self.keyboard.release(attack_key)
-                time.sleep(0.017)
-            
-            self.keyboard.release(direction_key)
-            
-        except Exception as e:
-            logger.error(f"Error executing charge move: {e}")
-
-    def execute_half_circle_charge(self, tokens):
-        """Execute a half-circle charge move (e.g., Dhalsim's Yoga Flame: ++f,g,h,x)
-        
-        Half-circle charge move timing for SF2:
-        - Hold the first key (charge) for 2 seconds
-        - Roll through middle direction keys with overlapping releases
-        - Keep final direction held while pressing attack
-        
-        Example: "++f,g,h,x" means:
-        1. Hold 'f' (back) for 2 seconds
-        2. Press 'g' (down) while releasing 'f' with overlap
-        3. Press 'h' (forward) while releasing 'g' with overlap
-        4. Press 'x' (punch) while 'h' is still held
-        5. Release all keys
+        Returns the perf_counter_ns time of the first key event.
         """
-        if len(tokens) < 4:
-            logger.warning(f"Half-circle charge needs at least 4 keys, got: {tokens}")
-            return
-        
-        charge_key = tokens[0]
-        direction_keys = tokens[1:-1]  # All middle keys are directions
-        attack_key = tokens[-1]
-        
-        logger.info(f"Executing half-circle charge: charge={charge_key}, directions={direction_keys}, attack={attack_key}")
-        
-        try:
-            # Step 1: Hold charge key for 2 seconds
-            self.keyboard.press(charge_key)
-            time.sleep(2.0)
-            
-            # Step 2: Roll through direction keys with overlapping releases
-            prev_key = charge_key
-            for direction_key in direction_keys:
-                # Press next direction while still holding previous
-                self.keyboard.press(direction_key)
-                time.sleep(0.05)  # 50ms overlap
-                
-                # Release previous key
-                self.keyboard.release(prev_key)
-                time.sleep(0.033)  # Small gap
-                
-                prev_key = direction_key
-            
-            # Step 3: Press attack while holding final direction
-            self.keyboard.press(attack_key)
-            time.sleep(0.1)  # Hold briefly
-            
-            # Step 4: Release attack first, then final direction
-            self.keyboard.release(attack_key)
-            time.sleep(0.017)
-            self.keyboard.release(prev_key)
-            
-        except Exception as e:
-            logger.error(f"Error executing half-circle charge move: {e}")
-
-    def execute_special_command(self, command, special_name):
-        """Parse and execute a special move command with cooldown protection"""
-        now = time.time()
+        logger.debug("Executing %r: %d key events over %dms", plan.command, len(plan.events), plan.duration_ms)
+        first_key_ns = self.schedulers[exchange].play(plan, self._emitters[exchange], preempt)
+        self.keys.lease_held(exchange, self.hold_lease_ns)
+        return first_key_ns
+
+    def special_ready(self, special_name):
+        """Cooldown protection for special moves; marks the special as fired when ready"""
+        now = self.clock()
         if special_name in self.special_cooldowns:
             if now - self.special_cooldowns[special_name] < self.special_cooldown_time:
-                return
+                return False
 
         self.special_cooldowns[special_name] = now
+        return True
 
-        cmd_type, tokens = self.parse_command(command)
-        if cmd_type is None or not tokens:
-            logger.warning(f"Invalid special command for {special_name}: '{command}'")
-            return
-
-        logger.info(f"Triggering special move {special_name}: {command}")
-
-        if cmd_type == CommandType.RAPID_REPEAT:
-            self.execute_rapid_repeat(tokens)
-        elif cmd_type == CommandType.SEQUENTIAL:
-            self.execute_sequential(tokens)
-        elif cmd_type == CommandType.SIMULTANEOUS:
-            self.execute_simultaneous(tokens)
-        elif cmd_type == CommandType.SINGLE:
-            self.press_key(tokens[0])
-        elif cmd_type == CommandType.CHARGE:
-            self.execute_charge(tokens)
-        elif cmd_type == CommandType.HALF_CIRCLE_CHARGE:
-            self.execute_half_circle_charge(tokens)
-
-    def check_special_moves(self, quantity, exchange, signal_type):
-        """Check if quantity triggers any special moves for the given exchange and signal type (1-9)"""
-        if not self.config or not self.config.get('isActive'):
-            return
-
-        prefix = 'binance' if exchange == 'binance' else 'coinbase'
-
-        for i in range(1, 10):
-            special_signal = self.config.get(f"{prefix}Special{i}Signal", "buy")
-            if special_signal != signal_type:
-                continue
+    def enqueue(self, exchange, kind, name, plan, received_ns=None, expires_ns=None, side=None, quantity=0.0):
+        """Hand a plan to the player's executor thread; never blocks the websocket thread.
 
-            min_val = float(self.config.get(f"{prefix}Special{i}Min", 0))
-            max_val = float(self.config.get(f"{prefix}Special{i}Max", 0))
-            command = self.config.get(f"{prefix}Special{i}Command", "")
-
-            if min_val <= quantity <= max_val and command:
-                self.execute_special_command(command, f"{prefix}Special{i}")
-                break
-
-    def check_movement_controls(self, quantity, exchange, signal_type):
-        """Check if quantity triggers movement controls (Forward/Backward) for the given exchange and signal type"""
-        if not self.config or not self.config.get('isActive'):
+        side and quantity describe the trade that triggered it, for the action journal.
+        """
+        if plan is None:
             return
-
-        prefix = 'binance' if exchange == 'binance' else 'coinbase'
-
-        movements = ['MoveForward', 'MoveBackward']
-        for movement in movements:
-            movement_signal = self.config.get(f"{prefix}{movement}Signal", "buy")
-            if movement_signal != signal_type:
-                continue
-
-            min_val = float(self.config.get(f"{prefix}{movement}Min", 0))
-            max_val = float(self.config.get(f"{prefix}{movement}Max", 0))
-            key = self.config.get(f"{prefix}{movement}Key", "")
-
-            if min_val <= quantity <= max_val and key:
-                logger.info(f"MOVing {movement} ({prefix}) with key {key} (Qty: {quantity})")
-                self.press_key(key,0.5)
-
-    def execute_directional_jump(self, jump_key, direction_key):
-        """Execute a directional jump: press direction, then jump, then release both.
-        
-        This creates a rolling overlap for diagonal jumps in fighting games.
+        if self.limiter and not self.limiter.allow(exchange, kind, plan, self.clock()):
+            logger.debug("%s input rate limit, rejected %s %s", PLAYERS[exchange], kind, name)
+            outcome = LIMITED
+        elif self.enqueue_action(exchange, Action(kind, name, plan, time.perf_counter(), 1, received_ns, expires_ns)):
+            outcome = QUEUED
+        else:
+            outcome = DROPPED
+        if self.journal:
+            self.journal.write(exchange, side, quantity, kind, name, plan, outcome, received_ns)
+
+    def enqueue_action(self, exchange, action):
+        """Queue an Action on the player's executor, or on the ring to the key injection process; False if dropped"""
+        if self.injector is not None:
+            queued = self.injector.put(exchange, action)
+        else:
+            queued = self.executors[exchange].queue.put(action)
+        if not queued:
+            logger.debug("%s queue full, dropped %s %s", PLAYERS[exchange], action.kind, action.name)
+        return queued
+
+    def handle_trade(self, quantity, exchange, signal_type, received_ns=None, expires_ns=None):
+        """Classify a trade with the compiled trigger index and queue every matching control.
+
+        Order matches the dashboard layout: attack (first matching level), special move
+        (first matching slot), movement (every match), then jump/crouch.
         """
-        try:
-            direction_key = direction_key.lower().strip()
-            jump_key = jump_key.lower().strip()
-            
-            if direction_key not in ALLOWED_KEYS or jump_key not in ALLOWED_KEYS:
-                logger.warning(f"Invalid keys for directional jump: dir={direction_key}, jump={jump_key}")
-                return
-            
-            # Press direction first
-            self.keyboard.press(direction_key)
-            time.sleep(0.05)  # Small overlap delay
-            
-            # Press jump while holding direction
-            self.keyboard.press(jump_key)
-            time.sleep(0.15)  # Hold both keys
-            
-            # Release both keys
-            self.keyboard.release(jump_key)
-            self.keyboard.release(direction_key)
-            
-        except Exception as e:
-            logger.error(f"Error executing directional jump: {e}")
-
-    def check_jump_crouch_controls(self, quantity, exchange, signal_type):
-        """Check if quantity triggers jump/crouch controls with periodic key pressing based on delay.
+        # One read of the snapshot per trade: a config swap mid-trade cannot mix old and new
+        snapshot = self.snapshot
+        match = snapshot.trigger_index.lookup(exchange, signal_type, quantity)
+        if match is None:
+            return
+        self.play_match(match, snapshot.plans, quantity, exchange, signal_type, received_ns, expires_ns)
+
+    def play_match(self, match, plans, quantity, exchange, signal_type, received_ns=None, expires_ns=None):
+        """Queue every control of a TriggerMatch (see handle_trade)"""
+        if match.attack:
+            level, key = match.attack
+            trade_logger.info("Triggering %s (%s%s) with key %s (Qty: %s)", level, exchange, signal_type.capitalize(),
+                              key, quantity)
+            self.enqueue(exchange, 'attack', level, plans.key_press(key, ATTACK_PRESS_MS), received_ns, expires_ns,
+                         signal_type, quantity)
+
+        if match.special:
+            special_name, command = match.special
+            plan = plans.command(command)
+            if plan is not None and self.special_ready(special_name):
+                trade_logger.info("Triggering special move %s: %s", special_name, command)
+                self.enqueue(exchange, 'special', special_name, plan, received_ns, expires_ns, signal_type, quantity)
+
+        for movement, key in match.movements:
+            trade_logger.info("MOVing %s (%s) with key %s (Qty: %s)", movement, exchange, key, quantity)
+            self.enqueue(exchange, 'movement', movement, plans.key_press(key, MOVEMENT_PRESS_MS), received_ns,
+                         expires_ns, signal_type, quantity)
+
+        self.trigger_jump_crouch(match.jump_crouch, quantity, exchange, received_ns, plans, expires_ns, signal_type)
+
+    def trigger_jump_crouch(self, specs, quantity, exchange, received_ns=None, plans=None, expires_ns=None,
+                            side=None):
+        """Fire matched jump/crouch controls with periodic key pressing based on delay.
 
         Jump/Crouch work differently from other controls - they trigger periodic key presses
         based on a configurable delay (in seconds). When quantity is in range, the key will
         be pressed once every 'delay' seconds.
-        
+
         For Jump, randomly selects between:
         - Left + Jump (directional jump left)
         - Right + Jump (directional jump right)
         - Neutral Jump (jump key only)
         """
-        if not self.config or not self.config.get('isActive'):
+        self.jump_crouch_active[f"{exchange}Jump"] = False
+        self.jump_crouch_active[f"{exchange}Crouch"] = False
+        if not specs:
             return
+        if plans is None:
+            plans = self.snapshot.plans
 
-        prefix = 'binance' if exchange == 'binance' else 'coinbase'
-        now = time.time()
+        now = self.clock()
+        for spec in specs:
+            self.jump_crouch_active[spec.action_key] = True
 
-        actions = ['Jump', 'Crouch']
-        for action in actions:
-            action_signal = self.config.get(f"{prefix}{action}Signal", "buy")
-            if action_signal != signal_type:
-                self.jump_crouch_active[f"{prefix}{action}"] = False
+            # Check if enough time has passed since last trigger
+            last_trigger = self.jump_crouch_last_trigger.get(spec.action_key, 0)
+            if now - last_trigger < spec.delay:
                 continue
 
-            min_val = float(self.config.get(f"{prefix}{action}Min", 0))
-            max_val = float(self.config.get(f"{prefix}{action}Max", 0))
-            key = self.config.get(f"{prefix}{action}Key", "")
-            delay = float(self.config.get(f"{prefix}{action}Delay", 5.0))
-
-            if min_val <= quantity <= max_val and key:
-                action_key = f"{prefix}{action}"
-                self.jump_crouch_active[action_key] = True
-
-                # Check if enough time has passed since last trigger
-                last_trigger = self.jump_crouch_last_trigger.get(action_key, 0)
-                if now - last_trigger >= delay:
-                    if action == 'Jump':
-                        # Get directional keys for Jump
-                        left_key = self.config.get(f"{prefix}JumpLeftKey", "")
-                        right_key = self.config.get(f"{prefix}JumpRightKey", "")
-                        
-                        # Build list of available jump options
-                        jump_options = ['neutral']  # Always have neutral jump
-                        if left_key and left_key.strip():
-                            jump_options.append('left')
-                        if right_key and right_key.strip():
-                            jump_options.append('right')
-                        
-                        # Randomly select jump type
-                        jump_type = random.choice(jump_options)
-                        
-                        if jump_type == 'left':
-                            logger.info(f"Triggering Left Jump ({prefix}) with keys {left_key}+{key} (Qty: {quantity}, Delay: {delay}s)")
-                            self.execute_directional_jump(key, left_key)
-                        elif jump_type == 'right':
-                            logger.info(f"Triggering Right Jump ({prefix}) with keys {right_key}+{key} (Qty: {quantity}, Delay: {delay}s)")
-                            self.execute_directional_jump(key, right_key)
-                        else:
-                            logger.info(f"Triggering Neutral Jump ({prefix}) with key {key} (Qty: {quantity}, Delay: {delay}s)")
-                            self.press_key(key, 0.15)
-                    else:
-                        # Crouch behavior unchanged
-                        logger.info(f"Triggering {action} ({prefix}) with key {key} (Qty: {quantity}, Delay: {delay}s)")
-                        self.press_key_hold(key, 1.75)
-
-                    self.jump_crouch_last_trigger[action_key] = now
+            key = spec.key
+            if spec.action == 'Jump':
+                # Randomly select jump type
+                jump_type = self.rng.choice(spec.jump_options)
+
+                if jump_type == 'left':
+                    trade_logger.info("Triggering Left Jump (%s) with keys %s+%s (Qty: %s, Delay: %ss)",
+                                      exchange, spec.left_key, key, quantity, spec.delay)
+                    self.enqueue(exchange, 'jump', spec.action_key, plans.directional_jump(key, spec.left_key),
+                                 received_ns, expires_ns, side, quantity)
+                elif jump_type == 'right':
+                    trade_logger.info("Triggering Right Jump (%s) with keys %s+%s (Qty: %s, Delay: %ss)",
+                                      exchange, spec.right_key, key, quantity, spec.delay)
+                    self.enqueue(exchange, 'jump', spec.action_key, plans.directional_jump(key, spec.right_key),
+                                 received_ns, expires_ns, side, quantity)
+                else:
+                    trade_logger.info("Triggering Neutral Jump (%s) with key %s (Qty: %s, Delay: %ss)",
+                                      exchange, key, quantity, spec.delay)
+                    self.enqueue(exchange, 'jump', spec.action_key, plans.key_press(key, JUMP_PRESS_MS), received_ns,
+                                 expires_ns, side, quantity)
             else:
-                self.jump_crouch_active[f"{prefix}{action}"] = False
+                # Crouch presses and holds the key (it is not released)
+                trade_logger.info("Triggering %s (%s) with key %s (Qty: %s, Delay: %ss)",
+                                  spec.action, exchange, key, quantity, spec.delay)
+                self.enqueue(exchange, 'crouch', spec.action_key, plans.key_press(key, CROUCH_HOLD_MS, release=False),
+                             received_ns, expires_ns, side, quantity)
+
+            self.jump_crouch_last_trigger[spec.action_key] = now
 
     def on_binance_message(self, ws, message):
+        received_ns = time.perf_counter_ns()
+        if self.recorder:
+            self.recorder.record('binance', message)
         try:
-            data = json.loads(message)
-            quantity = float(data.get('q', 0))
-            is_buyer_maker = data.get('m', False)
-
-            # Binance Buy = Punches, Sell = Kicks
-            if not is_buyer_maker: # Buy
-                self.check_range_and_press(quantity, 'binanceBuy')
-                self.check_special_moves(quantity, 'binance', 'buy')
-                self.check_movement_controls(quantity, 'binance', 'buy')
-                self.check_jump_crouch_controls(quantity, 'binance', 'buy')
-            else: # Sell
-                self.check_range_and_press(quantity, 'binanceSell')
-                self.check_special_moves(quantity, 'binance', 'sell')
-                self.check_movement_controls(quantity, 'binance', 'sell')
-                self.check_jump_crouch_controls(quantity, 'binance', 'sell')
+            trade = self.decoder.binance(message)
+            if trade.id:
+                missed = self.sequences['binance'].check(trade.id)
+                if missed:
+                    if missed == DUPLICATE:
+                        return
+                    self.on_gap('binance', trade.id, missed)
+            expires_ns = None
+            if self.max_trade_age_ns['binance']:
+                expires_ns = self.trade_expiry('binance', trade)
+                if expires_ns == STALE:
+                    return
+            if self.calibrator:
+                self.calibrator.observe('binance', trade.side, trade.quantity)
+            if self.shadows:
+                self.shadows.add('binance', trade.side, trade.quantity)
+            if self.metrics:
+                decoded_ns = time.perf_counter_ns()
+
+            # Binance Buy = Punches, Sell = Kicks (buyer is maker = sell)
+            self.on_trade(trade.quantity, 'binance', trade.side, received_ns, expires_ns)
+            if self.first_trade_ns is None:
+                self.mark_first_trade('binance')
+            if self.metrics:
+                self.metrics.trade('binance', trade.time, received_ns, decoded_ns, time.perf_counter_ns(), self.clock())
         except Exception as e:
-            logger.error(f"Binance error: {e}")
+            logger.error("Binance error: %s", e)
 
     def on_coinbase_message(self, ws, message):
+        received_ns = time.perf_counter_ns()
+        if self.recorder:
+            self.recorder.record('coinbase', message)
         try:
-            data = json.loads(message)
-            if data.get('type') != 'match':
+            # Subscriptions, heartbeats and last_match frames are rejected before decoding
+            trade = self.decoder.coinbase(message)
+            if trade is None:
                 return
-            quantity = float(data.get('size', 0))
-            side = data.get('side', '')
+            if trade.id:
+                missed = self.sequences['coinbase'].check(trade.id)
+                if missed:
+                    if missed == DUPLICATE:
+                        return
+                    self.on_gap('coinbase', trade.id, missed)
+            expires_ns = None
+            if self.max_trade_age_ns['coinbase']:
+                expires_ns = self.trade_expiry('coinbase', trade)
+                if expires_ns == STALE:
+                    return
+            if self.metrics:
+                decoded_ns = time.perf_counter_ns()
 
             # Coinbase Buy = Punches, Sell = Kicks
-            if side == 'buy':
-                self.check_range_and_press(quantity, 'coinbaseBuy')
-                self.check_special_moves(quantity, 'coinbase', 'buy')
-                self.check_movement_controls(quantity, 'coinbase', 'buy')
-                self.check_jump_crouch_controls(quantity, 'coinbase', 'buy')
-            elif side == 'sell':
-                self.check_range_and_press(quantity, 'coinbaseSell')
-                self.check_special_moves(quantity, 'coinbase', 'sell')
-                self.check_movement_controls(quantity, 'coinbase', 'sell')
-                self.check_jump_crouch_controls(quantity, 'coinbase', 'sell')
+            if trade.side in ('buy', 'sell'):
+                if self.calibrator:
+                    self.calibrator.observe('coinbase', trade.side, trade.quantity)
+                if self.shadows:
+                    self.shadows.add('coinbase', trade.side, trade.quantity)
+                self.on_trade(trade.quantity, 'coinbase', trade.side, received_ns, expires_ns)
+                if self.first_trade_ns is None:
+                    self.mark_first_trade('coinbase')
+                if self.metrics:
+                    self.metrics.trade('coinbase', trade.time, received_ns, decoded_ns, time.perf_counter_ns(), self.clock())
         except Exception as e:
-            logger.error(f"Coinbase error: {e}")
+            logger.error("Coinbase error: %s", e)
 
-    # WebSocket setup methods omitted for brevity, logic remains same as original
-    # but uses the new check_range_and_press method in on_message handlers
+    def trade_expiry(self, exchange, trade):
+        """perf_counter_ns time at which the trade passes the exchange's max trade age.
+
+        Age is the bridge clock minus the exchange trade time, so a backlog
+        flushed after a reconnect or a pause is shed rather than played late.
+        Returns STALE (and counts it) if the trade is already too old, None if
+        it carries no timestamp. Its actions are also skipped by the executor
+        if they are still queued at the expiry time.
+        """
+        trade_ns = trade_time_ns(trade.time)
+        if trade_ns is None:
+            return None
+        now_ns = time.perf_counter_ns()
+        expires_ns = now_ns + self.max_trade_age_ns[exchange] - int(self.clock() * 1e9 - trade_ns)
+        if expires_ns < now_ns:
+            self.stale_trades[exchange] += 1
+            return STALE
+        return expires_ns
+
+    def on_gap(self, exchange, trade_id, missed):
+        """Resync after the feed skipped `missed` trades right before trade_id"""
+        first_id, last_id = trade_id - missed, trade_id - 1
+        if self.resync == 'catch-up' and missed <= self.catch_up_limit:
+            logger.warning("%s feed skipped %d trade(s) (%s-%s), catching up", exchange, missed, first_id, last_id)
+            threading.Thread(target=self.catch_up, args=(exchange, first_id, last_id), daemon=True).start()
+        else:
+            logger.warning("%s feed skipped %d trade(s) (%s-%s), continuing from live", exchange, missed, first_id,
+                           last_id)
+
+    def catch_up(self, exchange, first_id, last_id):
+        """Fetch missed trades over REST and play them (on a worker thread, the feed keeps going)"""
+        try:
+            if exchange == 'binance':
+                trades = self.catchup.binance(self.config['symbol'], first_id, last_id)
+            else:
+                trades = self.catchup.coinbase(self.config['coinbaseSymbol'], first_id, last_id)
+        except Exception as e:
+            logger.error("Could not catch up %s trades %s-%s: %s", exchange, first_id, last_id, e)
+            return
+        played = 0
+        for trade in trades:
+            expires_ns = None
+            if self.max_trade_age_ns[exchange]:
+                expires_ns = self.trade_expiry(exchange, trade)
+                if expires_ns == STALE:
+                    continue
+            if trade.side in ('buy', 'sell'):
+                self.on_trade(trade.quantity, exchange, trade.side, None, expires_ns)
+                played += 1
+        self.caught_up[exchange] += played
+        logger.info("Caught up %s: %d of %d missed trade(s) fetched, %d played", exchange, len(trades),
+                    last_id - first_id + 1, played)
+
+    def on_feed_open(self, exchange):
+        """Count reconnections of an exchange feed (called on every websocket open)"""
+        if self._connected[exchange]:
+            self.reconnects[exchange] += 1
+            logger.info("Reconnected to %s feed (reconnect %d)", exchange, self.reconnects[exchange])
+        self._connected[exchange] = True
+
+    def binance_stream_url(self):
+        symbol = self.config['symbol'].lower()
+        return f"{self.binance_ws_url}/{symbol}@aggTrade"
+
+    def coinbase_subscription(self):
+        return json.dumps({
+            "type": "subscribe",
+            "product_ids": [self.config['coinbaseSymbol']],
+            "channels": ["matches"]
+        })
 
     def connect_binance(self):
         from websocket import WebSocketApp
-        symbol = self.config['symbol'].lower()
-        ws_url = f"wss://data-stream.binance.vision/ws/{symbol}@aggTrade"
-        ws = WebSocketApp(ws_url, on_message=self.on_binance_message)
-        ws.run_forever(reconnect=5)
+        self.binance_ws = WebSocketApp(self.binance_stream_url(), on_message=self.on_binance_message,
+                                       on_open=lambda ws: self.on_feed_open('binance'))
+        self.binance_ws.run_forever(reconnect=5)
 
     def connect_coinbase(self):
         from websocket import WebSocketApp
-        ws_url = "wss://ws-feed.exchange.coinbase.com"
         def on_open(ws):
-            ws.send(json.dumps({
-                "type": "subscribe",
-                "product_ids": [self.config['coinbaseSymbol']],
-                "channels": ["matches"]
-            }))
-        ws = WebSocketApp(ws_url, on_open=on_open, on_message=self.on_coinbase_message)
-        ws.run_forever(reconnect=5)
-
-    def run(self):
-        if not self.fetch_config(): return
+            self.on_feed_open('coinbase')
+            ws.send(self.coinbase_subscription())
+        self.coinbase_ws = WebSocketApp(self.coinbase_ws_url, on_open=on_open, on_message=self.on_coinbase_message)
+        self.coinbase_ws.run_forever(reconnect=5)
+
+    def log_executor_stats(self):
+        if self.injector is not None:
+            # Queue, key timing and key state lines come from the injection process
+            logger.info("Injector ring: %s", self.injector.summary())
+        for exchange, executor in self.executors.items():
+            if self.injector is None:
+                logger.info("Input queue %s", executor.summary())
+                logger.info("Key timing %s: %s", executor.player, self.schedulers[exchange].jitter.summary())
+                logger.info("Keys %s: %s", executor.player, self.keys.summary(exchange))
+                if executor.scheduler != 'fifo':
+                    logger.info("Priority %s", executor.priority_summary())
+            if self.metrics:
+                logger.info("Latency %s: %s", executor.player, self.metrics.summary(exchange))
+            if self.max_trade_age_ns[exchange]:
+                logger.info("Stale trades shed %s: %d (older than %gs)", executor.player, self.stale_trades[exchange],
+                            self.max_trade_age_ns[exchange] / 1e9)
+            if self.batcher:
+                logger.info("Batching %s: %s", executor.player, self.batcher.summary(exchange))
+            if self.limiter:
+                logger.info("Input limits %s: %s", executor.player, self.limiter.summary(exchange))
+            if self.calibrator:
+                logger.info("Adaptive ranges %s: %s", executor.player, self.calibrator.summary(exchange))
+            sequence = self.sequences[exchange]
+            if self.reconnects[exchange] or sequence.gaps or sequence.duplicates:
+                logger.info("Feed %s: %d reconnect(s), %d gap(s) with %d missed trade(s) (%d caught up), "
+                            "%d duplicate(s) dropped", executor.player, self.reconnects[exchange], sequence.gaps,
+                            sequence.missed, self.caught_up[exchange], sequence.duplicates)
+        if self.journal:
+            logger.info("Action journal: %s", self.journal.summary())
+        if self.shadows:
+            # As of the last evaluated batch; evaluation runs in housekeeping() and on shutdown
+            try:
+                for line in self.shadows.summary_lines():
+                    logger.info(line)
+            except Exception as e:
+                logger.error("Shadow evaluation error: %s", e)
+
+    def start_metrics_server(self):
+        if self.metrics and self.metrics_port:
+            self.metrics_server = MetricsServer(self.metrics.render, self.metrics_port)
+            self.metrics_server.start()
+
+    def start_executors(self):
+        if self.injector is not None:
+            self.injector.start()
+        else:
+            for executor in self.executors.values():
+                executor.start()
+        if self.batcher:
+            self.batcher.start()
+
+    def housekeeping(self):
+        """Once-a-second work of the run loop: fold latency samples and log stats when due.
+
+        Returns True when the dashboard config is due for a refresh.
+        """
+        now = time.monotonic()
+        self.keys.expire()
+        if self.logs:
+            self.logs.flush()
+        if self.calibrator:
+            self.calibrator.tick(now)
+        if self.shadows:
+            try:
+                self.shadows.evaluate(self.clock())
+            except Exception as e:
+                logger.error("Shadow evaluation error: %s", e)
+        if self.metrics:
+            self.metrics.collect()
+        if self.stats_interval and now - self._last_stats >= self.stats_interval:
+            self.log_executor_stats()
+            self._last_stats = now
+        if self.config_refresh and now - self._last_refresh >= self.config_refresh:
+            self._last_refresh = now
+            return True
+        return False
+
+    def stop(self):
+        """Ask the run loop to shut down; safe to call from any thread"""
+        self.stopped.set()
+
+    def shutdown(self):
+        for ws in (self.binance_ws, self.coinbase_ws):
+            if ws is not None:
+                ws.close()
+        if self.batcher:
+            # Plays the last window before the executors stop
+            self.batcher.stop(timeout=1)
+        if self.injector is not None:
+            # Hands over what is already on the ring, then releases its held keys
+            self.injector.stop()
+        for executor in self.executors.values():
+            executor.stop(timeout=1)
+        self.keys.release_all()
+        self.keyboard.close()
+        if self.recorder:
+            self.recorder.close()
+        if self.journal:
+            self.journal.close()
+        if self.shadows:
+            try:
+                self.shadows.evaluate(self.clock(), force=True)
+                self.shadows.write_report()
+            except Exception as e:
+                logger.error("Shadow evaluation error: %s", e)
+        if self.metrics_server:
+            self.metrics_server.close()
+            self.metrics_server = None
+        if self.logs:
+            # Last suppressed-message summaries and queued lines
+            self.logs.close()
+
+    def wait_idle(self, timeout=None):
+        """Wait until every queued action has been played; return False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        executors_idle = (lambda: self.injector.idle) if self.injector is not None else (
+            lambda: all(executor.idle for executor in self.executors.values()))
+        while not executors_idle() or (self.batcher and any(self.batcher.pending.values())):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def replay(self, path, speed=1.0, config_path=None):
+        """Run a recorded feed journal through the bridge instead of the live websockets"""
+        if not self.load_replay_config(config_path):
+            return
+        # Replays must be repeatable: gaps in the journal are counted, never fetched from the live exchange
+        self.resync = 'skip'
+        self.start_executors()
+        try:
+            FeedReplayer(self, path, speed).run()
+            self.wait_idle()
+            self.log_executor_stats()
+        finally:
+            self.shutdown()
+
+    def load_replay_config(self, config_path=None):
+        """Get the config to replay with: a JSON file of dashboard fields, else the saved snapshot.
+
+        Neither needs the dashboard, so a replay runs offline and decides the
+        same way every time; the live dashboard config is only the fallback.
+        """
+        if config_path:
+            with open(config_path) as f:
+                config = json.load(f)
+            if not isinstance(config, dict):
+                raise ValueError(f"Replay config {config_path} is not a JSON object of dashboard fields")
+            self.apply_config(config)
+            logger.info("Replaying with the config in %s", config_path)
+            return True
+        snapshot, saved_at = load_snapshot(self.config_cache)
+        if snapshot is not None:
+            self.use_snapshot(snapshot)
+            logger.info("Replaying with the config snapshot %s", self.config_cache)
+            return True
+        logger.warning("No --replay-config or config snapshot: replaying with the live dashboard config")
+        return self.fetch_config()
+
+    def run(self, io='threads'):
+        if isinstance(self.keyboard, LazyBackend) and self.injector is None:
+            self.keyboard.preload()
+        if not self.load_config(): return
+        logger.info("Decoding exchange frames with %s", self.decoder.name)
+        if io == 'asyncio':
+            from async_feeds import AsyncBridgeRunner
+            AsyncBridgeRunner(self).run()
+        else:
+            self.run_threads()
+
+    def run_threads(self):
+        """One websocket-client thread per exchange; the main thread does housekeeping"""
+        self.start_executors()
+        self.start_metrics_server()
         threading.Thread(target=self.connect_binance, daemon=True).start()
         threading.Thread(target=self.connect_coinbase, daemon=True).start()
-        while True: time.sleep(1)
+        try:
+            while not self.stopped.wait(1):
+                if self.housekeeping():
+                    self.fetch_config()
+        finally:
+            self.shutdown()
 
-if __name__ == "__main__":
-    import os
+def parse_args(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Crypto quantity to MAME keyboard bridge (SF2 edition)")
     # Update this with your actual dashboard URL if running remotely
-    bridge = CryptoMAMEBridge()
-  
+    parser.add_argument('--dashboard-url', default="http://localhost:5000",
+                        help="web dashboard serving /api/configurations")
+    parser.add_argument('--queue-size', type=int, default=32,
+                        help="max pending actions per player")
+    parser.add_argument('--overflow-policy', choices=OVERFLOW_POLICIES, default='drop-newest',
+                        help="what to do with bursts the keyboard cannot keep up with")
+    parser.add_argument('--stats-interval', type=float, default=30,
+                        help="seconds between input queue summaries in the log (0 disables)")
+    parser.add_argument('--fps', type=float, default=60.0,
+                        help="emulated game frame rate key timings are aligned to (59.6 for CPS1, 0 disables)")
+    parser.add_argument('--spin-us', type=float, default=1500,
+                        help="busy-wait this long before each key deadline for sub-ms accuracy (0 = sleep only)")
+    parser.add_argument('--keyboard', choices=BACKENDS, default='pynput',
+                        help="how key events are sent: pynput (OS keyboard), uinput (Linux virtual keyboard), "
+                             "null or recording (no real key presses, for testing)")
+    parser.add_argument('--decoder', choices=DECODERS, default='auto',
+                        help="JSON decoder for exchange frames (auto = msgspec, then orjson, then json)")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="time every pipeline stage and serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    parser.add_argument('--io', choices=('threads', 'asyncio'), default='threads',
+                        help="run the exchange feeds on one thread each, or both on one asyncio event loop "
+                             "(needs the websockets package)")
+    parser.add_argument('--config-refresh', type=float, default=2, metavar='SECONDS',
+                        help="poll the dashboard for config changes this often while running (0 = only at start)")
+    parser.add_argument('--config-cache', default='bridge_config.snapshot', metavar='PATH',
+                        help="compiled copy of the last dashboard config, used to start instantly "
+                             "when the dashboard is slow or down ('' disables)")
+    parser.add_argument('--max-trade-age', type=float, default=0, metavar='SECONDS',
+                        help="drop trades older than this by exchange time instead of playing them late (0 = keep all)")
+    parser.add_argument('--max-trade-age-binance', type=float, metavar='SECONDS',
+                        help="override --max-trade-age for Binance (Player 1)")
+    parser.add_argument('--max-trade-age-coinbase', type=float, metavar='SECONDS',
+                        help="override --max-trade-age for Coinbase (Player 2)")
+    parser.add_argument('--resync', choices=RESYNC_POLICIES, default='skip',
+                        help="what to do about trades missed across a reconnect: skip to live, or "
+                             "catch-up from the exchange REST trades endpoint")
+    parser.add_argument('--binance-ws-url', default=BINANCE_WS_URL, metavar='URL',
+                        help="Binance stream base URL (<URL>/<symbol>@aggTrade), e.g. a local exchange_sim.py")
+    parser.add_argument('--coinbase-ws-url', default=COINBASE_WS_URL, metavar='URL',
+                        help="Coinbase websocket feed URL")
+    parser.add_argument('--binance-rest-url', default=BINANCE_REST_URL, metavar='URL',
+                        help="Binance REST base URL for --resync catch-up")
+    parser.add_argument('--coinbase-rest-url', default=COINBASE_REST_URL, metavar='URL',
+                        help="Coinbase REST base URL for --resync catch-up")
+    parser.add_argument('--catch-up-limit', type=int, default=1000, metavar='TRADES',
+                        help="gaps larger than this skip to live even with --resync catch-up")
+    parser.add_argument('--batch', choices=BATCH_RULES, metavar='RULE',
+                        help="decide once per game frame per player instead of per trade: strongest "
+                             "(largest triggering trade) or volume (most traded range); needs numpy")
+    parser.add_argument('--adaptive-window', type=float, default=0, metavar='SECONDS',
+                        help="keep every trigger range at a fixed percentile of the trade sizes seen over this "
+                             "sliding window instead of fixed BTC quantities (0 = off)")
+    parser.add_argument('--adaptive-interval', type=float, default=10, metavar='SECONDS',
+                        help="how often adaptive ranges are recomputed and swapped in")
+    parser.add_argument('--adaptive-targets', metavar='PATH',
+                        help="JSON of target percentiles per range, e.g. {\"binanceBuyWeak\": [50, 80]}; "
+                             "default: the percentiles the configured ranges have in the first full window")
+    parser.add_argument('--input-rate', action='append', metavar='CLASS=RATE[:BURST]',
+                        help="cap each player's button presses per second for an action class (special, attack, "
+                             "movement, jump_crouch, or total), with up to BURST presses at once; excess "
+                             "actions are dropped before they are queued (repeatable)")
+    parser.add_argument('--hold-lease', type=float, default=5.0, metavar='SECONDS',
+                        help="release keys left held (crouch) after this long unless renewed (0 = never)")
+    parser.add_argument('--scheduler', choices=SCHEDULERS, default='fifo',
+                        help="per-player action order: fifo, priority (special > attack > movement > "
+                             "jump/crouch), cancel or interleave (priority, and long holds give way to "
+                             "higher priority actions)")
+    parser.add_argument('--injector', choices=INJECTORS, default='thread',
+                        help="press keys on threads of this process, or (experimental, needs a spare CPU core) "
+                             "in a separate process fed over a shared-memory ring so feed decoding cannot delay "
+                             "key timing")
+    parser.add_argument('--log-queue', action='store_true',
+                        help="format and write log lines on a background thread instead of the feed threads")
+    parser.add_argument('--log-limit', action='append', metavar='CATEGORY=N',
+                        help="write each distinct message of a log category at most N times per summary "
+                             "interval, then summarize (trades, command_plans, triggers, ... or * for all; "
+                             "repeatable)")
+    parser.add_argument('--log-summary-interval', type=float, default=30, metavar='SECONDS',
+                        help="interval of --log-limit")
+    parser.add_argument('--record', metavar='PATH',
+                        help="append every raw exchange frame to this compressed journal")
+    parser.add_argument('--action-journal', metavar='PATH',
+                        help="append every decided action with its trade, control, keys and outcome to this "
+                             "memory-mapped binary journal (read with action_journal.load_journal)")
+    parser.add_argument('--action-journal-max-mb', type=float, default=64, metavar='MB',
+                        help="rotate the action journal to PATH.1 when it reaches this size")
+    parser.add_argument('--action-journal-backups', type=int, default=5, metavar='N',
+                        help="rotated action journals to keep")
+    parser.add_argument('--shadow', action='append', metavar='NAME=PATH',
+                        help="also evaluate the dashboard fields in this JSON file, laid over the active config, "
+                             "on the live trades without pressing keys, and report its trigger rates, overlap "
+                             "with the active config and queue pressure (repeatable)")
+    parser.add_argument('--shadow-report', metavar='PATH',
+                        help="write the shadow evaluation report as JSON here on exit")
+    parser.add_argument('--replay', metavar='PATH',
+                        help="replay a recorded journal instead of connecting to the exchanges")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="replay speed multiplier (0 = as fast as possible)")
+    parser.add_argument('--replay-config', metavar='PATH',
+                        help="JSON file of dashboard fields to replay with (default: the --config-cache snapshot, "
+                             "then the live dashboard)")
+    return parser.parse_args(argv)
 
-    bridge.run()
+if __name__ == "__main__":
+    args = parse_args()
+    logs = None
+    if args.log_queue or args.log_limit:
+        logs = LogPipeline(args.log_queue, parse_limits(args.log_limit), args.log_summary_interval).install()
+    bridge = CryptoMAMEBridge(
+        dashboard_url=args.dashboard_url.rstrip('/'),
+        queue_size=args.queue_size,
+        overflow_policy=args.overflow_policy,
+        stats_interval=args.stats_interval,
+        fps=args.fps,
+        spin_us=args.spin_us,
+        keyboard=args.keyboard,
+        record_path=args.record,
+        action_journal=args.action_journal,
+        action_journal_max_mb=args.action_journal_max_mb,
+        action_journal_backups=args.action_journal_backups,
+        shadow_configs=load_candidates(args.shadow),
+        shadow_report=args.shadow_report,
+        decoder=args.decoder,
+        metrics_port=args.metrics_port,
+        config_refresh=args.config_refresh,
+        config_cache=args.config_cache or None,
+        max_trade_age={
+            'binance': args.max_trade_age if args.max_trade_age_binance is None else args.max_trade_age_binance,
+            'coinbase': args.max_trade_age if args.max_trade_age_coinbase is None else args.max_trade_age_coinbase,
+        },
+        resync=args.resync,
+        catch_up_limit=args.catch_up_limit,
+        catchup=TradeCatchup(args.binance_rest_url, args.coinbase_rest_url) if args.resync == 'catch-up' else None,
+        batch=args.batch,
+        hold_lease=args.hold_lease,
+        scheduler=args.scheduler,
+        injector=args.injector,
+        logs=logs,
+        binance_ws_url=args.binance_ws_url,
+        coinbase_ws_url=args.coinbase_ws_url,
+        adaptive_window=args.adaptive_window,
+        adaptive_interval=args.adaptive_interval,
+        adaptive_targets=load_targets(args.adaptive_targets) if args.adaptive_targets else None,
+        input_rates=parse_rate_limits(args.input_rate),
+    )
+
+    if args.replay:
+        bridge.replay(args.replay, args.replay_speed, args.replay_config)
+    else:
+        bridge.run(args.io)
@@ -0,0 +1,398 @@
+"""
+Precompiled key timing plans for the SF2 bridge.
+
+Every input the bridge sends - a single attack press, a movement hold, a jump or
+a special move command like "++f,g,h,x", "x+y+c" or "d,df,f" - is compiled once
+into an immutable CommandPlan: a timeline of (offset_ms, press/release, key)
+events plus the total duration the player is busy. Plans are cached per
+configuration, so parsing and token validation (and their warnings) happen when
+the config is loaded instead of on every trigger.
+"""
+
+import logging
+from collections import namedtuple
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+
+class CommandType(Enum):
+    RAPID_REPEAT = 1
+    SEQUENTIAL = 2
+    SIMULTANEOUS = 3
+    SINGLE = 4
+    CHARGE = 5
+    HALF_CIRCLE_CHARGE = 6
+
+
+ALLOWED_KEYS = set('abcdefghijklmnopqrstuvwxyz0123456789')
+
+PRESS = 'press'
+RELEASE = 'release'
+
+PlanEvent = namedtuple('PlanEvent', ['offset_ms', 'action', 'key'])
+
+
+class CommandPlan(namedtuple('CommandPlan', ['command', 'command_type', 'tokens', 'events', 'duration_ms'])):
+    """Immutable key timeline; duration_ms is when the player is free for the next action"""
+    __slots__ = ()
+
+    def describe(self):
+        lines = [f"{self.command!r} ({self.command_type.name if self.command_type else 'KEY'}, {self.duration_ms}ms)"]
+        for event in self.events:
+            lines.append(f"  {event.offset_ms:6d}ms {event.action:<7} {event.key}")
+        return "\n".join(lines)
+
+
+class _Timeline:
+    """Helper for building plans with a running clock"""
+
+    def __init__(self):
+        self.t = 0
+        self.events = []
+
+    def press(self, key):
+        self.events.append(PlanEvent(self.t, PRESS, key))
+
+    def release(self, key):
+        self.events.append(PlanEvent(self.t, RELEASE, key))
+
+    def wait(self, ms):
+        self.t += ms
+
+    def plan(self, command, command_type, tokens):
+        return CommandPlan(command, command_type, tuple(tokens), tuple(self.events), self.t)
+
+
+def parse_command(command):
+    """Parse a command string and return (CommandType, tokens)
+
+    Command formats:
+    - Rapid repeat: "xxxxx" (same key mashed)
+    - Sequential: "x,y,c,u" (comma-separated keys)
+    - Simultaneous: "x+y+c" (keys pressed together)
+    - Charge: "++f,h,x" (hold first key 2s, then sequential with overlap)
+    - Single: "x" (single key press)
+    """
+    if not command or not command.strip():
+        return None, []
+
+    command = command.lower().strip()
+
+    # Check for charge commands (starts with "++")
+    # CHARGE: 3 keys (++f,h,x) - hold charge, release to direction, attack
+    # HALF_CIRCLE_CHARGE: 4+ keys (++f,g,h,x) - hold charge, roll through directions, attack
+    if command.startswith('++'):
+        charge_command = command[2:]  # Remove the "++" prefix
+        tokens = [t.strip() for t in charge_command.split(',') if t.strip()]
+        valid_tokens = [t for t in tokens if len(t) == 1 and t in ALLOWED_KEYS]
+        if len(valid_tokens) < 3:
+            logger.warning("Charge command '%s' needs at least 3 keys (charge + direction + attack)", command)
+            return None, []
+        if len(valid_tokens) != len(tokens):
+            logger.warning("Some tokens in charge command '%s' are invalid", command)
+        # 3 keys = CHARGE, 4+ keys = HALF_CIRCLE_CHARGE
+        if len(valid_tokens) == 3:
+            return CommandType.CHARGE, valid_tokens
+        else:
+            return CommandType.HALF_CIRCLE_CHARGE, valid_tokens
+
+    if '+' in command:
+        tokens = [t.strip() for t in command.split('+') if t.strip()]
+        valid_tokens = [t for t in tokens if len(t) == 1 and t in ALLOWED_KEYS]
+        if len(valid_tokens) != len(tokens):
+            logger.warning("Some tokens in simultaneous command '%s' are invalid", command)
+        return CommandType.SIMULTANEOUS, valid_tokens
+
+    if ',' in command:
+        tokens = [t.strip() for t in command.split(',') if t.strip()]
+        valid_tokens = [t for t in tokens if len(t) == 1 and t in ALLOWED_KEYS]
+        if len(valid_tokens) != len(tokens):
+            logger.warning("Some tokens in sequential command '%s' are invalid", command)
+        return CommandType.SEQUENTIAL, valid_tokens
+
+    if len(command) > 1 and len(set(command)) == 1 and command[0] in ALLOWED_KEYS:
+        return CommandType.RAPID_REPEAT, [command[0]] * len(command)
+
+    if len(command) == 1 and command in ALLOWED_KEYS:
+        return CommandType.SINGLE, [command]
+
+    logger.warning("Unable to parse command: '%s'", command)
+    return None, []
+
+
+# How long the bridge holds single-key controls
+ATTACK_PRESS_MS = 100
+MOVEMENT_PRESS_MS = 500
+JUMP_PRESS_MS = 150
+CROUCH_HOLD_MS = 1750
+
+
+def key_press_plan(key, duration_ms=100, release=True):
+    """Press a single key for duration_ms; release=False keeps it held (crouch)"""
+    timeline = _Timeline()
+    timeline.press(key)
+    timeline.wait(duration_ms)
+    if release:
+        timeline.release(key)
+    return timeline.plan(key, None, [key])
+
+
+def rapid_repeat_plan(command, tokens):
+    """Rapid key mashing - same key pressed multiple times quickly
+    SF2 timing: 33ms press + 17ms gap = 50ms per input (3 frames at 60fps)
+    """
+    timeline = _Timeline()
+    for key in tokens:
+        timeline.press(key)
+        timeline.wait(33)
+        timeline.release(key)
+        timeline.wait(17)
+    return timeline.plan(command, CommandType.RAPID_REPEAT, tokens)
+
+
+def sequential_plan(command, tokens):
+    """Sequential key presses for special move inputs
+    SF2 timing: 33ms press per motion input (~2 frames at 60fps)
+    A 3-input motion (e.g. d,df,f for hadouken) completes in ~116ms (7 frames)
+    Well within the 10-12 frame window required for special move registration
+    Last two keys held together and released together for better move registration
+    """
+    timeline = _Timeline()
+
+    if len(tokens) == 1:
+        timeline.press(tokens[0])
+        timeline.wait(67)
+        timeline.release(tokens[0])
+        return timeline.plan(command, CommandType.SEQUENTIAL, tokens)
+
+    for key in tokens[:-2]:
+        timeline.press(key)
+        timeline.wait(33)
+        timeline.release(key)
+
+    second_last = tokens[-2]
+    last = tokens[-1]
+
+    # Third-last key is re-pressed together with the second-last (two-key commands have none)
+    third_last = tokens[-3] if len(tokens) > 2 else None
+    if third_last:
+        timeline.press(third_last)
+    timeline.press(second_last)
+    timeline.wait(33)
+    if third_last:
+        timeline.release(third_last)
+    timeline.wait(17)
+
+    timeline.press(last)
+    timeline.wait(33)
+    timeline.release(second_last)
+    timeline.release(last)
+    return timeline.plan(command, CommandType.SEQUENTIAL, tokens)
+
+
+def simultaneous_plan(command, tokens):
+    """Simultaneous key press (chord)
+    Waits 1s first to calm/block all other keyboard inputs (otherwise too many keys interrupt),
+    then presses all keys together, holds 2s and releases in reverse order 30ms apart
+    """
+    timeline = _Timeline()
+    timeline.wait(1000)
+    for key in tokens:
+        timeline.press(key)
+    timeline.wait(2000)
+    for key in reversed(tokens):
+        timeline.release(key)
+        timeline.wait(30)
+    return timeline.plan(command, CommandType.SIMULTANEOUS, tokens)
+
+
+def charge_plan(command, tokens):
+    """Charge move (e.g., Guile's Sonic Boom: ++f,h,x)
+
+    Example: "++f,h,x" means:
+    1. Hold 'f' (back) for 2 seconds
+    2. Release 'f' while pressing 'h' (forward) with 50ms overlap
+    3. Press 'x' (punch) while 'h' is still held
+    4. Release all keys
+    """
+    charge_key = tokens[0]
+    direction_key = tokens[1]
+    attack_keys = tokens[2:]
+
+    timeline = _Timeline()
+    # Step 1: Hold charge key for 2 seconds
+    timeline.press(charge_key)
+    timeline.wait(2000)
+
+    # Step 2: Rolling overlap - press direction while still holding charge
+    timeline.press(direction_key)
+    timeline.wait(50)
+
+    # Step 3: Release charge key, small gap before attack
+    timeline.release(charge_key)
+    timeline.wait(33)
+
+    # Step 4: Press attack key(s) while holding direction
+    for attack_key in attack_keys:
+        timeline.press(attack_key)
+        timeline.wait(33)
+
+    # Hold the final position briefly
+    timeline.wait(100)
+
+    # Step 5: Release all keys (attack keys first, then direction)
+    for attack_key in reversed(attack_keys):
+        timeline.release(attack_key)
+        timeline.wait(17)
+    timeline.release(direction_key)
+    return timeline.plan(command, CommandType.CHARGE, tokens)
+
+
+def half_circle_charge_plan(command, tokens):
+    """Half-circle charge move (e.g., Dhalsim's Yoga Flame: ++f,g,h,x)
+
+    Example: "++f,g,h,x" means:
+    1. Hold 'f' (back) for 2 seconds
+    2. Press 'g' (down) while releasing 'f' with overlap
+    3. Press 'h' (forward) while releasing 'g' with overlap
+    4. Press 'x' (punch) while 'h' is still held
+    5. Release all keys
+    """
+    charge_key = tokens[0]
+    direction_keys = tokens[1:-1]  # All middle keys are directions
+    attack_key = tokens[-1]
+
+    timeline = _Timeline()
+    # Step 1: Hold charge key for 2 seconds
+    timeline.press(charge_key)
+    timeline.wait(2000)
+
+    # Step 2: Roll through direction keys with overlapping releases
+    prev_key = charge_key
+    for direction_key in direction_keys:
+        timeline.press(direction_key)
+        timeline.wait(50)  # 50ms overlap
+        timeline.release(prev_key)
+        timeline.wait(33)  # Small gap
+        prev_key = direction_key
+
+    # Step 3: Press attack while holding final direction
+    timeline.press(attack_key)
+    timeline.wait(100)
+
+    # Step 4: Release attack first, then final direction
+    timeline.release(attack_key)
+    timeline.wait(17)
+    timeline.release(prev_key)
+    return timeline.plan(command, CommandType.HALF_CIRCLE_CHARGE, tokens)
+
+
+def directional_jump_plan(jump_key, direction_key):
+    """Directional jump: press direction, then jump, then release both.
+
+    This creates a rolling overlap for diagonal jumps in fighting games.
+    """
+    timeline = _Timeline()
+    timeline.press(direction_key)
+    timeline.wait(50)  # Small overlap delay
+    timeline.press(jump_key)
+    timeline.wait(150)  # Hold both keys
+    timeline.release(jump_key)
+    timeline.release(direction_key)
+    return timeline.plan(f"{direction_key}+{jump_key}", None, [direction_key, jump_key])
+
+
+_BUILDERS = {
+    CommandType.RAPID_REPEAT: rapid_repeat_plan,
+    CommandType.SEQUENTIAL: sequential_plan,
+    CommandType.SIMULTANEOUS: simultaneous_plan,
+    CommandType.SINGLE: lambda command, tokens: key_press_plan(tokens[0])._replace(
+        command=command, command_type=CommandType.SINGLE),
+    CommandType.CHARGE: charge_plan,
+    CommandType.HALF_CIRCLE_CHARGE: half_circle_charge_plan,
+}
+
+
+def compile_command(command):
+    """Compile a special move command string into a CommandPlan, or None if it is invalid"""
+    cmd_type, tokens = parse_command(command)
+    if cmd_type is None or not tokens:
+        return None
+    return _BUILDERS[cmd_type](command, tokens)
+
+
+def _normalize_key(key):
+    return key.lower().strip() if isinstance(key, str) else ''
+
+
+class PlanCache:
+    """Compiled plans for one configuration, keyed by command string or (key, timing).
+
+    A new cache is built whenever the config changes, which invalidates every
+    plan compiled for the previous config. Invalid commands and keys are logged
+    once, when first compiled, and cached as None.
+    """
+
+    def __init__(self):
+        self._commands = {}
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._commands) + len(self._keys)
+
+    def command(self, command):
+        try:
+            return self._commands[command]
+        except KeyError:
+            plan = compile_command(command)
+            if plan is None:
+                logger.warning("Invalid special command: '%s'", command)
+            self._commands[command] = plan
+            return plan
+
+    def key_press(self, key, duration_ms=100, release=True):
+        cache_key = (key, duration_ms, release)
+        try:
+            return self._keys[cache_key]
+        except KeyError:
+            key_char = _normalize_key(key)
+            if key_char in ALLOWED_KEYS:
+                plan = key_press_plan(key_char, duration_ms, release)
+            else:
+                logger.warning("Key '%s' not in allowed keys, skipping", key_char)
+                plan = None
+            self._keys[cache_key] = plan
+            return plan
+
+    def directional_jump(self, jump_key, direction_key):
+        cache_key = ('jump', jump_key, direction_key)
+        try:
+            return self._keys[cache_key]
+        except KeyError:
+            jump_char = _normalize_key(jump_key)
+            direction_char = _normalize_key(direction_key)
+            if direction_char in ALLOWED_KEYS and jump_char in ALLOWED_KEYS:
+                plan = directional_jump_plan(jump_char, direction_char)
+            else:
+                logger.warning("Invalid keys for directional jump: dir=%s, jump=%s", direction_char, jump_char)
+                plan = None
+            self._keys[cache_key] = plan
+            return plan
+
+    def commands(self):
+        """Compiled special plans by command string (None for invalid commands)"""
+        return dict(self._commands)
+
+    @classmethod
+    def for_config(cls, config):
+        """Precompile every special move command in a dashboard configuration"""
+        cache = cls()
+        if not config:
+            return cache
+        for exchange in ('binance', 'coinbase'):
+            for i in range(1, 10):
+                command = config.get(f"{exchange}Special{i}Command", "")
+                if command:
+                    cache.command(command)
+        return cache
@@ -0,0 +1,93 @@
+"""
+Immutable, fully compiled configuration snapshots for the SF2 bridge.
+
+A ConfigSnapshot bundles the dashboard config with its TriggerIndex and a
+PlanCache that already holds every plan the config can fire (special moves,
+attack/movement presses, jumps, crouches). Snapshots are compiled on the
+refresher thread and published by replacing a single attribute, so a feed
+handler that reads bridge.snapshot once per trade always sees one consistent
+config, never a mix of old ranges and new keys.
+
+The last good snapshot is also saved to disk, already compiled, so the bridge
+can start trading immediately from it while the dashboard is slow or down.
+"""
+
+import logging
+import os
+import pickle
+import time
+from collections import namedtuple
+
+from triggers import TriggerIndex
+from command_plans import (PlanCache, ATTACK_PRESS_MS, MOVEMENT_PRESS_MS, JUMP_PRESS_MS,
+                           CROUCH_HOLD_MS)
+
+logger = logging.getLogger(__name__)
+
+# etag: the dashboard's ETag for this config (None if unknown)
+ConfigSnapshot = namedtuple('ConfigSnapshot', ['config', 'trigger_index', 'plans', 'etag'])
+
+EMPTY_SNAPSHOT = ConfigSnapshot(None, TriggerIndex(None), PlanCache(), None)
+
+# Bump when TriggerIndex / PlanCache internals change; older files are recompiled from their config
+SNAPSHOT_FORMAT = 1
+
+
+def compile_snapshot(config, etag=None):
+    """Compile a dashboard config into a ConfigSnapshot with every plan precompiled"""
+    trigger_index = TriggerIndex(config)
+    plans = PlanCache.for_config(config)
+    for kind, value in trigger_index.controls():
+        if kind == 'attack':
+            plans.key_press(value[1], ATTACK_PRESS_MS)
+        elif kind == 'movement':
+            plans.key_press(value[1], MOVEMENT_PRESS_MS)
+        elif kind == 'jump_crouch':
+            if value.action == 'Jump':
+                plans.key_press(value.key, JUMP_PRESS_MS)
+                for direction_key in (value.left_key, value.right_key):
+                    if direction_key and direction_key.strip():
+                        plans.directional_jump(value.key, direction_key)
+            else:
+                plans.key_press(value.key, CROUCH_HOLD_MS, release=False)
+    return ConfigSnapshot(config, trigger_index, plans, etag)
+
+
+def changed_fields(old, new):
+    """Names of the config fields that differ between two configs"""
+    old = old or {}
+    new = new or {}
+    return sorted(k for k in old.keys() | new.keys() if old.get(k) != new.get(k))
+
+
+def save_snapshot(path, snapshot):
+    """Write a compiled snapshot to disk atomically (temp file + rename)"""
+    record = {'format': SNAPSHOT_FORMAT, 'saved_at': time.time(), 'snapshot': snapshot}
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.error(f"Could not save config snapshot to {path}: {e}")
+
+
+def load_snapshot(path):
+    """Read a snapshot saved by save_snapshot: (snapshot, saved_at), or (None, None) if unusable.
+
+    The file is only ever written by this bridge; it must not come from an
+    untrusted source, as it is a pickle.
+    """
+    if not path or not os.path.exists(path):
+        return None, None
+    try:
+        with open(path, 'rb') as f:
+            record = pickle.load(f)
+        snapshot = record['snapshot']
+        if record.get('format') != SNAPSHOT_FORMAT:
+            logger.info(f"Config snapshot {path} is from another bridge version, recompiling")
+            snapshot = compile_snapshot(snapshot.config, snapshot.etag)
+        return snapshot, record.get('saved_at')
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable config snapshot {path}: {e}")
+        return None, None
@@ -0,0 +1,175 @@
+"""
+Exchange frame decoders for the SF2 bridge.
+
+Each decoder turns a raw websocket frame into a Trade (quantity, side, time, id) or None
+when the frame is not a trade. Three implementations, fastest first:
+
+- msgspec: typed Structs that only decode the fields the bridge reads
+- orjson: fast full decode
+- json: stdlib fallback, always available
+
+Coinbase sends subscriptions, heartbeats and last_match frames on the same
+socket as matches; those are rejected with a substring check on the raw frame
+before any JSON decoding happens.
+"""
+
+import json
+import logging
+from collections import namedtuple
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DECODERS = ('auto', 'msgspec', 'orjson', 'json')
+
+# side: 'buy' or 'sell' (taker side: Binance buyer-is-maker means a sell)
+# time: exchange trade time as sent, epoch ms (Binance T) or ISO-8601 (Coinbase time)
+# id: consecutive trade id per symbol (Binance a, Coinbase trade_id), see feed_sequence.py
+Trade = namedtuple('Trade', ['quantity', 'side', 'time', 'id'], defaults=(None, None))
+
+
+# 'YYYY-MM-DDTHH:MM:SS' -> epoch seconds; trades arrive in time order so this stays tiny
+_ISO_SECONDS = {}
+
+
+def trade_time_ns(value):
+    """Exchange trade time as epoch ns: Binance sends epoch ms, Coinbase an ISO-8601 string.
+
+    Coinbase's UTC "...T12:00:00.123456Z" times reuse the epoch seconds of
+    earlier trades in the same second; datetime.timestamp() is the slow part.
+    """
+    if not value:
+        return None
+    if not isinstance(value, str):
+        return value * 1_000_000
+    try:
+        stamp = datetime.fromisoformat(value)
+    except ValueError:
+        # Python < 3.11 does not accept the trailing Z
+        stamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value[-1:] != 'Z':
+        return int(stamp.timestamp() * 1e9)
+    head = value[:19]
+    seconds = _ISO_SECONDS.get(head)
+    if seconds is None:
+        if len(_ISO_SECONDS) > 4096:
+            _ISO_SECONDS.clear()
+        seconds = int(stamp.replace(microsecond=0, tzinfo=timezone.utc).timestamp())
+        _ISO_SECONDS[head] = seconds
+    return seconds * 1_000_000_000 + stamp.microsecond * 1000
+
+
+def is_coinbase_match(message):
+    """Cheap pre-check on the raw frame: can this be a Coinbase "match"?
+
+    '"match"' appears in '"type":"match"' (with or without spaces) but not in
+    '"type":"last_match"', subscriptions or heartbeats.
+    """
+    if isinstance(message, (bytes, bytearray, memoryview)):
+        return b'"match"' in message
+    return '"match"' in message
+
+
+# The stdlib decoder's scanner, without json.loads' argument checks and whitespace matching
+_scan_once = json.JSONDecoder().scan_once
+
+
+def _loads(message):
+    """json.loads for a frame holding one compact JSON value, the way both exchanges send them.
+
+    Anything else (bytes, surrounding whitespace, trailing data) goes through json.loads.
+    """
+    try:
+        data, end = _scan_once(message, 0)
+    except (StopIteration, TypeError):
+        return json.loads(message)
+    if end != len(message):
+        return json.loads(message)
+    return data
+
+
+class JsonDecoder:
+    """Stdlib json decoder"""
+    name = 'json'
+
+    def __init__(self):
+        self._loads = _loads
+
+    def binance(self, message):
+        data = self._loads(message)
+        return Trade(float(data.get('q', 0)), 'sell' if data.get('m', False) else 'buy', data.get('T'),
+                     data.get('a'))
+
+    def coinbase(self, message):
+        if not is_coinbase_match(message):
+            return None
+        data = self._loads(message)
+        if data.get('type') != 'match':
+            return None
+        return Trade(float(data.get('size', 0)), data.get('side', ''), data.get('time'), data.get('trade_id'))
+
+
+class OrjsonDecoder(JsonDecoder):
+    """orjson decoder (same handling as JsonDecoder, faster parsing)"""
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._loads = orjson.loads
+
+
+class MsgspecDecoder:
+    """msgspec decoder with typed Structs; unused fields are skipped, not materialized"""
+    name = 'msgspec'
+
+    def __init__(self):
+        import msgspec
+
+        class BinanceAggTrade(msgspec.Struct):
+            q: str = '0'
+            m: bool = False
+            T: int = 0
+            a: int = 0
+
+        class CoinbaseMatch(msgspec.Struct):
+            type: str = ''
+            size: str = '0'
+            side: str = ''
+            time: str = ''
+            trade_id: int = 0
+
+        self._binance = msgspec.json.Decoder(BinanceAggTrade).decode
+        self._coinbase = msgspec.json.Decoder(CoinbaseMatch).decode
+
+    def binance(self, message):
+        data = self._binance(message)
+        return Trade(float(data.q), 'sell' if data.m else 'buy', data.T, data.a)
+
+    def coinbase(self, message):
+        if not is_coinbase_match(message):
+            return None
+        data = self._coinbase(message)
+        if data.type != 'match':
+            return None
+        return Trade(float(data.size), data.side, data.time, data.trade_id)
+
+
+_IMPLEMENTATIONS = {
+    'msgspec': MsgspecDecoder,
+    'orjson': OrjsonDecoder,
+    'json': JsonDecoder,
+}
+
+
+def create_decoder(name='auto'):
+    """Create a decoder by name; 'auto' picks the fastest installed one"""
+    if name != 'auto':
+        if name not in _IMPLEMENTATIONS:
+            raise ValueError(f"Unknown decoder '{name}', expected one of {DECODERS}")
+        return _IMPLEMENTATIONS[name]()
+    for candidate in ('msgspec', 'orjson'):
+        try:
+            return _IMPLEMENTATIONS[candidate]()
+        except ImportError:
+            continue
+    return JsonDecoder()
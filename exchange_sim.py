@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Binance and Coinbase trade feeds, for offline load and soak tests.
+
+One websocket server speaks both feed protocols:
+
+- ws://HOST:PORT/ws/<symbol>@aggTrade streams Binance aggregate trades
+- any other websocket path streams Coinbase matches after the subscribe
+  message (answered with a subscriptions message, like ws-feed)
+- GET /api/v3/aggTrades and GET /products/<product>/trades serve the recent
+  trades for --resync catch-up
+
+Each exchange has one trade stream, broadcast to every connected client, with
+trade ids that keep counting while nobody is connected, so a reconnecting
+bridge sees a real gap it can catch up on. Trades arrive as a Poisson process
+with log-normal sizes. Scripted bursts (liquidation cascades) raise the rate
+and scale the sizes for a while, optionally on one side only, and --cycle
+repeats the script for multi-hour soak runs. Trade times are the send time.
+
+    python exchange_sim.py --rate 2000 --burst 60:5:20000:10:sell --cycle 300
+    python bridge.py --binance-ws-url ws://127.0.0.1:8765/ws --coinbase-ws-url ws://127.0.0.1:8765/ \\
+        --binance-rest-url http://127.0.0.1:8765 --coinbase-rest-url http://127.0.0.1:8765
+
+Needs the websockets package (pip install websockets).
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timezone
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# A scripted stretch of heavier trading: seconds into the cycle, length, total msgs/s,
+# size multiplier and the side every trade takes (None = both)
+Burst = namedtuple('Burst', ['start', 'duration', 'rate', 'size_scale', 'side'], defaults=(1.0, None))
+
+# One generated trade, kept for the REST endpoints
+SimTrade = namedtuple('SimTrade', ['id', 'quantity', 'side', 'price', 'time_ms'])
+
+
+def parse_burst(spec):
+    """Burst from 'START:SECONDS:RATE[:SCALE[:SIDE]]' (--burst)"""
+    parts = spec.split(':')
+    if not 3 <= len(parts) <= 5 or (len(parts) == 5 and parts[4] not in ('buy', 'sell')):
+        raise ValueError(f"Invalid burst '{spec}', expected START:SECONDS:RATE[:SCALE[:buy|sell]]")
+    return Burst(float(parts[0]), float(parts[1]), float(parts[2]),
+                 float(parts[3]) if len(parts) > 3 else 1.0, parts[4] if len(parts) > 4 else None)
+
+
+def binance_frame(symbol, trade_id, quantity, side, price, time_ms):
+    """Binance aggTrade frame; m (buyer is maker) marks a sell"""
+    return (f'{{"e":"aggTrade","E":{time_ms},"s":"{symbol.upper()}","a":{trade_id},"p":"{price:.2f}",'
+            f'"q":"{quantity:.8f}","f":{trade_id},"l":{trade_id},"T":{time_ms},'
+            f'"m":{"true" if side == "sell" else "false"},"M":true}}')
+
+
+def coinbase_time(time_ms):
+    return datetime.fromtimestamp(time_ms / 1000, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def coinbase_frame(product, trade_id, quantity, side, price, time_ms):
+    """Coinbase match frame"""
+    return (f'{{"type":"match","trade_id":{trade_id},"maker_order_id":"m-{trade_id}",'
+            f'"taker_order_id":"t-{trade_id}","side":"{side}","size":"{quantity:.8f}","price":"{price:.2f}",'
+            f'"product_id":"{product}","sequence":{trade_id * 3},"time":"{coinbase_time(time_ms)}"}}')
+
+
+class TradeStream:
+    """One exchange's generated trades: Poisson arrivals at the current rate, log-normal sizes"""
+
+    def __init__(self, rate, size_mu=-7.0, size_sigma=2.0, max_size=50.0, bursts=(), cycle=0,
+                 history=100000, rng=None):
+        self.rate = rate
+        self.size_mu = size_mu
+        self.size_sigma = size_sigma
+        self.max_size = max_size
+        self.bursts = tuple(bursts)
+        self.cycle = cycle
+        self.rng = rng or random.Random()
+        self.next_id = 1
+        # Seconds since the start when the next trade arrives
+        self.next_at = 0.0
+        self.price = 65000.0
+        self.history = deque(maxlen=history)
+
+    def conditions(self, offset):
+        """(msgs/s, size multiplier, forced side) at seconds since the start"""
+        at = offset % self.cycle if self.cycle else offset
+        for burst in self.bursts:
+            if burst.start <= at < burst.start + burst.duration:
+                return burst.rate, burst.size_scale, burst.side
+        return self.rate, 1.0, None
+
+    def due(self, offset, time_ms):
+        """Trades arriving up to `offset` seconds since the start, stamped time_ms"""
+        rng = self.rng
+        trades = []
+        while self.next_at <= offset:
+            rate, scale, side = self.conditions(self.next_at)
+            quantity = min(rng.lognormvariate(self.size_mu, self.size_sigma) * scale, self.max_size)
+            self.price = max(1.0, self.price * (1 + rng.gauss(0, 1e-5)))
+            trade = SimTrade(self.next_id, quantity, side or ('buy' if rng.random() < 0.5 else 'sell'),
+                             self.price, time_ms)
+            trades.append(trade)
+            self.history.append(trade)
+            self.next_id += 1
+            # No base rate: look again shortly for the next burst
+            self.next_at += rng.expovariate(rate) if rate > 0 else 0.01
+        return trades
+
+    def since(self, first_id, limit):
+        """Up to `limit` retained trades from first_id on, oldest first"""
+        if not self.history:
+            return []
+        start = max(0, first_id - self.history[0].id)
+        return [self.history[i] for i in range(start, min(start + limit, len(self.history)))]
+
+    def before(self, trade_id, limit):
+        """Up to `limit` retained trades before trade_id, newest first"""
+        if not self.history:
+            return []
+        end = min(len(self.history), trade_id - self.history[0].id)
+        return [self.history[i] for i in range(end - 1, max(end - 1 - limit, -1), -1)]
+
+
+class ExchangeSimulator:
+    """Websocket and REST server streaming the generated Binance and Coinbase trades"""
+
+    def __init__(self, rate=1000, size_mu=-7.0, size_sigma=2.0, max_size=50.0, bursts=(), cycle=0,
+                 history=100000, seed=None, symbol='btcusdt', product='BTC-USD', stats_interval=30):
+        self.symbol = symbol
+        self.product = product
+        self.stats_interval = stats_interval
+        # --rate and burst rates are totals, split evenly between the two exchanges
+        halved = [burst._replace(rate=burst.rate / 2) for burst in bursts]
+        self.streams = {
+            exchange: TradeStream(rate / 2, size_mu, size_sigma, max_size, halved, cycle, history,
+                                  random.Random(None if seed is None else f"{seed}-{exchange}"))
+            for exchange in ('binance', 'coinbase')
+        }
+        self.clients = {exchange: set() for exchange in self.streams}
+        self.generated = dict.fromkeys(self.streams, 0)
+        self.sent = dict.fromkeys(self.streams, 0)
+
+    def frame(self, exchange, trade):
+        if exchange == 'binance':
+            return binance_frame(self.symbol, trade.id, trade.quantity, trade.side, trade.price, trade.time_ms)
+        return coinbase_frame(self.product, trade.id, trade.quantity, trade.side, trade.price, trade.time_ms)
+
+    async def handler(self, ws):
+        from websockets.exceptions import ConnectionClosed
+
+        try:
+            if ws.request.path.endswith('@aggTrade'):
+                exchange = 'binance'
+            else:
+                exchange = 'coinbase'
+                subscribe = json.loads(await ws.recv())
+                await ws.send(json.dumps({'type': 'subscriptions', 'channels': [
+                    {'name': channel, 'product_ids': subscribe.get('product_ids', [self.product])}
+                    for channel in subscribe.get('channels', ['matches'])]}))
+            self.clients[exchange].add(ws)
+            logger.info(f"{exchange} client connected from {ws.remote_address[0]}")
+            try:
+                await ws.wait_closed()
+            finally:
+                self.clients[exchange].discard(ws)
+                logger.info(f"{exchange} client disconnected")
+        except (ConnectionClosed, ValueError):
+            pass
+
+    def process_request(self, connection, request):
+        """Answer the REST trade endpoints; None lets websocket handshakes through"""
+        url = urlsplit(request.path)
+        if url.path == '/api/v3/aggTrades':
+            query = parse_qs(url.query)
+            trades = self.streams['binance'].since(int(query.get('fromId', ['1'])[0]),
+                                                   int(query.get('limit', ['500'])[0]))
+            page = [{'a': t.id, 'p': f"{t.price:.2f}", 'q': f"{t.quantity:.8f}", 'f': t.id, 'l': t.id,
+                     'T': t.time_ms, 'm': t.side == 'sell', 'M': True} for t in trades]
+        elif url.path.startswith('/products/') and url.path.endswith('/trades'):
+            query = parse_qs(url.query)
+            stream = self.streams['coinbase']
+            trades = stream.before(int(query.get('after', [str(stream.next_id)])[0]),
+                                   int(query.get('limit', ['100'])[0]))
+            page = [{'time': coinbase_time(t.time_ms), 'trade_id': t.id, 'price': f"{t.price:.2f}",
+                     'size': f"{t.quantity:.8f}", 'side': t.side} for t in trades]
+        else:
+            return None
+        response = connection.respond(HTTPStatus.OK, json.dumps(page))
+        response.headers['Content-Type'] = 'application/json'
+        return response
+
+    async def produce(self, exchange, start):
+        from websockets.exceptions import ConnectionClosed
+
+        loop = asyncio.get_running_loop()
+        stream = self.streams[exchange]
+        clients = self.clients[exchange]
+        while True:
+            offset = loop.time() - start
+            trades = stream.due(offset, int(time.time() * 1000))
+            self.generated[exchange] += len(trades)
+            if trades and clients:
+                frames = [self.frame(exchange, trade) for trade in trades]
+                for ws in list(clients):
+                    try:
+                        for frame in frames:
+                            await ws.send(frame)
+                        self.sent[exchange] += len(frames)
+                    except ConnectionClosed:
+                        clients.discard(ws)
+            # Batches of due trades at most every millisecond; sleeping per trade cannot keep up with 10k+/s
+            await asyncio.sleep(max(0.001, stream.next_at - (loop.time() - start)))
+
+    async def log_stats(self):
+        last = dict(self.sent)
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            for exchange, stream in self.streams.items():
+                rate = (self.sent[exchange] - last[exchange]) / self.stats_interval
+                logger.info(f"{exchange}: {rate:.0f} trades/s sent to {len(self.clients[exchange])} client(s), "
+                            f"{self.generated[exchange]} generated, last id {stream.next_id - 1}")
+            last = dict(self.sent)
+
+    async def serve(self, host='127.0.0.1', port=8765, ready=None):
+        from websockets.asyncio.server import serve
+
+        # Bursts of small frames: no per-frame compression, and a deep write buffer
+        async with serve(self.handler, host, port, process_request=self.process_request,
+                         compression=None, write_limit=1 << 20):
+            start = asyncio.get_running_loop().time()
+            tasks = [asyncio.create_task(self.produce(exchange, start)) for exchange in self.streams]
+            if self.stats_interval:
+                tasks.append(asyncio.create_task(self.log_stats()))
+            logger.info(f"Exchange simulator on ws://{host}:{port}/ws (Binance) and ws://{host}:{port}/ (Coinbase)")
+            if ready is not None:
+                ready.set()
+            await asyncio.gather(*tasks)
+
+    def run(self, host='127.0.0.1', port=8765, ready=None):
+        try:
+            asyncio.run(self.serve(host, port, ready))
+        except KeyboardInterrupt:
+            pass
+
+
+def parse_args(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Local Binance/Coinbase trade feed simulator")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate', type=float, default=1000,
+                        help="trades per second across both exchanges (Poisson arrivals)")
+    parser.add_argument('--size-mu', type=float, default=-7.0, help="mean of log(trade size)")
+    parser.add_argument('--size-sigma', type=float, default=2.0, help="standard deviation of log(trade size)")
+    parser.add_argument('--max-size', type=float, default=50.0, help="largest trade size")
+    parser.add_argument('--burst', action='append', type=parse_burst, default=[],
+                        metavar='START:SECONDS:RATE[:SCALE[:SIDE]]',
+                        help="scripted burst, e.g. 60:5:20000:10:sell for a 5 s sell-side liquidation "
+                             "cascade at 20000 trades/s with 10x sizes (repeatable)")
+    parser.add_argument('--cycle', type=float, default=0, metavar='SECONDS',
+                        help="repeat the burst script this often (0 = run it once)")
+    parser.add_argument('--history', type=int, default=100000,
+                        help="trades per exchange kept for the REST endpoints")
+    parser.add_argument('--symbol', default='btcusdt')
+    parser.add_argument('--product', default='BTC-USD')
+    parser.add_argument('--seed', type=int, help="random seed for repeatable streams")
+    parser.add_argument('--stats-interval', type=float, default=30,
+                        help="seconds between send rate lines in the log (0 disables)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    ExchangeSimulator(args.rate, args.size_mu, args.size_sigma, args.max_size, args.burst, args.cycle,
+                      args.history, args.seed, args.symbol, args.product, args.stats_interval
+                      ).run(args.host, args.port)
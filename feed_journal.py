@@ -0,0 +1,140 @@
+"""
+Record and replay of raw exchange feed frames for the SF2 bridge.
+
+FeedRecorder appends every raw Binance/Coinbase websocket frame with its
+receive timestamp to a gzip-compressed journal. FeedReplayer feeds a journal
+back through the bridge's on_binance_message / on_coinbase_message handlers at
+1x, Nx or as fast as possible, while a VirtualClock stands in for wall time so
+special cooldowns and jump/crouch delays behave exactly as they did live.
+
+Journal record layout (little-endian, inside the gzip stream):
+    exchange u8 | receive time ns (epoch) i64 | frame length u32 | frame bytes
+"""
+
+import gzip
+import logging
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE_CODES = {'binance': 0, 'coinbase': 1}
+EXCHANGE_NAMES = {code: name for name, code in EXCHANGE_CODES.items()}
+
+_HEADER = struct.Struct('<BqI')
+
+
+class FeedRecorder:
+    """Appends raw feed frames to a compressed journal; safe to call from both feed threads"""
+
+    def __init__(self, path, compresslevel=6):
+        self.path = path
+        self._file = gzip.open(path, 'ab', compresslevel=compresslevel)
+        self._lock = threading.Lock()
+        self.frames = 0
+
+    def record(self, exchange, message, received_ns=None):
+        if received_ns is None:
+            received_ns = time.time_ns()
+        payload = message.encode('utf-8') if isinstance(message, str) else message
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(_HEADER.pack(EXCHANGE_CODES[exchange], received_ns, len(payload)))
+            self._file.write(payload)
+            self.frames += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_journal(path):
+    """Yield (exchange, received_ns, message) for every frame in a journal"""
+    with gzip.open(path, 'rb') as f:
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            code, received_ns, length = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                logger.warning(f"Journal {path} ends with a truncated frame")
+                return
+            yield EXCHANGE_NAMES[code], received_ns, payload.decode('utf-8')
+
+
+class VirtualClock:
+    """Stand-in for time.time() during replay, set to each frame's receive time"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def set(self, seconds):
+        self.now = seconds
+
+    def __call__(self):
+        return self.now
+
+
+class FeedReplayer:
+    """Feeds a recorded journal back through a bridge's message handlers.
+
+    speed=1 replays in real time, speed=N N times faster, speed=0 as fast as
+    possible. The bridge's clock is replaced with a VirtualClock for the
+    duration of the replay and its random jump choice is seeded, so the same
+    journal always produces the same trigger decisions.
+    """
+
+    def __init__(self, bridge, path, speed=1.0, seed=0):
+        self.bridge = bridge
+        self.path = path
+        self.speed = speed
+        self.seed = seed
+        self.clock = VirtualClock()
+        self.frames = 0
+
+    def run(self):
+        handlers = {
+            'binance': self.bridge.on_binance_message,
+            'coinbase': self.bridge.on_coinbase_message,
+        }
+        previous_clock = self.bridge.clock
+        self.bridge.clock = self.clock
+        self.bridge.rng.seed(self.seed)
+        # Shadow configs mark their trade buffers once per virtual second, as housekeeping does live
+        shadows = self.bridge.shadows
+        next_tick = None
+        first_ns = None
+        wall_start = time.perf_counter()
+        try:
+            for exchange, received_ns, message in read_journal(self.path):
+                if first_ns is None:
+                    first_ns = received_ns
+                if self.speed > 0:
+                    due = wall_start + (received_ns - first_ns) / 1e9 / self.speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.clock.set(received_ns / 1e9)
+                handlers[exchange](None, message)
+                self.frames += 1
+                if shadows and (next_tick is None or self.clock.now >= next_tick):
+                    self.evaluate_shadows(shadows)
+                    next_tick = self.clock.now + 1.0
+            if shadows:
+                self.evaluate_shadows(shadows, force=True)
+        finally:
+            self.bridge.clock = previous_clock
+        elapsed = time.perf_counter() - wall_start
+        logger.info(f"Replayed {self.frames} frames from {self.path} in {elapsed:.2f}s")
+        return self.frames
+
+    def evaluate_shadows(self, shadows, force=False):
+        try:
+            shadows.evaluate(self.clock.now, force)
+        except Exception as e:
+            logger.error(f"Shadow evaluation error: {e}")
@@ -0,0 +1,135 @@
+"""
+Trade id continuity for the SF2 bridge's exchange feeds.
+
+Binance numbers aggregate trades (a) and Coinbase numbers matches (trade_id)
+consecutively per symbol, so a jump in the id means trades were missed (most
+often across a reconnect) and a repeated id means a trade was delivered twice.
+Coinbase's sequence field is not used for this: it counts every order book
+message of the product, so it always skips on the matches channel.
+
+SequenceTracker drops duplicates and counts gaps. What happens to the missed
+trades is the resync policy:
+
+- skip: carry on from the live feed; the missed trades are only counted
+- catch-up: fetch the missed trades from the exchange's public REST trades
+  endpoint (TradeCatchup) and play them, unless the gap is larger than the
+  catch-up limit, in which case the bridge skips to live anyway
+"""
+
+import logging
+
+from decoders import Trade
+
+logger = logging.getLogger(__name__)
+
+RESYNC_POLICIES = ('skip', 'catch-up')
+
+BINANCE_REST_URL = "https://data-api.binance.vision"
+COINBASE_REST_URL = "https://api.exchange.coinbase.com"
+
+# SequenceTracker.check() result for a trade id already seen
+DUPLICATE = -1
+
+# Largest page either REST endpoint returns
+PAGE_LIMIT = 1000
+
+
+class SequenceTracker:
+    """Last trade id seen on one feed, with duplicate and gap counts"""
+
+    def __init__(self):
+        self.last_id = None
+        self.duplicates = 0
+        self.gaps = 0
+        self.missed = 0
+
+    def check(self, trade_id):
+        """0 for the next trade in sequence, DUPLICATE for an id already seen,
+        otherwise the number of trades missed right before this one.
+
+        The first trade after startup only sets the starting point.
+        """
+        last_id = self.last_id
+        if last_id is None or trade_id == last_id + 1:
+            self.last_id = trade_id
+            return 0
+        if trade_id <= last_id:
+            self.duplicates += 1
+            return DUPLICATE
+        self.last_id = trade_id
+        missed = trade_id - last_id - 1
+        self.gaps += 1
+        self.missed += missed
+        return missed
+
+
+class TradeCatchup:
+    """Fetches missed trades from the exchanges' public REST trade endpoints.
+
+    The base URLs can point at a local stand-in for tests and benchmarks.
+    """
+
+    def __init__(self, binance_url=BINANCE_REST_URL, coinbase_url=COINBASE_REST_URL, timeout=5):
+        self.binance_url = binance_url.rstrip('/')
+        self.coinbase_url = coinbase_url.rstrip('/')
+        self.timeout = timeout
+        # Pooled HTTP connection, created on first fetch
+        self.session = None
+
+    def _get(self, url, params):
+        if self.session is None:
+            import requests
+            self.session = requests.Session()
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def binance(self, symbol, first_id, last_id):
+        """Binance aggregate trades first_id..last_id of a symbol, oldest first"""
+        trades = []
+        from_id = first_id
+        while from_id <= last_id:
+            page = self._get(f"{self.binance_url}/api/v3/aggTrades", {
+                'symbol': symbol.upper(), 'fromId': from_id, 'limit': min(PAGE_LIMIT, last_id - from_id + 1),
+            })
+            if not page:
+                break
+            for item in page:
+                if item['a'] > last_id:
+                    break
+                if item['a'] < from_id:
+                    continue
+                trades.append(Trade(float(item['q']), 'sell' if item['m'] else 'buy', item['T'], item['a']))
+            if page[-1]['a'] < from_id:
+                # The same page again would never end: a misbehaving endpoint or mirror
+                logger.warning(f"Binance trade catch-up stopped at id {from_id}: the page did not move past it")
+                break
+            from_id = page[-1]['a'] + 1
+        return trades
+
+    def coinbase(self, product, first_id, last_id):
+        """Coinbase matches first_id..last_id of a product, oldest first.
+
+        Coinbase pages backwards: after=N returns the trades before trade N, newest first.
+        """
+        trades = []
+        cursor = last_id + 1
+        while cursor > first_id:
+            page = self._get(f"{self.coinbase_url}/products/{product}/trades", {
+                'after': cursor, 'limit': min(PAGE_LIMIT, cursor - first_id),
+            })
+            if not page:
+                break
+            for item in page:
+                if item['trade_id'] < first_id:
+                    break
+                if item['trade_id'] >= cursor:
+                    continue
+                trades.append(Trade(float(item['size']), item['side'], item['time'], item['trade_id']))
+            if page[-1]['trade_id'] >= cursor:
+                # The same page again would never end: a misbehaving endpoint or mirror
+                logger.warning(f"Coinbase trade catch-up stopped at id {cursor}: the page did not move before it")
+                break
+            cursor = page[-1]['trade_id']
+        trades.reverse()
+        return trades
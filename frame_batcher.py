@@ -0,0 +1,177 @@
+"""
+Frame-window micro-batching for the SF2 bridge.
+
+The game samples input once per frame (16.7 ms at 60 fps), so at high trade
+rates deciding on every trade mostly queues key presses that land in the same
+frame or get dropped by the overflow policy. With --batch the feed handlers
+only append trades to a per-player buffer. Once per frame the FrameBatcher
+thread classifies the whole window at once, with one NumPy searchsorted per
+(exchange, side) against the compiled range boundaries, and plays a single
+decision per player:
+
+- strongest: the largest trade that triggers anything
+- volume: the trigger region that traded the most volume in the window (ties
+  go to the stronger region), played with the largest trade in it
+
+Needs NumPy (pip install numpy).
+"""
+
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+
+from triggers import EMPTY_MATCH
+
+logger = logging.getLogger(__name__)
+
+BATCH_RULES = ('strongest', 'volume')
+
+# One frame's decision for a player: the match to play and the trade that stands for the window
+Decision = namedtuple('Decision', ['match', 'quantity', 'signal_type', 'received_ns', 'expires_ns'])
+
+
+class FrameBatcher:
+    """Buffers trades per player and plays one aggregated decision per player per frame"""
+
+    def __init__(self, bridge, fps=60.0, rule='strongest'):
+        import numpy
+        if rule not in BATCH_RULES:
+            raise ValueError(f"Unknown batch rule '{rule}', expected one of {BATCH_RULES}")
+        self.np = numpy
+        self.bridge = bridge
+        self.rule = rule
+        # Without frame alignment (--fps 0) windows are still one 60 fps frame long
+        self.period = 1.0 / (fps or 60.0)
+        # (quantity, signal_type, received_ns, expires_ns); appended by feed threads, drained by flush()
+        self.pending = {exchange: deque() for exchange in bridge.executors}
+        self.trades = dict.fromkeys(self.pending, 0)
+        self.decisions = dict.fromkeys(self.pending, 0)
+        self.windows = 0
+        # NumPy boundaries and region matches per SideIndex, rebuilt when the trigger index is swapped
+        self._index = None
+        self._sides = {}
+        self._stop = threading.Event()
+        self.thread = None
+
+    def add(self, quantity, exchange, signal_type, received_ns=None, expires_ns=None):
+        """Buffer a trade for the current frame window (same arguments as bridge.handle_trade)"""
+        self.pending[exchange].append((quantity, signal_type, received_ns, expires_ns))
+
+    def _side(self, index, exchange, signal_type):
+        """(bounds array, region matches, triggering-regions mask) of a SideIndex, or None"""
+        if index is not self._index:
+            self._index = index
+            self._sides = {}
+        key = (exchange, signal_type)
+        compiled = self._sides.get(key)
+        if compiled is None:
+            side = index.side(exchange, signal_type)
+            if side is None:
+                return None
+            np = self.np
+            regions = side.regions()
+            active = np.array([match.attack is not None or match.special is not None
+                               or bool(match.movements) or bool(match.jump_crouch) for match in regions])
+            compiled = self._sides[key] = (np.array(side.bounds, dtype=float), regions, active)
+        return compiled
+
+    def decide(self, exchange, window, index):
+        """The one Decision for a player's window of buffered trades, or None if nothing triggers"""
+        if len(window) == 1:
+            # Both rules pick the only trade; a bisect beats NumPy's per-call overhead
+            quantity, signal_type, received_ns, expires_ns = window[0]
+            match = index.lookup(exchange, signal_type, quantity)
+            if match is None or match is EMPTY_MATCH:
+                return None
+            return Decision(match, quantity, signal_type, received_ns, expires_ns)
+        np = self.np
+        best = None
+        best_score = 0.0
+        for signal_type in ('buy', 'sell'):
+            trades = [trade for trade in window if trade[1] == signal_type]
+            if not trades:
+                continue
+            compiled = self._side(index, exchange, signal_type)
+            if compiled is None:
+                continue
+            bounds, regions, active = compiled
+            quantities = np.array([trade[0] for trade in trades], dtype=float)
+            positions = np.searchsorted(bounds, quantities, side='left')
+            if len(bounds):
+                at_bound = bounds[np.minimum(positions, len(bounds) - 1)] == quantities
+                region_ids = 2 * positions + at_bound
+            else:
+                region_ids = 2 * positions
+            triggering = active[region_ids]
+            if not triggering.any():
+                continue
+            if self.rule == 'strongest':
+                i = int(np.argmax(np.where(triggering, quantities, -1.0)))
+                score = quantities[i]
+            else:
+                volume = np.bincount(region_ids, weights=quantities, minlength=len(regions))
+                # Only triggering regions with a trade in the window: with zero-size trades every volume is 0
+                present = np.bincount(region_ids, minlength=len(regions)).astype(bool)
+                volume = np.where(present & active, volume, -1.0)
+                # Last maximum: ties go to the stronger region
+                region = len(volume) - 1 - int(np.argmax(volume[::-1]))
+                score = volume[region]
+                i = int(np.argmax(np.where(region_ids == region, quantities, -1.0)))
+            if best is None or score > best_score:
+                quantity, _, received_ns, expires_ns = trades[i]
+                best = Decision(regions[region_ids[i]], quantity, signal_type, received_ns, expires_ns)
+                best_score = score
+        return best
+
+    def flush(self):
+        """Decide and play the buffered window of every player"""
+        snapshot = self.bridge.snapshot
+        self.windows += 1
+        for exchange, pending in self.pending.items():
+            count = len(pending)
+            if not count:
+                continue
+            # popleft() of a known count is safe against feed threads appending meanwhile
+            window = [pending.popleft() for _ in range(count)]
+            self.trades[exchange] += count
+            if not snapshot.trigger_index.active:
+                continue
+            decision = self.decide(exchange, window, snapshot.trigger_index)
+            if decision is None:
+                continue
+            self.decisions[exchange] += 1
+            self.bridge.play_match(decision.match, snapshot.plans, decision.quantity, exchange,
+                                   decision.signal_type, decision.received_ns, decision.expires_ns)
+
+    def run(self):
+        period = self.period
+        next_window = time.perf_counter() + period
+        while not self._stop.wait(max(0.0, next_window - time.perf_counter())):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Frame batcher error: {e}")
+            next_window += period
+            now = time.perf_counter()
+            if next_window < now:
+                # Fell behind (e.g. suspended); skip the missed windows instead of bursting
+                next_window = now + period
+        self.flush()
+
+    def start(self):
+        self._stop.clear()
+        self.thread = threading.Thread(target=self.run, name='frame-batcher', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def summary(self, exchange):
+        trades = self.trades[exchange]
+        decisions = self.decisions[exchange]
+        return (f"{trades} trades -> {decisions} decisions over {self.windows} frame windows "
+                f"({self.rule}, {trades / decisions if decisions else 0:.1f} trades/decision)")
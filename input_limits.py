@@ -0,0 +1,117 @@
+"""
+Per-player input rate limits for the SF2 bridge.
+
+The special move cooldown is the only other throttle, and it is keyed by
+special name, so a busy exchange can queue attacks, movements and jumps for a
+player without limit: more OS key events than the game can read, and a full
+emulator input buffer. InputLimiter puts a token bucket in front of the
+queues for each player and action class (special, attack, movement,
+jump_crouch), plus optionally one for the player's total:
+
+- a bucket refills at its sustained rate up to its burst size
+- every queued action costs one token per button press in its plan (a
+  single attack is 1, a hadouken 4, a rapid repeat "xxxxx" 5), the game's own
+  unit of input
+- an action whose class or total bucket is short is rejected before it is
+  queued, and counted; a plan costing more than the burst size passes when
+  the bucket is full and leaves it in debt
+
+Limits are given as --input-rate CLASS=RATE[:BURST] in presses per second.
+"""
+
+import threading
+
+from actions import PRIORITY_CLASS, PRIORITY_CLASSES
+from command_plans import PRESS
+
+# Bucket shared by all of a player's classes
+TOTAL = 'total'
+
+LIMIT_CLASSES = PRIORITY_CLASSES + (TOTAL,)
+
+
+def parse_rate_limits(specs):
+    """{'attack': (8.0, 4.0)} from ['attack=8:4'] (--input-rate); the burst defaults to one second of rate"""
+    limits = {}
+    for spec in specs or ():
+        cls, sep, value = spec.partition('=')
+        rate, _, burst = value.partition(':')
+        try:
+            if not sep or cls not in LIMIT_CLASSES:
+                raise ValueError
+            rate = float(rate)
+            burst = float(burst) if burst else max(1.0, rate)
+            if rate <= 0 or burst <= 0:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Invalid input rate '{spec}', expected CLASS=RATE[:BURST] "
+                             f"with CLASS one of {', '.join(LIMIT_CLASSES)}") from None
+        limits[cls] = (rate, burst)
+    return limits
+
+
+class TokenBucket:
+    """Sustained `rate` tokens per second, up to `burst` banked"""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = None
+
+    def refill(self, now):
+        if self.updated is not None and now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def has(self, cost):
+        return self.tokens >= min(cost, self.burst)
+
+
+class InputLimiter:
+    """Token buckets per (player, action class) in front of the action queues"""
+
+    def __init__(self, limits, players):
+        self.limits = dict(limits)
+        self.buckets = {(player, cls): TokenBucket(*limit) for player in players for cls, limit in limits.items()}
+        self.rejected = {(player, cls): 0 for player in players for cls in PRIORITY_CLASSES}
+        # (player, class) -> the buckets an action of that class draws from
+        self._draws = {(player, cls): tuple(bucket for bucket in (self.buckets.get((player, cls)),
+                                                                  self.buckets.get((player, TOTAL)))
+                                            if bucket is not None)
+                       for player in players for cls in PRIORITY_CLASSES}
+        # id(plan) -> (plan, presses); plans come from the snapshot's PlanCache, so this stays small
+        self._costs = {}
+        self._lock = threading.Lock()
+
+    def cost(self, plan):
+        cached = self._costs.get(id(plan))
+        if cached is None:
+            if len(self._costs) > 4096:
+                # Plans of replaced config snapshots
+                self._costs.clear()
+            cached = self._costs[id(plan)] = (plan, max(1, sum(1 for event in plan.events if event.action == PRESS)))
+        return cached[1]
+
+    def allow(self, player, kind, plan, now):
+        """Take the plan's presses from the player's class and total buckets; False (and counted) if short"""
+        cls = PRIORITY_CLASS[kind]
+        buckets = self._draws[(player, cls)]
+        if not buckets:
+            return True
+        cost = self.cost(plan)
+        with self._lock:
+            for bucket in buckets:
+                bucket.refill(now)
+            if not all(bucket.has(cost) for bucket in buckets):
+                self.rejected[(player, cls)] += 1
+                return False
+            for bucket in buckets:
+                bucket.tokens -= cost
+        return True
+
+    def summary(self, player):
+        rejected = ', '.join(f"{self.rejected[(player, cls)]} {cls}" for cls in PRIORITY_CLASSES)
+        limits = ', '.join(f"{cls} {rate:g}/s burst {burst:g}" for cls, (rate, burst) in self.limits.items())
+        return f"rejected {rejected} (limits: {limits})"
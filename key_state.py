@@ -0,0 +1,121 @@
+"""
+Central held-key state for the SF2 bridge.
+
+Both players' executor threads share one OS keyboard. Without a common view of
+which keys are down, a crouch (pressed, never released) stays stuck forever,
+and a hold from one plan is re-pressed or cut short by another plan using the
+same key. KeyStateTracker sits between the plans and the keyboard backend:
+
+- every key knows its owners (the exchanges whose plans hold it down)
+- a press of a key that is already down, or a release of a key another owner
+  still holds (or that is not down at all), never reaches the OS
+- keys a plan leaves held (crouch) get a lease; if no plan renews or releases
+  them before it runs out, expire() releases them
+- release_all() lets go of everything on shutdown
+"""
+
+import logging
+import threading
+import time
+
+from command_plans import PRESS
+
+logger = logging.getLogger(__name__)
+
+
+class KeyStateTracker:
+    """Owner-aware key state in front of a KeyboardBackend, forwarding only real state changes"""
+
+    def __init__(self, backend, owners):
+        self.backend = backend
+        # key -> set of owners holding it down
+        self.owners = {}
+        # (owner, key) -> perf_counter_ns lease expiry of a key left held after a plan
+        self.leases = {}
+        # Per-owner counts of OS events sent, redundant events dropped and holds ended by their lease
+        self.sent = dict.fromkeys(owners, 0)
+        self.deduplicated = dict.fromkeys(owners, 0)
+        self.lease_releases = dict.fromkeys(owners, 0)
+        self._lock = threading.Lock()
+
+    def _press(self, owner, key):
+        """Take ownership; True if the key was up and must be pressed"""
+        self.leases.pop((owner, key), None)
+        owners = self.owners.get(key)
+        if owners:
+            owners.add(owner)
+            return False
+        self.owners[key] = {owner}
+        return True
+
+    def _release(self, owner, key):
+        """Give up ownership; True if nobody holds the key any more and it must be released"""
+        self.leases.pop((owner, key), None)
+        owners = self.owners.get(key)
+        if not owners or owner not in owners:
+            return False
+        owners.discard(owner)
+        if owners:
+            return False
+        del self.owners[key]
+        return True
+
+    def send(self, owner, events):
+        """Send the events of one plan step that change the OS key state, as one batch"""
+        with self._lock:
+            changes = [event for event in events
+                       if (self._press(owner, event.key) if event.action == PRESS else self._release(owner, event.key))]
+            self.deduplicated[owner] += len(events) - len(changes)
+            if changes:
+                self.sent[owner] += len(changes)
+                self.backend.send(changes)
+
+    def lease_held(self, owner, lease_ns):
+        """Start (or renew) the lease of every key the owner still holds after a plan"""
+        if not lease_ns:
+            return
+        with self._lock:
+            expires_ns = time.perf_counter_ns() + lease_ns
+            for key, owners in self.owners.items():
+                if owner in owners:
+                    self.leases[(owner, key)] = expires_ns
+
+    def expire(self, now_ns=None):
+        """Release keys whose lease ran out; returns how many OS releases were sent"""
+        if not self.leases:
+            return 0
+        now_ns = time.perf_counter_ns() if now_ns is None else now_ns
+        released = 0
+        with self._lock:
+            for owner, key in [k for k, expires_ns in self.leases.items() if expires_ns <= now_ns]:
+                if self._release(owner, key):
+                    self.backend.release(key)
+                    self.sent[owner] += 1
+                    released += 1
+                self.lease_releases[owner] += 1
+        return released
+
+    def release_all(self):
+        """Release every key that is still down (shutdown)"""
+        with self._lock:
+            held = list(self.owners.items())
+            self.owners.clear()
+            self.leases.clear()
+            for key, owners in held:
+                try:
+                    self.backend.release(key)
+                    self.sent[min(owners)] += 1
+                except Exception as e:
+                    logger.error(f"Could not release key {key!r}: {e}")
+        if held:
+            logger.info(f"Released held keys: {', '.join(sorted(key for key, _ in held))}")
+
+    def held(self):
+        """Keys currently down, with their owners"""
+        with self._lock:
+            return {key: sorted(owners) for key, owners in self.owners.items()}
+
+    def summary(self, owner):
+        held = ', '.join(sorted(key for key, owners in self.held().items() if owner in owners))
+        return (f"{self.sent[owner]} events sent, {self.deduplicated[owner]} redundant dropped, "
+                f"{self.lease_releases[owner]} holds released by lease, held now: {held or 'none'}")
@@ -0,0 +1,166 @@
+"""
+Deadline-based, frame-aligned key timing for the SF2 bridge.
+
+Chains of relative time.sleep() calls accumulate overshoot, so a 5-input motion
+can drift past SF2's 10-12 frame input window. FrameScheduler instead plays a
+CommandPlan against absolute time.perf_counter_ns() deadlines:
+
+- Plan offsets are quantized to whole frames of the emulated game
+  (59.6 fps for the CPS1 arcade board, 60 fps for most MAME setups)
+- Each deadline is met with a hybrid wait: sleep until spin_us before the
+  deadline, then busy-wait the rest for sub-millisecond accuracy
+- The lateness (jitter) of every event is recorded
+"""
+
+import time
+from collections import deque
+
+from command_plans import PRESS, RELEASE, PlanEvent
+
+NS_PER_MS = 1_000_000
+NS_PER_S = 1_000_000_000
+
+
+class JitterStats:
+    """Lateness of scheduled key events relative to their deadlines (ns).
+
+    Keeps running totals plus the most recent samples for percentiles.
+    """
+
+    def __init__(self, window=1024):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.recent = deque(maxlen=window)
+
+    def record(self, late_ns):
+        self.count += 1
+        self.total_ns += late_ns
+        if late_ns > self.max_ns:
+            self.max_ns = late_ns
+        self.recent.append(late_ns)
+
+    def percentile(self, pct):
+        samples = sorted(self.recent)
+        if not samples:
+            return 0
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def stats(self):
+        return {
+            'events': self.count,
+            'avg_us': (self.total_ns / self.count / 1000) if self.count else 0.0,
+            'p50_us': self.percentile(50) / 1000,
+            'p99_us': self.percentile(99) / 1000,
+            'max_us': self.max_ns / 1000,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"{s['events']} events, jitter avg {s['avg_us']:.0f}us "
+                f"p50 {s['p50_us']:.0f}us p99 {s['p99_us']:.0f}us max {s['max_us']:.0f}us")
+
+
+class FrameScheduler:
+    """Plays CommandPlans against absolute, frame-quantized deadlines.
+
+    fps=0 disables quantization (plan offsets are used as-is); spin_us=0 disables
+    the busy-wait and relies on time.sleep() alone.
+    """
+
+    def __init__(self, fps=60.0, spin_us=1500):
+        self.fps = fps
+        self.frame_ns = NS_PER_S / fps if fps else 0
+        self.spin_ns = int(spin_us * 1000)
+        self.jitter = JitterStats()
+        # id(plan) -> (plan, schedule); the plan is kept so its id cannot be reused
+        self._schedules = {}
+
+    def clear(self):
+        """Forget cached schedules (after a config change replaced every plan)"""
+        self._schedules.clear()
+
+    def quantize_ms(self, offset_ms):
+        """Round an offset to the nearest whole frame (ns)"""
+        if not self.frame_ns:
+            return offset_ms * NS_PER_MS
+        return int(round(offset_ms * NS_PER_MS / self.frame_ns) * self.frame_ns)
+
+    def schedule(self, plan):
+        """Frame-aligned schedule for a plan: ((offset_ns, events), ...), end_ns
+
+        Events sharing an offset are grouped so they are sent together. Events
+        with distinct offsets stay at least one frame apart so a press and its
+        release never collapse into the same frame.
+        """
+        cached = self._schedules.get(id(plan))
+        if cached is not None:
+            return cached[1]
+
+        groups = []
+        prev_offset_ms = None
+        prev_ns = 0
+        for event in plan.events:
+            if event.offset_ms == prev_offset_ms:
+                groups[-1][1].append(event)
+                continue
+            offset_ns = self.quantize_ms(event.offset_ms)
+            if groups and offset_ns <= prev_ns:
+                offset_ns = prev_ns + int(self.frame_ns or NS_PER_MS)
+            groups.append((offset_ns, [event]))
+            prev_offset_ms = event.offset_ms
+            prev_ns = offset_ns
+
+        end_ns = max(self.quantize_ms(plan.duration_ms), prev_ns)
+        schedule = (tuple((offset, tuple(events)) for offset, events in groups), end_ns)
+        self._schedules[id(plan)] = (plan, schedule)
+        return schedule
+
+    def wait_until(self, deadline_ns):
+        """Sleep until spin_ns before the deadline, then spin; return lateness in ns"""
+        remaining = deadline_ns - time.perf_counter_ns()
+        if remaining > self.spin_ns:
+            time.sleep((remaining - self.spin_ns) / NS_PER_S)
+        now = time.perf_counter_ns()
+        while now < deadline_ns:
+            now = time.perf_counter_ns()
+        return now - deadline_ns
+
+    def play(self, plan, emit, preempt=None):
+        """Play a plan, calling emit(events) for each group of simultaneous key events.
+
+        If preempt is given, preempt(wake_ns, held_keys) replaces the sleep before
+        each group and before the end of the plan (see InputExecutor). It may play
+        other plans meanwhile; if it returns True the rest of this plan is cancelled
+        and the keys it pressed and has not released yet are released (keys still
+        held at the end of a plan, like a crouch, stay held).
+
+        Returns the perf_counter_ns time the first group was emitted (None for an empty plan).
+        """
+        groups, end_ns = self.schedule(plan)
+        start = time.perf_counter_ns()
+        first_ns = None
+        held = set() if preempt is not None else None
+        for offset_ns, events in groups:
+            if offset_ns:
+                if preempt is not None and preempt(start + offset_ns - self.spin_ns, held):
+                    if held:
+                        emit(tuple(PlanEvent(0, RELEASE, key) for key in sorted(held)))
+                    return first_ns
+                late = self.wait_until(start + offset_ns)
+            else:
+                late = time.perf_counter_ns() - start
+            if first_ns is None:
+                first_ns = time.perf_counter_ns()
+            emit(events)
+            for event in events:
+                self.jitter.record(late)
+                if held is not None:
+                    if event.action == PRESS:
+                        held.add(event.key)
+                    else:
+                        held.discard(event.key)
+        if preempt is not None and preempt(start + end_ns - self.spin_ns, held):
+            return first_ns
+        self.wait_until(start + end_ns)
+        return first_ns
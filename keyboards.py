@@ -0,0 +1,271 @@
+"""
+Keyboard backends for the SF2 bridge.
+
+The bridge sends key events through a small backend interface instead of
+talking to pynput directly, so the event pipeline can run without a display:
+
+- pynput: the OS keyboard via pynput.keyboard.Controller (default)
+- null: discards every event (zero-cost, for benchmarks)
+- recording: timestamps every press/release into preallocated arrays (CI, benchmarks)
+- uinput: Linux virtual keyboard, each batch of events written in one syscall
+
+LazyBackend defers creating a backend (and importing pynput) until it is
+preloaded on a background thread or first used, keeping it off startup.
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+from array import array
+
+from command_plans import PRESS, RELEASE
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('pynput', 'null', 'recording', 'uinput')
+
+
+class KeyboardBackend:
+    """Base backend: press/release single keys, send() a batch of simultaneous key events"""
+    name = 'base'
+
+    def press(self, key):
+        raise NotImplementedError
+
+    def release(self, key):
+        raise NotImplementedError
+
+    def send(self, events):
+        """Send key events (anything with .action and .key) that share one deadline"""
+        for event in events:
+            if event.action == PRESS:
+                self.press(event.key)
+            else:
+                self.release(event.key)
+
+    def close(self):
+        pass
+
+
+class PynputBackend(KeyboardBackend):
+    """The OS keyboard through pynput (needs a display on Linux)"""
+    name = 'pynput'
+
+    def __init__(self):
+        from pynput.keyboard import Controller
+        self.controller = Controller()
+
+    def press(self, key):
+        self.controller.press(key)
+
+    def release(self, key):
+        self.controller.release(key)
+
+
+class NullBackend(KeyboardBackend):
+    """Discards every key event"""
+    name = 'null'
+
+    def press(self, key):
+        pass
+
+    def release(self, key):
+        pass
+
+    def send(self, events):
+        pass
+
+
+class RecordingBackend(KeyboardBackend):
+    """Records every key event with a perf_counter_ns timestamp into preallocated arrays.
+
+    Nothing is allocated per event; once capacity is reached further events are
+    counted in `overflow` but not stored.
+    """
+    name = 'recording'
+
+    def __init__(self, capacity=1 << 20):
+        self.capacity = capacity
+        self.timestamps = array('q', bytes(8 * capacity))
+        self.keys = array('B', bytes(capacity))
+        self.pressed = array('b', bytes(capacity))
+        self.count = 0
+        self.overflow = 0
+        self._lock = threading.Lock()
+
+    def _record(self, key, is_press, now):
+        i = self.count
+        if i >= self.capacity:
+            self.overflow += 1
+            return
+        self.timestamps[i] = now
+        self.keys[i] = ord(key)
+        self.pressed[i] = is_press
+        self.count = i + 1
+
+    def press(self, key):
+        with self._lock:
+            self._record(key, 1, time.perf_counter_ns())
+
+    def release(self, key):
+        with self._lock:
+            self._record(key, 0, time.perf_counter_ns())
+
+    def send(self, events):
+        now = time.perf_counter_ns()
+        with self._lock:
+            for event in events:
+                self._record(event.key, 1 if event.action == PRESS else 0, now)
+
+    def clear(self):
+        with self._lock:
+            self.count = 0
+            self.overflow = 0
+
+    def events(self):
+        """Recorded events as (timestamp_ns, PRESS|RELEASE, key)"""
+        return [(self.timestamps[i], PRESS if self.pressed[i] else RELEASE, chr(self.keys[i]))
+                for i in range(self.count)]
+
+    def stats(self):
+        """Event count, throughput and inter-event timing of the recording"""
+        n = self.count
+        if n < 2:
+            return {'events': n, 'overflow': self.overflow}
+        span_ns = self.timestamps[n - 1] - self.timestamps[0]
+        gaps = sorted(self.timestamps[i + 1] - self.timestamps[i] for i in range(n - 1))
+        return {
+            'events': n,
+            'overflow': self.overflow,
+            'span_ms': span_ns / 1e6,
+            'events_per_s': (n - 1) / (span_ns / 1e9) if span_ns else 0.0,
+            'gap_p50_ms': gaps[len(gaps) // 2] / 1e6,
+            'gap_max_ms': gaps[-1] / 1e6,
+        }
+
+
+# Linux input-event-codes.h
+_EV_SYN = 0x00
+_EV_KEY = 0x01
+_SYN_REPORT = 0
+_BUS_USB = 0x03
+_UI_SET_EVBIT = 0x40045564
+_UI_SET_KEYBIT = 0x40045565
+_UI_DEV_CREATE = 0x5501
+_UI_DEV_DESTROY = 0x5502
+_INPUT_EVENT = struct.Struct('llHHi')
+_LINUX_KEY_CODES = dict(
+    [(str(d), 2 + (d - 1) % 10) for d in range(10)] +
+    list(zip('qwertyuiop', range(16, 26))) +
+    list(zip('asdfghjkl', range(30, 39))) +
+    list(zip('zxcvbnm', range(44, 51)))
+)
+
+
+class UinputBackend(KeyboardBackend):
+    """Linux virtual keyboard through /dev/uinput.
+
+    Each send() packs all of its key events plus one SYN_REPORT into a single
+    write(), so simultaneous presses reach the emulator as one input report.
+    Needs write access to /dev/uinput.
+    """
+    name = 'uinput'
+
+    def __init__(self, device='/dev/uinput', device_name=b'sf2-bitcoin-bridge'):
+        import fcntl
+        self._fcntl = fcntl
+        self.fd = os.open(device, os.O_WRONLY | os.O_NONBLOCK)
+        try:
+            fcntl.ioctl(self.fd, _UI_SET_EVBIT, _EV_KEY)
+            for code in _LINUX_KEY_CODES.values():
+                fcntl.ioctl(self.fd, _UI_SET_KEYBIT, code)
+            # Legacy struct uinput_user_dev: name, input_id, ff_effects_max, abs{max,min,fuzz,flat}[64]
+            os.write(self.fd, struct.pack('80sHHHHi256i', device_name, _BUS_USB, 0x1, 0x1, 1, 0, *([0] * 256)))
+            fcntl.ioctl(self.fd, _UI_DEV_CREATE)
+        except Exception:
+            os.close(self.fd)
+            raise
+        # Give udev a moment to register the device before the first key arrives
+        time.sleep(0.2)
+
+    def _pack(self, key, value):
+        return _INPUT_EVENT.pack(0, 0, _EV_KEY, _LINUX_KEY_CODES[key], value)
+
+    def _write(self, payload):
+        os.write(self.fd, payload + _INPUT_EVENT.pack(0, 0, _EV_SYN, _SYN_REPORT, 0))
+
+    def press(self, key):
+        self._write(self._pack(key, 1))
+
+    def release(self, key):
+        self._write(self._pack(key, 0))
+
+    def send(self, events):
+        self._write(b''.join(self._pack(e.key, 1 if e.action == PRESS else 0) for e in events))
+
+    def close(self):
+        if self.fd is None:
+            return
+        try:
+            self._fcntl.ioctl(self.fd, _UI_DEV_DESTROY)
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+
+class LazyBackend(KeyboardBackend):
+    """Creates the named backend on first use, or in the background after preload()"""
+
+    def __init__(self, name, **kwargs):
+        self.name = name
+        self._kwargs = kwargs
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        backend = self._backend
+        if backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_backend(self.name, **self._kwargs)
+                backend = self._backend
+        return backend
+
+    def preload(self):
+        """Create the backend on a background thread so the first key press does not pay for it"""
+        def load():
+            try:
+                self.backend
+            except Exception as e:
+                logger.error(f"Could not create {self.name} keyboard backend: {e}")
+        threading.Thread(target=load, name=f"{self.name}-keyboard-load", daemon=True).start()
+
+    def press(self, key):
+        self.backend.press(key)
+
+    def release(self, key):
+        self.backend.release(key)
+
+    def send(self, events):
+        self.backend.send(events)
+
+    def close(self):
+        with self._lock:
+            if self._backend is not None:
+                self._backend.close()
+
+
+def create_backend(name='pynput', **kwargs):
+    """Create a keyboard backend by name (see BACKENDS)"""
+    if name == 'pynput':
+        return PynputBackend()
+    if name == 'null':
+        return NullBackend()
+    if name == 'recording':
+        return RecordingBackend(**kwargs)
+    if name == 'uinput':
+        return UinputBackend(**kwargs)
+    raise ValueError(f"Unknown keyboard backend '{name}', expected one of {BACKENDS}")
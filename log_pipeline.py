@@ -0,0 +1,168 @@
+"""
+Log output for the SF2 bridge, kept off the feed and executor threads.
+
+Every trigger logs a line, so at thousands of trades a minute formatting and
+writing log lines to stderr is a measurable part of each feed callback.
+LogPipeline replaces the plain stderr handler with:
+
+- queue mode (--log-queue): a QueueHandler that hands the unformatted record
+  to a QueueListener thread, which formats and writes it. The hot-path log
+  calls pass %-style arguments, so the message text is only built on that
+  thread (or never, for records that are filtered out).
+- in queue mode records also skip the stack walk for the caller and the
+  thread/process lookups, which LOG_FORMAT does not show. These are
+  process-wide logging settings, so they are put back by close()
+- message limits (--log-limit CATEGORY=N): each distinct message of a
+  category (logger name, or * for all) is written at most N times per
+  summary interval. The rest are counted and collapsed into one summary
+  line per message when the interval ends.
+
+Categories: trades (per-trade trigger lines), command_plans (invalid command
+warnings), triggers (invalid ranges), bridge / __main__ and the other module names.
+"""
+
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def parse_limits(specs):
+    """{'trades': 5} from ['trades=5'] (--log-limit)"""
+    limits = {}
+    for spec in specs or ():
+        category, sep, count = spec.partition('=')
+        if not sep or not category or not count.isdigit():
+            raise ValueError(f"Invalid log limit '{spec}', expected CATEGORY=N")
+        limits[category] = int(count)
+    return limits
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() formats the message in the logging thread. Log
+    arguments on the hot path are strings and numbers, so the record can be
+    queued as is.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class MessageLimiter(logging.Filter):
+    """Writes each distinct message of a limited category at most N times per interval, then summarizes"""
+
+    def __init__(self, limits, interval=30):
+        super().__init__()
+        self.limits = dict(limits)
+        self.interval = interval
+        # (logger name, message template, level) -> records seen in the current interval
+        self.counts = {}
+        self.window_start = time.monotonic()
+        self._lock = threading.Lock()
+        # logger name -> its limit (None = unlimited), resolved once per name
+        self._limit_of = {}
+
+    def limit(self, name):
+        limit = self._limit_of.get(name, False)
+        if limit is False:
+            limit = None if name == logger.name else self.limits.get(name, self.limits.get('*'))
+            self._limit_of[name] = limit
+        return limit
+
+    def filter(self, record):
+        limit = self.limit(record.name)
+        if limit is None:
+            return True
+        if time.monotonic() - self.window_start >= self.interval:
+            self.flush()
+        key = (record.name, record.msg, record.levelno)
+        with self._lock:
+            count = self.counts.get(key, 0) + 1
+            self.counts[key] = count
+        return count <= limit
+
+    def flush(self, force=False):
+        """Log a summary of the messages suppressed in the interval, if it is over (or force)"""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self.window_start < self.interval:
+                return
+            elapsed = now - self.window_start
+            counts, self.counts = self.counts, {}
+            self.window_start = now
+        for (name, msg, level), count in counts.items():
+            suppressed = count - self.limit(name)
+            if suppressed > 0:
+                # At the level of the suppressed message, so a summary of warnings is still a warning
+                logger.log(level, "%d more %r message(s) from %s suppressed in the last %.0fs",
+                           suppressed, msg, name, elapsed)
+
+
+class LogPipeline:
+    """Installs the bridge's root log handlers: stderr directly or through a listener thread, with limits"""
+
+    def __init__(self, use_queue=False, limits=None, interval=30, stream=None, level=logging.INFO):
+        self.use_queue = use_queue
+        self.level = level
+        self.limiter = MessageLimiter(limits, interval) if limits else None
+        self.stream_handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+        self.stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.queue_handler = None
+        self.listener = None
+        # Process-wide logging settings changed by queue mode, restored by close()
+        self._settings = None
+
+    def install(self):
+        root = logging.getLogger()
+        root.setLevel(self.level)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        if self.use_queue:
+            # LOG_FORMAT uses none of the caller, thread or process fields: skip collecting them for
+            # every record (the logging HOWTO's optimization settings)
+            self._settings = (logging._srcfile, logging.logThreads, logging.logProcesses,
+                              logging.logMultiprocessing)
+            logging._srcfile = None
+            logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+            records = queue.SimpleQueue()
+            self.queue_handler = LazyQueueHandler(records)
+            self.listener = logging.handlers.QueueListener(records, self.stream_handler)
+            self.listener.start()
+            handler = self.queue_handler
+        else:
+            handler = self.stream_handler
+        if self.limiter:
+            # Limited records are dropped before they are queued or formatted
+            handler.addFilter(self.limiter)
+        root.addHandler(handler)
+        return self
+
+    def flush(self):
+        """Summaries of suppressed messages whose interval is over (called once a second)"""
+        if self.limiter:
+            self.limiter.flush()
+
+    def close(self):
+        """Write the last summaries and pending records, then log straight to the stream again"""
+        if self.limiter:
+            self.limiter.flush(force=True)
+        if self.listener is not None:
+            root = logging.getLogger()
+            root.removeHandler(self.queue_handler)
+            self.listener.stop()
+            self.listener = None
+            root.addHandler(self.stream_handler)
+            if self.limiter:
+                self.stream_handler.addFilter(self.limiter)
+        if self._settings is not None:
+            (logging._srcfile, logging.logThreads, logging.logProcesses,
+             logging.logMultiprocessing) = self._settings
+            self._settings = None
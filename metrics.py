@@ -0,0 +1,259 @@
+"""
+Per-stage latency metrics for the SF2 bridge.
+
+Every trade is timed through the pipeline, from the exchange matching it to
+MAME receiving the first key:
+
+- exchange: exchange trade time (Binance T, Coinbase time) to socket receive
+- decode: socket receive to decoded trade
+- decision: decoded trade to trigger lookup done and actions queued
+- queue: action queued to picked up by the player's executor
+- key: picked up to first key event sent
+- total: socket receive to first key event sent
+
+The hot path only takes timestamps and appends one tuple to a deque (atomic
+in CPython, no lock). The samples are folded into per-(exchange, stage)
+histograms with power-of-two nanosecond buckets by collect(), which runs on
+the bridge's stats loop and on every scrape, never on a feed or executor
+thread.
+
+Histograms are served in Prometheus text format by MetricsServer (or
+serve_metrics() on an asyncio loop) and summarized in the periodic stats log line.
+"""
+
+import logging
+import threading
+from collections import deque
+
+from decoders import trade_time_ns
+
+logger = logging.getLogger(__name__)
+
+FEED_STAGES = ('exchange', 'decode', 'decision')
+EXECUTOR_STAGES = ('queue', 'key', 'total')
+STAGES = FEED_STAGES + EXECUTOR_STAGES
+
+# Bucket i holds samples below 2**(MIN_BITS + i) ns: ~1us up to ~34s, then +Inf
+MIN_BITS = 10
+MAX_BITS = 35
+BUCKET_BOUNDS_NS = tuple(1 << bits for bits in range(MIN_BITS, MAX_BITS + 1))
+
+
+class LatencyHistogram:
+    """Histogram of nanosecond durations with power-of-two buckets"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_NS) + 1)
+        self.total_ns = 0
+        self.count = 0
+
+    def record(self, ns):
+        if ns < 0:
+            # Clock skew between us and the exchange; counted in the lowest bucket
+            ns = 0
+        i = ns.bit_length() - MIN_BITS
+        if i < 0:
+            i = 0
+        elif i > MAX_BITS - MIN_BITS + 1:
+            i = MAX_BITS - MIN_BITS + 1
+        self.counts[i] += 1
+        self.total_ns += ns
+        self.count += 1
+
+    def percentile(self, pct):
+        """Upper bound (ns) of the bucket holding the pct-th percentile; None if empty or past the last bound"""
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return None
+        rank = total * pct / 100
+        seen = 0
+        for bound, n in zip(BUCKET_BOUNDS_NS, counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+
+def format_ns(ns):
+    if ns is None:
+        return 'n/a'
+    if ns < 1_000_000:
+        return f"{ns / 1000:.0f}us"
+    if ns < 1_000_000_000:
+        return f"{ns / 1_000_000:.0f}ms"
+    return f"{ns / 1_000_000_000:.1f}s"
+
+
+class BridgeMetrics:
+    """Latency histograms for every exchange and pipeline stage.
+
+    Up to max_pending samples are buffered between collect() calls; older ones
+    are discarded beyond that.
+    """
+
+    def __init__(self, exchanges, max_pending=1 << 16):
+        self.histograms = {
+            exchange: {stage: LatencyHistogram() for stage in STAGES} for exchange in exchanges
+        }
+        self.trades = dict.fromkeys(exchanges, 0)
+        self._trades = deque(maxlen=max_pending)
+        self._played = deque(maxlen=max_pending)
+        self._collect_lock = threading.Lock()
+        # name -> (type, help, source, label); source() returns {exchange: value},
+        # or {(exchange, label value): value} when the series has a second label
+        self._series = {}
+
+    def register(self, name, kind, help_text, source, label=None):
+        """Export a per-exchange counter or gauge kept elsewhere in the bridge"""
+        self._series[name] = (kind, help_text, source, label)
+
+    def trade(self, exchange, trade_time, received_ns, decoded_ns, decided_ns, wall_time):
+        """Buffer the feed-thread timestamps of one trade.
+
+        received/decoded/decided are perf_counter_ns; wall_time is the bridge clock
+        (seconds) at the decision, compared against the exchange trade time.
+        """
+        self._trades.append((exchange, trade_time, received_ns, decoded_ns, decided_ns, wall_time))
+
+    def played(self, exchange, action, first_key_ns, dequeued_ns):
+        """Buffer the executor timestamps of one played action (InputExecutor.on_played)"""
+        self._played.append((exchange, action.enqueued_at, action.received_ns, dequeued_ns, first_key_ns))
+
+    def collect(self):
+        """Fold buffered samples into the histograms"""
+        with self._collect_lock:
+            pending = self._trades
+            while pending:
+                exchange, trade_time, received_ns, decoded_ns, decided_ns, wall_time = pending.popleft()
+                stages = self.histograms[exchange]
+                self.trades[exchange] += 1
+                stages['decode'].record(decoded_ns - received_ns)
+                stages['decision'].record(decided_ns - decoded_ns)
+                if trade_time:
+                    # Wall clock at the decision, minus the time spent since receive, is the receive wall time
+                    received_wall_ns = int(wall_time * 1e9) - (decided_ns - received_ns)
+                    stages['exchange'].record(received_wall_ns - trade_time_ns(trade_time))
+
+            pending = self._played
+            while pending:
+                exchange, enqueued_at, received_ns, dequeued_ns, first_key_ns = pending.popleft()
+                stages = self.histograms[exchange]
+                stages['queue'].record(dequeued_ns - int(enqueued_at * 1e9))
+                if first_key_ns is None:
+                    continue
+                stages['key'].record(first_key_ns - dequeued_ns)
+                if received_ns is not None:
+                    stages['total'].record(first_key_ns - received_ns)
+
+    def summary(self, exchange):
+        self.collect()
+        parts = []
+        for stage, histogram in self.histograms[exchange].items():
+            if histogram.count:
+                parts.append(f"{stage} p50 {format_ns(histogram.percentile(50))} "
+                             f"p99 {format_ns(histogram.percentile(99))}")
+        return f"{self.trades[exchange]} trades, " + (', '.join(parts) if parts else 'no samples')
+
+    def render(self):
+        """Histograms in Prometheus text exposition format"""
+        self.collect()
+        lines = [
+            '# HELP sf2_bridge_trades_total Trades decoded per exchange',
+            '# TYPE sf2_bridge_trades_total counter',
+        ]
+        for exchange, count in self.trades.items():
+            lines.append(f'sf2_bridge_trades_total{{exchange="{exchange}"}} {count}')
+        for name, (kind, help_text, source, label) in self._series.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for key, value in source().items():
+                if label:
+                    exchange, label_value = key
+                    lines.append(f'{name}{{exchange="{exchange}",{label}="{label_value}"}} {value}')
+                else:
+                    lines.append(f'{name}{{exchange="{key}"}} {value}')
+        lines += [
+            '# HELP sf2_bridge_stage_latency_seconds Latency of each pipeline stage',
+            '# TYPE sf2_bridge_stage_latency_seconds histogram',
+        ]
+        for exchange, stages in self.histograms.items():
+            for stage, histogram in stages.items():
+                labels = f'exchange="{exchange}",stage="{stage}"'
+                counts = list(histogram.counts)
+                cumulative = 0
+                for bound, n in zip(BUCKET_BOUNDS_NS, counts):
+                    cumulative += n
+                    lines.append(f'sf2_bridge_stage_latency_seconds_bucket{{{labels},le="{bound / 1e9:.9g}"}} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'sf2_bridge_stage_latency_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f'sf2_bridge_stage_latency_seconds_sum{{{labels}}} {histogram.total_ns / 1e9:.9f}')
+                lines.append(f'sf2_bridge_stage_latency_seconds_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Serves render() as Prometheus text on http://host:port/metrics from a daemon thread"""
+
+    def __init__(self, render, port, host='127.0.0.1'):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True)
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self.thread.start()
+        logger.info(f"Serving metrics on {self.address}")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+async def serve_metrics(render, port, host='127.0.0.1'):
+    """MetricsServer for an asyncio event loop: serves render() on /metrics from the loop itself"""
+    import asyncio
+
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.split()
+            if len(parts) >= 2 and parts[1].split(b'?')[0] == b'/metrics':
+                status, body = b'200 OK', render().encode('utf-8')
+            else:
+                status, body = b'404 Not Found', b'Not Found\n'
+            writer.write(b'HTTP/1.1 ' + status + b'\r\n'
+                         b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                         b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+                         b'Connection: close\r\n\r\n' + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
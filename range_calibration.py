@@ -0,0 +1,258 @@
+"""
+Adaptive trigger ranges for the SF2 bridge.
+
+The dashboard ranges (binanceBuyWeakMin, binanceSpecial3Max, ...) are fixed
+BTC quantities, so when trading volume shifts the trigger rate swings from
+silence to constant key mashing. With --adaptive-window the bridge instead
+keeps each range at a fixed percentile of recent trade sizes:
+
+- feed threads add every trade's size to a QuantitySketch per (exchange, side):
+  a log-bucket histogram (~1% relative error, fixed memory, one increment per
+  trade) over a sliding window made of rotating sub-window histograms
+- every --adaptive-interval seconds the housekeeping loop maps each range to
+  its target percentiles, recompiles the TriggerIndex from the remapped values
+  and swaps it into the snapshot, unless no boundary moved more than 5%
+- targets come from --adaptive-targets (JSON {"binanceBuyWeak": [50, 80], ...},
+  percentiles 0-100) or else are learned from the first full window: each
+  configured boundary keeps the percentile it had then. Boundaries outside the
+  observed sizes (0, or above the largest trade) stay as configured
+
+A dashboard config change re-learns the targets for the new ranges.
+"""
+
+import json
+import logging
+import math
+from collections import deque
+
+from triggers import EXCHANGES, SIGNALS, TriggerIndex, range_prefixes
+
+logger = logging.getLogger(__name__)
+
+# Bucket i > 0 holds sizes in (MIN_QUANTITY * GAMMA**(i-1), MIN_QUANTITY * GAMMA**i]; 1e-9 .. ~1e6 BTC
+GAMMA = 1.02
+MIN_QUANTITY = 1e-9
+BUCKETS = int(math.log(1e15) / math.log(GAMMA)) + 2
+_INV_LOG_GAMMA = 1 / math.log(GAMMA)
+
+# Sub-window histograms per sliding window
+SLOTS = 10
+
+# Boundaries are republished only when one moves by more than this fraction
+HYSTERESIS = 0.05
+
+
+def _bucket(quantity):
+    """Histogram bucket of a trade size"""
+    if quantity <= MIN_QUANTITY:
+        return 0
+    return min(BUCKETS - 1, int(math.log(quantity / MIN_QUANTITY) * _INV_LOG_GAMMA) + 1)
+
+
+def load_targets(path):
+    """{prefix: (lo_pct, hi_pct)} from a --adaptive-targets JSON file; ValueError unless 0 <= lo <= hi <= 100"""
+    with open(path) as f:
+        targets = json.load(f)
+    if not isinstance(targets, dict):
+        raise ValueError(f"Adaptive targets {path} is not a JSON object of {{range: [lo, hi]}}")
+    parsed = {}
+    for prefix, pair in targets.items():
+        try:
+            lo, hi = (float(pct) for pct in pair)
+        except (TypeError, ValueError):
+            raise ValueError(f"Adaptive target {prefix} in {path} is not a [lo, hi] pair of percentiles")
+        if not 0 <= lo <= hi <= 100:
+            raise ValueError(f"Adaptive target {prefix} in {path} needs 0 <= lo <= hi <= 100, got [{lo:g}, {hi:g}]")
+        parsed[prefix] = (lo, hi)
+    return parsed
+
+
+class QuantitySketch:
+    """Log-bucket histogram of trade sizes over a sliding window of SLOTS sub-windows"""
+
+    def __init__(self):
+        # Filled by the feed thread; rotate() swaps in a fresh one
+        self.current = [0] * BUCKETS
+        self.closed = deque()
+        # Sum of the closed sub-windows
+        self.totals = [0] * BUCKETS
+
+    def add(self, quantity):
+        self.current[_bucket(quantity)] += 1
+
+    def rotate(self):
+        """Close the current sub-window; the oldest falls out once the window is full"""
+        current, self.current = self.current, [0] * BUCKETS
+        # A feed thread may still be adding to the old list: the window keeps the counts as of now, so the
+        # same counts go into totals and later come out of them (a late trade or two is not counted)
+        closed = tuple(current)
+        self.closed.append(closed)
+        totals = self.totals
+        for i, count in enumerate(closed):
+            if count:
+                totals[i] += count
+        if len(self.closed) >= SLOTS:
+            for i, count in enumerate(self.closed.popleft()):
+                if count:
+                    totals[i] -= count
+
+    @property
+    def full(self):
+        return len(self.closed) >= SLOTS - 1
+
+    def counts(self):
+        return [closed + current for closed, current in zip(self.totals, self.current)]
+
+    bucket = staticmethod(_bucket)
+
+    @classmethod
+    def rank(cls, counts, total, quantity):
+        """Percentile (0-100) of a size in the window, or None if it lies outside the observed sizes"""
+        if quantity <= 0:
+            return None
+        i = cls.bucket(quantity)
+        below = sum(counts[:i])
+        if below + counts[i] == 0 or below >= total:
+            return None
+        return 100.0 * (below + counts[i] / 2) / total
+
+    @staticmethod
+    def quantile(counts, total, pct):
+        """Size at a percentile (0-100): the geometric middle of its bucket"""
+        target = pct / 100 * total
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if count and seen >= target:
+                return MIN_QUANTITY * GAMMA ** (i - 0.5) if i else MIN_QUANTITY
+        return None
+
+
+class RangeCalibrator:
+    """Keeps the trigger ranges of a bridge's snapshot at target percentiles of recent trade sizes"""
+
+    def __init__(self, bridge, window=300, interval=10, targets=None, min_trades=200):
+        self.bridge = bridge
+        self.slot_seconds = window / SLOTS
+        self.window = window
+        self.interval = interval
+        self.min_trades = min_trades
+        self.sketches = {(exchange, side): QuantitySketch() for exchange in EXCHANGES for side in SIGNALS}
+        # Explicit {prefix: (lo_pct, hi_pct)}; otherwise learned per config
+        self.targets = targets
+        # prefix -> (lo_pct, hi_pct) for the config in self._config, None = boundary kept as configured
+        self.anchors = {}
+        self._config = None
+        # prefix -> (lo, hi) currently published
+        self.thresholds = {}
+        self.updates = 0
+        self._last_rotate = None
+        self._last_calibration = None
+
+    def observe(self, exchange, side, quantity):
+        """Add a trade size (feed thread)"""
+        self.sketches[(exchange, side)].add(quantity)
+
+    def tick(self, now):
+        """Rotate sub-windows and recalibrate when due (housekeeping, once a second)"""
+        if self._last_rotate is None:
+            self._last_rotate = self._last_calibration = now
+            return
+        while now - self._last_rotate >= self.slot_seconds:
+            for sketch in self.sketches.values():
+                sketch.rotate()
+            self._last_rotate += self.slot_seconds
+        if now - self._last_calibration >= self.interval:
+            self._last_calibration = now
+            try:
+                self.calibrate()
+            except Exception as e:
+                logger.error(f"Range calibration error: {e}")
+
+    def _anchor(self, config, prefix, counts, total):
+        """Target percentiles of a range: explicit, or the percentiles its configured boundaries have now"""
+        if self.targets is not None:
+            return self.targets.get(prefix, (None, None))
+        try:
+            lo = float(config.get(f"{prefix}Min", 0))
+            hi = float(config.get(f"{prefix}Max", 0))
+        except (TypeError, ValueError):
+            return None, None
+        return QuantitySketch.rank(counts, total, lo), QuantitySketch.rank(counts, total, hi)
+
+    def calibrate(self):
+        """Remap every range to its target percentiles and publish a new TriggerIndex if any moved"""
+        bridge = self.bridge
+        snapshot = bridge.snapshot
+        config = snapshot.config
+        if not config:
+            return False
+        if config is not self._config:
+            self._config = config
+            self.anchors = {}
+            self.thresholds = {}
+        windows = {}
+        for key, sketch in self.sketches.items():
+            counts = sketch.counts()
+            total = sum(counts)
+            if total >= self.min_trades:
+                windows[key] = (counts, total, sketch.full)
+        remapped = {}
+        for prefix, exchange, side in range_prefixes(config):
+            window = windows.get((exchange, side))
+            if window is None:
+                continue
+            counts, total, full = window
+            anchor = self.anchors.get(prefix)
+            if anchor is None:
+                if self.targets is None and not full:
+                    # Learn targets from a whole window, not the first seconds after startup
+                    continue
+                anchor = self.anchors[prefix] = self._anchor(config, prefix, counts, total)
+            lo_pct, hi_pct = anchor
+            if lo_pct is None and hi_pct is None:
+                continue
+            try:
+                lo = float(config.get(f"{prefix}Min", 0))
+                hi = float(config.get(f"{prefix}Max", 0))
+            except (TypeError, ValueError):
+                continue
+            if lo_pct is not None:
+                lo = QuantitySketch.quantile(counts, total, lo_pct)
+            if hi_pct is not None:
+                hi = QuantitySketch.quantile(counts, total, hi_pct)
+            if lo is None or hi is None:
+                # A percentile past the observed sizes: the range keeps its published boundaries
+                continue
+            remapped[prefix] = (lo, max(lo, hi))
+        if not remapped or not self._moved(remapped):
+            return False
+        thresholds = dict(self.thresholds)
+        thresholds.update(remapped)
+        calibrated = dict(config)
+        for prefix, (lo, hi) in thresholds.items():
+            calibrated[f"{prefix}Min"] = f"{lo:.8f}"
+            calibrated[f"{prefix}Max"] = f"{hi:.8f}"
+        # Keys and plans are unchanged; a dashboard update since the read above wins
+        if not bridge.swap_trigger_index(snapshot, TriggerIndex(calibrated)):
+            return False
+        self.thresholds = thresholds
+        self.updates += 1
+        logger.debug(f"Adaptive ranges updated: {len(remapped)} range(s) remapped")
+        return True
+
+    def _moved(self, remapped):
+        for prefix, (lo, hi) in remapped.items():
+            published = self.thresholds.get(prefix)
+            if published is None:
+                return True
+            for new, old in zip((lo, hi), published):
+                if abs(new - old) > HYSTERESIS * max(abs(old), MIN_QUANTITY):
+                    return True
+        return False
+
+    def summary(self, exchange):
+        trades = {side: sum(self.sketches[(exchange, side)].counts()) for side in SIGNALS}
+        tracked = sum(1 for prefix in self.thresholds if prefix.startswith(exchange))
+        return (f"{trades['buy']} buys / {trades['sell']} sells in the {self.window:g}s window, "
+                f"{tracked} range(s) at target percentiles, {self.updates} update(s) published")
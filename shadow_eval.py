@@ -0,0 +1,531 @@
+"""
+Shadow evaluation of candidate dashboard configs for the SF2 bridge.
+
+Trying new range fields means pressing keys with them. With --shadow
+NAME=PATH the bridge also runs the trigger evaluation of one or more
+candidate configs on the live trade stream, without queuing anything:
+
+- a candidate file is a JSON object of dashboard fields laid over the active
+  config (a full config works too), recompiled whenever the active config changes
+- the feed threads only append each decoded trade's size to a float array
+  per exchange (sells negated), after the same decode and sequence checks as
+  the live path. The housekeeping loop marks the array lengths once a second,
+  and the trades between two marks are spread evenly over that second, so the
+  feed path does not read the clock
+- the housekeeping loop classifies the buffered trades in batches (32768
+  trades or 10 minutes, and on exit) against the active config and every
+  candidate. A batch sorts each (exchange, side)'s trades by size once; every
+  config then only looks up its region boundaries in them with searchsorted,
+  so a config costs the same at any trade rate. Long batches keep NumPy's
+  per-call overhead off the per-trade cost at low trade rates, and the stats
+  lines report the last evaluated batch
+- special cooldowns and jump/crouch delays are replayed in time order, over
+  only the trades in the regions of each such control, jumping from one fire
+  to the first trade past its cooldown (a lookup per fire)
+- controls whose key or command has no plan are skipped, as the live path
+  never queues them
+- the active config goes through the same model (per-trade decisions, as
+  without --batch), so candidates are compared like for like
+
+Reported per config, every stats interval and in --shadow-report:
+
+- fires per minute of every control
+- overlap: the share of a candidate control's range matches where the
+  active config matches that control too, and the share of trades where
+  both configs match the same set of controls
+- would-be queue pressure per player: the time the executor would spend
+  playing the fired plans per second of feed (utilization), and a fluid
+  estimate of the actions a queue of --queue-size would drop
+
+Needs NumPy (pip install numpy).
+"""
+
+import json
+import logging
+import os
+from array import array
+from bisect import bisect_left
+
+from config_snapshot import compile_snapshot
+from command_plans import ATTACK_PRESS_MS, MOVEMENT_PRESS_MS, JUMP_PRESS_MS, CROUCH_HOLD_MS
+from triggers import EXCHANGES, SIGNALS
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = 'active'
+
+# Matched controls of a side with no compiled controls: one region, matching nothing
+_NO_MATCHES = (frozenset(),)
+
+
+def load_candidates(specs):
+    """[(name, fields)] from ['wide=wide.json'] (--shadow NAME=PATH; the name defaults to the file name)"""
+    candidates = []
+    for spec in specs or ():
+        name, sep, path = spec.partition('=')
+        if not sep:
+            path = spec
+            name = os.path.splitext(os.path.basename(spec))[0]
+        with open(path) as f:
+            fields = json.load(f)
+        if not isinstance(fields, dict):
+            raise ValueError(f"Shadow config {path} is not a JSON object of dashboard fields")
+        if name == ACTIVE or name in (existing for existing, _ in candidates):
+            raise ValueError(f"Duplicate shadow config name '{name}'")
+        candidates.append((name, fields))
+    return candidates
+
+
+class _Side:
+    """One (exchange, side) of a config, compiled for batch classification"""
+
+    def __init__(self, np, exchange, side, side_index, plans):
+        bounds = np.array(side_index.bounds, dtype=float)
+        # Each bound followed by the next float up: region i holds the sizes in [edges[i-1], edges[i]),
+        # so gaps and points of side_index.regions() come out of one searchsorted
+        self.edges = np.ravel(np.column_stack((bounds, np.nextafter(bounds, np.inf))))
+        regions = side_index.regions()
+        # Control names matched in each region, before cooldowns and delays
+        self.matched = []
+        # Per region: controls that fire on every trade (attacks, movements), their plan time in ms
+        self.direct = []
+        self.direct_ms = np.zeros(len(regions))
+        # Controls with a cooldown or delay: name -> (region ids, gap seconds, plan ms)
+        self.gated = {}
+        gated_regions = {}
+        prefix = f"{exchange}{side.capitalize()}"
+        for i, match in enumerate(regions):
+            names = []
+            direct_ms = 0
+            if match.attack:
+                level, key = match.attack
+                plan = plans.key_press(key, ATTACK_PRESS_MS)
+                if plan is not None:
+                    names.append(f"{prefix}{level}")
+                    direct_ms += plan.duration_ms
+            for movement, key in match.movements:
+                plan = plans.key_press(key, MOVEMENT_PRESS_MS)
+                if plan is not None:
+                    names.append(f"{exchange}{movement}")
+                    direct_ms += plan.duration_ms
+            self.direct.append(tuple(names))
+            self.direct_ms[i] = direct_ms
+            gated = []
+            if match.special:
+                special_name, command = match.special
+                plan = plans.command(command)
+                if plan is not None:
+                    gated.append((special_name, None, plan.duration_ms))
+            for spec in match.jump_crouch:
+                if spec.action == 'Jump':
+                    plan = plans.key_press(spec.key, JUMP_PRESS_MS)
+                else:
+                    plan = plans.key_press(spec.key, CROUCH_HOLD_MS, release=False)
+                if plan is not None:
+                    gated.append((spec.action_key, spec.delay, plan.duration_ms))
+            for name, delay, duration_ms in gated:
+                gated_regions.setdefault((name, delay, duration_ms), []).append(i)
+                names.append(name)
+            self.matched.append(frozenset(names))
+        self.direct_count = np.array([len(names) for names in self.direct], dtype=float)
+        # Trades per region since the counts were last folded into the config's
+        self.totals = np.zeros(len(regions), dtype=np.int64)
+        for (name, delay, duration_ms), region_ids in gated_regions.items():
+            self.gated[name] = (region_ids, delay, duration_ms)
+
+
+class ShadowConfig:
+    """A config's trigger regions and its running counts under the shadow model"""
+
+    def __init__(self, np, name, snapshot, special_cooldown, players):
+        self.name = name
+        self.special_cooldown = special_cooldown
+        self.sides = {}
+        if snapshot.trigger_index.active:
+            for exchange in EXCHANGES:
+                for side in SIGNALS:
+                    side_index = snapshot.trigger_index.side(exchange, side)
+                    if side_index is not None:
+                        self.sides[(exchange, side)] = _Side(np, exchange, side, side_index, snapshot.plans)
+        # Control name -> fires / range matches / matches shared with the active config
+        self.fires = {}
+        self.matches = {}
+        self.overlap = {}
+        self.trades = 0
+        self.agreed = 0
+        # Control name -> time it last fired (cooldown / delay state)
+        self.last_fire = {}
+        self.pressure = {exchange: QueuePressure() for exchange in players}
+        # (exchange, side) -> _Overlap with the active config, for candidates
+        self.versus = {}
+
+    def fold(self, np):
+        """Move the per-region trade counts of the batches since the last fold into the per-control counts"""
+        for compiled in self.sides.values():
+            totals = compiled.totals
+            for region in np.flatnonzero(totals).tolist():
+                n = int(totals[region])
+                for name in compiled.direct[region]:
+                    _add(self.fires, name, n)
+                for name in compiled.matched[region]:
+                    _add(self.matches, name, n)
+            totals[:] = 0
+        for versus in self.versus.values():
+            counts = versus.counts
+            self.agreed += int(counts @ versus.same)
+            for name, n in zip(versus.names, (counts @ versus.shared).tolist()):
+                if n:
+                    _add(self.overlap, name, int(n))
+            counts[:] = 0
+
+    def compare(self, np, active):
+        self.versus = {(exchange, side): _Overlap(np, active.sides.get((exchange, side)), self.sides.get((exchange, side)))
+                       for exchange in EXCHANGES for side in SIGNALS}
+
+
+class _Overlap:
+    """A candidate side's regions cut at the active config's edges too, with where their matches agree"""
+
+    def __init__(self, np, live, candidate):
+        live_edges = live.edges if live is not None else np.zeros(0)
+        edges = candidate.edges if candidate is not None else np.zeros(0)
+        live_matched = live.matched if live is not None else _NO_MATCHES
+        matched = candidate.matched if candidate is not None else _NO_MATCHES
+        self.edges = np.union1d(live_edges, edges)
+        # A size in each cut region: below every edge, then each edge
+        probes = np.concatenate(([-np.inf], self.edges))
+        pairs = list(zip(np.searchsorted(live_edges, probes, side='right').tolist(),
+                         np.searchsorted(edges, probes, side='right').tolist()))
+        self.same = np.array([live_matched[live] == matched[region] for live, region in pairs], dtype=float)
+        shared = [live_matched[live] & matched[region] for live, region in pairs]
+        self.names = sorted(set().union(*shared))
+        # Cut regions x control names matched by both configs
+        self.shared = np.zeros((len(pairs), len(self.names)))
+        for i, names in enumerate(shared):
+            for name in names:
+                self.shared[i, self.names.index(name)] = 1
+        # Trades per cut region since the counts were last folded into the candidate's
+        self.counts = np.zeros(len(pairs), dtype=np.int64)
+
+
+def _add(counts, name, n):
+    counts[name] = counts.get(name, 0) + n
+
+
+class QueuePressure:
+    """Fluid model of a player's action queue, second by second: plan time fired vs feed time elapsed"""
+
+    def __init__(self):
+        self.busy_ms = 0.0
+        self.elapsed_ms = 0.0
+        self.actions = 0
+        # Busiest second's plan time per second
+        self.peak = 0.0
+        # Plan time still queued at the end of the last second, and actions a bounded queue would drop
+        self.backlog_ms = 0.0
+        self.dropped = 0.0
+
+    def seconds(self, np, busy_ms, actions, elapsed_ms, queue_size):
+        """Add a window's per-second plan time, actions and elapsed time (ms)"""
+        self.busy_ms += float(busy_ms.sum())
+        self.actions += int(actions.sum())
+        self.elapsed_ms += float(elapsed_ms.sum())
+        timed = elapsed_ms > 0
+        if timed.any():
+            self.peak = max(self.peak, float((busy_ms[timed] / elapsed_ms[timed]).max()))
+        # A full queue holds queue_size plans of the second's mean plan time; seconds without actions drop nothing
+        full_ms = np.full(len(busy_ms), np.inf)
+        fired = actions > 0
+        full_ms[fired] = busy_ms[fired] * queue_size / actions[fired]
+        backlog = self.backlog_ms
+        for net, full in zip((busy_ms - elapsed_ms).tolist(), full_ms.tolist()):
+            backlog += net
+            if backlog < 0:
+                backlog = 0.0
+            elif backlog > full:
+                self.dropped += (backlog - full) * queue_size / full
+                backlog = full
+        self.backlog_ms = backlog
+
+    @property
+    def utilization(self):
+        return self.busy_ms / self.elapsed_ms if self.elapsed_ms else 0.0
+
+
+class _Window:
+    """Mark times of an evaluated window; the intervals between them are housekeeping seconds"""
+
+    def __init__(self, np, times):
+        self.times = times
+        self.elapsed_ms = np.diff(times) * 1000
+        self.intervals = len(times) - 1
+
+
+class _Trades:
+    """One (exchange, side)'s trades of a window, sorted once by size for every config's region lookups"""
+
+    def __init__(self, np, window, quantities, ids, arrival, starts, per_interval):
+        self.np = np
+        self.window = window
+        self.count = len(quantities)
+        # Interval of each trade and its position among the exchange's trades, in arrival order
+        self.ids = ids
+        self.arrival = arrival
+        # Position of each interval's first trade and trades per interval, among the exchange's trades
+        self.starts = starts
+        self.per_interval = per_interval
+        self.order = np.argsort(quantities)
+        self.sorted = quantities[self.order]
+        self.sorted_ids = ids[self.order]
+
+    def positions(self, edges):
+        """Start of every region in the size-sorted trades, then the trade count"""
+        np = self.np
+        return np.concatenate(([0], np.searchsorted(self.sorted, edges, side='left'), [self.count]))
+
+    def per_interval_sum(self, values, totals):
+        """Sum per interval of a per-region value over the trades"""
+        np = self.np
+        return np.bincount(self.sorted_ids, weights=np.repeat(values, totals), minlength=self.window.intervals)
+
+    def select(self, positions, region_ids):
+        """(times, interval ids) of the trades in some regions in arrival order, or None"""
+        np = self.np
+        runs = [self.order[positions[r]:positions[r + 1]] for r in region_ids if positions[r + 1] > positions[r]]
+        if not runs:
+            return None
+        picked = np.sort(np.concatenate(runs)) if len(runs) > 1 else np.sort(runs[0])
+        ids = self.ids[picked]
+        window = self.window
+        # An exchange's trades of an interval are spread evenly over it, in arrival order
+        offsets = (self.arrival[picked] - self.starts[ids] + 0.5) / self.per_interval[ids]
+        return window.times[ids] + offsets * window.elapsed_ms[ids] / 1000, ids
+
+
+class ShadowEvaluator:
+    """Evaluates candidate configs on batches of live trades, next to the active one"""
+
+    def __init__(self, bridge, candidates, players, queue_size=32, report_path=None, batch=32768, max_window=600):
+        import numpy
+        self.np = numpy
+        self.bridge = bridge
+        self.candidates = list(candidates)
+        self.players = dict(players)
+        self.queue_size = queue_size
+        self.report_path = report_path
+        # Buffered trades are evaluated once there are `batch` of them or `max_window` seconds have passed
+        self.batch = batch
+        self.max_window = max_window
+        # Trade sizes per exchange, sells negated, appended by feed threads and drained by evaluate();
+        # plain float arrays so buffering a trade creates no object for the garbage collector
+        self.pending = {exchange: array('d') for exchange in self.players}
+        self._append = {exchange: sizes.append for exchange, sizes in self.pending.items()}
+        # (clock time, buffer lengths) once per evaluate() call; the first one starts the window
+        self.marks = []
+        self.configs = []
+        self._config = None
+        self._index = None
+        self.minutes = 0.0
+
+    def add(self, exchange, side, quantity):
+        """Buffer a decoded trade (feed threads)"""
+        self._append[exchange](quantity if side == 'buy' else -quantity)
+
+    def _compile(self, snapshot):
+        """(Re)build the active and candidate configs when the bridge's snapshot changed"""
+        if snapshot.config is self._config and snapshot.trigger_index is self._index:
+            return
+        np = self.np
+        for config in self.configs:
+            config.fold(np)
+        cooldown = self.bridge.special_cooldown_time
+        previous = {config.name: config for config in self.configs}
+        configs = [ShadowConfig(np, ACTIVE, snapshot, cooldown, self.players)]
+        for name, fields in self.candidates:
+            if snapshot.config is self._config and name in previous:
+                # Only the active index moved (adaptive ranges): candidates are unchanged
+                configs.append(previous[name])
+                continue
+            merged = dict(snapshot.config or {})
+            merged.update(fields)
+            configs.append(ShadowConfig(np, name, compile_snapshot(merged), cooldown, self.players))
+        # Counts carry over a recompile; the regions and cooldown state do not need to
+        for config in configs:
+            old = previous.get(config.name)
+            if old is not None and old is not config:
+                config.fires, config.matches, config.overlap = old.fires, old.matches, old.overlap
+                config.trades, config.agreed = old.trades, old.agreed
+                config.last_fire, config.pressure = old.last_fire, old.pressure
+        for config in configs[1:]:
+            config.compare(np, configs[0])
+        self.configs = configs
+        self._config = snapshot.config
+        self._index = snapshot.trigger_index
+
+    def evaluate(self, now, force=False):
+        """Mark the buffers and classify the trades up to the mark when a batch is due (housekeeping, once a second)"""
+        lengths = tuple(map(len, self.pending.values()))
+        marks = self.marks
+        if not marks:
+            # Trades buffered before the first call arrived during the second before it
+            marks.append((now - 1.0, (0,) * len(lengths)))
+        last, last_lengths = marks[-1]
+        # A forced evaluation with nothing new adds no empty time (e.g. after a replay restored the wall clock)
+        if now > last and (lengths != last_lengths or not force):
+            marks.append((now, lengths))
+        if len(marks) < 2:
+            return False
+        if not force and marks[-1][0] - marks[0][0] < self.max_window and sum(marks[-1][1]) < self.batch:
+            return False
+        self.marks = [(marks[-1][0], (0,) * len(lengths))]
+        self._compile(self.bridge.snapshot)
+        np = self.np
+        times = np.array([time for time, _ in marks])
+        counts = np.array([mark_lengths for _, mark_lengths in marks])
+        self.minutes += (times[-1] - times[0]) / 60
+        # Queue pressure is modelled per interval between marks (a second, the last one may be partial)
+        window = _Window(np, times)
+        for j, (exchange, sizes) in enumerate(self.pending.items()):
+            busy = {config.name: (np.zeros(window.intervals), np.zeros(window.intervals)) for config in self.configs}
+            # Config name -> control name -> [(trade times, interval ids, delay, plan ms)] of its gated controls
+            gated = {config.name: {} for config in self.configs}
+            total = counts[-1, j]
+            if total:
+                # Taking a known count off the front is safe against feed threads appending meanwhile
+                signed = np.frombuffer(sizes[:total], dtype=float)
+                del sizes[:total]
+                per_interval = np.diff(counts[:, j])
+                ids = np.repeat(np.arange(window.intervals), per_interval)
+                # signbit: a zero-size sell is -0.0
+                sells = np.signbit(signed)
+                for side, mask in zip(SIGNALS, (~sells, sells)):
+                    arrival = np.flatnonzero(mask)
+                    if len(arrival):
+                        trades = _Trades(np, window, np.abs(signed[arrival]), ids[arrival], arrival,
+                                         counts[:-1, j], per_interval)
+                        self._side(exchange, side, trades, busy, gated)
+            for config in self.configs:
+                busy_ms, actions = busy[config.name]
+                self._gate(config, gated[config.name], busy_ms, actions)
+                config.pressure[exchange].seconds(np, busy_ms, actions, window.elapsed_ms, self.queue_size)
+        return True
+
+    def _side(self, exchange, side, trades, busy, gated):
+        np = self.np
+        for config in self.configs:
+            config.trades += trades.count
+            if config.name != ACTIVE:
+                # Trades where the candidate's matched controls are also matched by the active config
+                versus = config.versus[(exchange, side)]
+                versus.counts += np.diff(trades.positions(versus.edges))
+            compiled = config.sides.get((exchange, side))
+            if compiled is None:
+                continue
+            positions = trades.positions(compiled.edges)
+            totals = np.diff(positions)
+            compiled.totals += totals
+            busy_ms, actions = busy[config.name]
+            busy_ms += trades.per_interval_sum(compiled.direct_ms, totals)
+            actions += trades.per_interval_sum(compiled.direct_count, totals)
+            if compiled.gated:
+                bounds = positions.tolist()
+                for name, (region_ids, delay, duration_ms) in compiled.gated.items():
+                    selected = trades.select(bounds, region_ids)
+                    if selected is not None:
+                        gated[config.name].setdefault(name, []).append((*selected, delay, duration_ms))
+
+    def _gate(self, config, gated, busy_ms, actions):
+        """Fire a config's cooldown/delay controls over their trades of both sides, in time order"""
+        np = self.np
+        for name, parts in gated.items():
+            times, ids, delay, duration_ms = parts[0]
+            if len(parts) > 1:
+                times = np.concatenate([part[0] for part in parts])
+                ids = np.concatenate([part[1] for part in parts])
+                order = np.argsort(times, kind='stable')
+                times, ids = times[order], ids[order]
+            fired = self._fire(np, config, name, times, config.special_cooldown if delay is None else delay)
+            if fired:
+                _add(config.fires, name, len(fired))
+                fired_intervals = np.bincount(ids[fired], minlength=len(busy_ms))
+                busy_ms += fired_intervals * duration_ms
+                actions += fired_intervals
+
+    @staticmethod
+    def _fire(np, config, name, times, gap):
+        """Positions of a cooldown/delay control's fires among its sorted trade times, as the live path gates them"""
+        last = config.last_fire.get(name)
+        count = len(times)
+        i = 0 if last is None else int(np.searchsorted(times, last + gap))
+        fired = []
+        if gap > 0 and count > 8 * ((times[-1] - times[0]) / gap + 1):
+            # Most trades fall within a cooldown: jump over them from each fire
+            times = times.tolist()
+            while i < count:
+                fired.append(i)
+                i = bisect_left(times, times[i] + gap, i + 1)
+        else:
+            # First trade at or after each trade's cooldown, so following the fires is one lookup each
+            ready = np.maximum(np.searchsorted(times, times + gap), np.arange(1, count + 1)).tolist()
+            while i < count:
+                fired.append(i)
+                i = ready[i]
+        if fired:
+            config.last_fire[name] = float(times[fired[-1]])
+        return fired
+
+    def report(self):
+        """{config name: {trades, agreement, controls: {name: {per_minute, overlap}}, queues: {player: ...}}}"""
+        minutes = self.minutes or 1.0
+        report = {}
+        for config in self.configs:
+            config.fold(self.np)
+            # The active config is the reference: no overlap or agreement of its own
+            reference = config.name == ACTIVE
+            controls = {}
+            for name in sorted(set(config.fires) | set(config.matches)):
+                matches = config.matches.get(name, 0)
+                controls[name] = {
+                    'per_minute': round(config.fires.get(name, 0) / minutes, 2),
+                    'overlap': round(config.overlap.get(name, 0) / matches, 3) if matches and not reference else None,
+                }
+            report[config.name] = {
+                'trades': config.trades,
+                'agreement': round(config.agreed / config.trades, 3) if config.trades and not reference else None,
+                'controls': controls,
+                'queues': {self.players[exchange]: {
+                    'actions_per_minute': round(pressure.actions / minutes, 1),
+                    'utilization': round(pressure.utilization, 3),
+                    'peak_utilization': round(pressure.peak, 3),
+                    'would_drop': int(pressure.dropped),
+                } for exchange, pressure in config.pressure.items()},
+            }
+        return report
+
+    def summary_lines(self):
+        buffered = sum(len(sizes) for sizes in self.pending.values())
+        yield f"Shadow evaluation: {self.minutes:.1f} min of trades evaluated, {buffered} buffered for the next batch"
+        report = self.report()
+        active = report.get(ACTIVE, {}).get('controls', {})
+        for name, entry in report.items():
+            queues = ', '.join(f"{player} {queue['actions_per_minute']:g} actions/min, utilization "
+                               f"{queue['utilization']:.0%} (peak {queue['peak_utilization']:.0%}), "
+                               f"~{queue['would_drop']} would drop"
+                               for player, queue in entry['queues'].items())
+            agreement = entry['agreement']
+            agreement = f", same controls as active on {agreement:.0%} of them" if agreement is not None else ""
+            yield f"Shadow {name}: {entry['trades']} trades{agreement}; {queues}"
+            fired = [(control, values) for control, values in entry['controls'].items()
+                     if values['per_minute'] or active.get(control, {}).get('per_minute')]
+            if fired and name != ACTIVE:
+                yield f"Shadow {name} fires/min: " + ', '.join(
+                    f"{control} {values['per_minute']:g} (active {active.get(control, {}).get('per_minute', 0):g}"
+                    + (f", {values['overlap']:.0%} overlap)" if values['overlap'] is not None else ")")
+                    for control, values in fired)
+
+    def write_report(self):
+        if not self.report_path:
+            return
+        with open(self.report_path, 'w') as f:
+            json.dump({'minutes': round(self.minutes, 2), 'configs': self.report()}, f, indent=2)
+        logger.info(f"Wrote shadow report to {self.report_path}")
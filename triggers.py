@@ -0,0 +1,238 @@
+"""
+Compiled trigger lookup for the SF2 bridge.
+
+The dashboard configuration is a flat dict of ~150 string fields
+("binanceBuyWeakMin", "coinbaseSpecial3Command", ...). Scanning it on every
+trade means building f-string keys and calling float() about 40 times per
+message. TriggerIndex compiles the config once into a sorted interval index per
+(exchange, side) so a trade is classified with a single bisect.
+
+Semantics match the original per-trade scanning:
+- Attacks (Weak/Med/Strong): first matching level wins
+- Specials (1-9): first matching special with a non-empty command wins
+- Movement (Forward/Backward): every match fires
+- Jump/Crouch: every match is reported, the bridge applies the delay
+"""
+
+import logging
+from bisect import bisect_left
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+EXCHANGES = ('binance', 'coinbase')
+SIGNALS = ('buy', 'sell')
+ATTACK_LEVELS = ('Weak', 'Med', 'Strong')
+MOVEMENTS = ('MoveForward', 'MoveBackward')
+JUMP_CROUCH_ACTIONS = ('Jump', 'Crouch')
+SPECIAL_SLOTS = range(1, 10)
+
+NEG_INF = float('-inf')
+POS_INF = float('inf')
+
+# attack: (level, key) or None
+# special: (special_name, command) or None
+# movements: tuple of (movement, key)
+# jump_crouch: tuple of JumpCrouchSpec
+TriggerMatch = namedtuple('TriggerMatch', ['attack', 'special', 'movements', 'jump_crouch'])
+
+# action_key is the bridge state key, e.g. "binanceJump"
+# jump_options lists the jump variants that have keys configured ('neutral', 'left', 'right')
+JumpCrouchSpec = namedtuple(
+    'JumpCrouchSpec',
+    ['action', 'action_key', 'key', 'delay', 'left_key', 'right_key', 'jump_options'],
+)
+
+EMPTY_MATCH = TriggerMatch(None, None, (), ())
+
+
+def _range(config, field_prefix):
+    """Read a (min, max) pair the same way the scanning code did: float(value or default 0)"""
+    try:
+        return (float(config.get(f"{field_prefix}Min", 0)),
+                float(config.get(f"{field_prefix}Max", 0)))
+    except (TypeError, ValueError):
+        logger.warning("Invalid range for %s, control disabled", field_prefix)
+        return None
+
+
+def range_prefixes(config):
+    """(field prefix, exchange, signal) of every quantity range in a config, e.g. ('binanceBuyWeak', 'binance', 'buy').
+
+    Specials, movements and jump/crouch follow their Signal field; ranges of
+    controls on neither side are skipped.
+    """
+    for exchange in EXCHANGES:
+        for signal_type in SIGNALS:
+            for level in ATTACK_LEVELS:
+                yield f"{exchange}{signal_type.capitalize()}{level}", exchange, signal_type
+        prefixes = ([f"{exchange}Special{i}" for i in SPECIAL_SLOTS] + [f"{exchange}{m}" for m in MOVEMENTS]
+                    + [f"{exchange}{a}" for a in JUMP_CROUCH_ACTIONS])
+        for prefix in prefixes:
+            signal_type = config.get(f"{prefix}Signal", "buy")
+            if signal_type in SIGNALS:
+                yield prefix, exchange, signal_type
+
+
+class _Control:
+    """One configured control with an inclusive [lo, hi] quantity range"""
+    __slots__ = ('kind', 'lo', 'hi', 'value')
+
+    def __init__(self, kind, lo, hi, value):
+        self.kind = kind
+        self.lo = lo
+        self.hi = hi
+        self.value = value
+
+
+class SideIndex:
+    """Interval index for one (exchange, signal) pair.
+
+    The sorted, de-duplicated range boundaries split the quantity axis into
+    alternating regions: open gaps between boundaries and the boundary points
+    themselves. Every control either covers a whole region or none of it, so the
+    TriggerMatch for each region is computed once at compile time.
+    """
+
+    def __init__(self, controls):
+        self.controls = controls
+        self.bounds = sorted({c.lo for c in controls} | {c.hi for c in controls})
+        # gaps[i] covers (bounds[i-1], bounds[i]), points[i] covers bounds[i]
+        self.gaps = [self._resolve(lambda c, i=i: self._gap_covered(c, i))
+                     for i in range(len(self.bounds) + 1)]
+        self.points = [self._resolve(lambda c, b=b: c.lo <= b <= c.hi) for b in self.bounds]
+
+    def _gap_covered(self, control, i):
+        left = self.bounds[i - 1] if i > 0 else NEG_INF
+        right = self.bounds[i] if i < len(self.bounds) else POS_INF
+        return control.lo <= left and control.hi >= right
+
+    def _resolve(self, covers):
+        attack = None
+        special = None
+        movements = []
+        jump_crouch = []
+        for control in self.controls:
+            if not covers(control):
+                continue
+            if control.kind == 'attack':
+                if attack is None:
+                    attack = control.value
+            elif control.kind == 'special':
+                if special is None:
+                    special = control.value
+            elif control.kind == 'movement':
+                movements.append(control.value)
+            else:
+                jump_crouch.append(control.value)
+        if attack is None and special is None and not movements and not jump_crouch:
+            return EMPTY_MATCH
+        return TriggerMatch(attack, special, tuple(movements), tuple(jump_crouch))
+
+    def regions(self):
+        """Matches of every region in quantity order: gaps[0], points[0], gaps[1], ..., gaps[-1].
+
+        Region 2*i is the gap below bounds[i] and region 2*i + 1 the point bounds[i],
+        so a batch classifier can turn searchsorted positions into regions.
+        """
+        regions = []
+        for gap, point in zip(self.gaps, self.points):
+            regions += (gap, point)
+        regions.append(self.gaps[-1])
+        return regions
+
+    def lookup(self, quantity):
+        bounds = self.bounds
+        i = bisect_left(bounds, quantity)
+        if i < len(bounds) and bounds[i] == quantity:
+            return self.points[i]
+        return self.gaps[i]
+
+
+class TriggerIndex:
+    """Per-(exchange, signal) interval index compiled from a dashboard configuration"""
+
+    def __init__(self, config):
+        self.active = bool(config and config.get('isActive'))
+        self._sides = {}
+        if not config:
+            return
+        for exchange in EXCHANGES:
+            for signal_type in SIGNALS:
+                self._sides[(exchange, signal_type)] = SideIndex(
+                    self._compile_controls(config, exchange, signal_type)
+                )
+
+    @staticmethod
+    def _compile_controls(config, exchange, signal_type):
+        """Collect controls in the order the bridge evaluates them"""
+        controls = []
+        side_prefix = f"{exchange}{signal_type.capitalize()}"
+
+        for level in ATTACK_LEVELS:
+            bounds = _range(config, f"{side_prefix}{level}")
+            if bounds:
+                key = config.get(f"{side_prefix}{level}Key")
+                controls.append(_Control('attack', *bounds, (level, key)))
+
+        for i in SPECIAL_SLOTS:
+            if config.get(f"{exchange}Special{i}Signal", "buy") != signal_type:
+                continue
+            command = config.get(f"{exchange}Special{i}Command", "")
+            bounds = _range(config, f"{exchange}Special{i}")
+            if bounds and command:
+                controls.append(_Control('special', *bounds, (f"{exchange}Special{i}", command)))
+
+        for movement in MOVEMENTS:
+            if config.get(f"{exchange}{movement}Signal", "buy") != signal_type:
+                continue
+            key = config.get(f"{exchange}{movement}Key", "")
+            bounds = _range(config, f"{exchange}{movement}")
+            if bounds and key:
+                controls.append(_Control('movement', *bounds, (movement, key)))
+
+        for action in JUMP_CROUCH_ACTIONS:
+            if config.get(f"{exchange}{action}Signal", "buy") != signal_type:
+                continue
+            key = config.get(f"{exchange}{action}Key", "")
+            bounds = _range(config, f"{exchange}{action}")
+            if not bounds or not key:
+                continue
+            try:
+                delay = float(config.get(f"{exchange}{action}Delay", 5.0))
+            except (TypeError, ValueError):
+                logger.warning("Invalid delay for %s%s, using 5s", exchange, action)
+                delay = 5.0
+            left_key = config.get(f"{exchange}JumpLeftKey", "") if action == 'Jump' else ""
+            right_key = config.get(f"{exchange}JumpRightKey", "") if action == 'Jump' else ""
+            jump_options = ['neutral']  # Always have neutral jump
+            if left_key and left_key.strip():
+                jump_options.append('left')
+            if right_key and right_key.strip():
+                jump_options.append('right')
+            controls.append(_Control('jump_crouch', *bounds, JumpCrouchSpec(
+                action, f"{exchange}{action}", key, delay, left_key, right_key, tuple(jump_options)
+            )))
+
+        return controls
+
+    def controls(self):
+        """Every compiled control as (kind, value), e.g. ('attack', ('Weak', 'x'))"""
+        for side in self._sides.values():
+            for control in side.controls:
+                yield control.kind, control.value
+
+    def side(self, exchange, signal_type):
+        """SideIndex of one (exchange, signal) pair, or None when the config is inactive"""
+        if not self.active:
+            return None
+        return self._sides.get((exchange, signal_type))
+
+    def lookup(self, exchange, signal_type, quantity):
+        """Return the TriggerMatch for a trade, or None when the config is inactive"""
+        if not self.active:
+            return None
+        side = self._sides.get((exchange, signal_type))
+        if side is None:
+            return None
+        return side.lookup(quantity)